@@ -1,3 +1,4 @@
 from .core import AidBud
+from .result import QueryResult
 
-__all__ = ["AidBud"]
\ No newline at end of file
+__all__ = ["AidBud", "QueryResult"]
\ No newline at end of file
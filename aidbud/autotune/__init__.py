@@ -0,0 +1,5 @@
+from .hardware import detect_hardware
+from .probes import run_probes
+from .tuner import autotune, choose_settings, apply_profile
+
+__all__ = ["autotune", "detect_hardware", "run_probes", "choose_settings", "apply_profile"]
@@ -0,0 +1,61 @@
+import os
+import hashlib
+import json
+import platform
+import torch
+from typing import Dict, Any, List
+
+SIMD_FLAGS = ("sse4_2", "avx", "avx2", "fma", "avx512f", "avx512_bf16", "avx512_vnni", "amx_tile", "neon", "asimd", "sve")
+
+def _physical_memory() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def _cpu_flags() -> List[str]:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = set(line.split(":", 1)[1].split())
+                    return [flag for flag in SIMD_FLAGS if flag in flags]
+    except OSError:
+        pass
+    # Apple silicon and other platforms without /proc: every arm64 CPU has NEON.
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return ["neon"]
+    return []
+
+def detect_hardware() -> Dict[str, Any]:
+    """
+    Describes the machine: usable cores, physical memory, SIMD support and GPUs.
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    gpus = []
+    if torch.cuda.is_available():
+        for index in range(torch.cuda.device_count()):
+            properties = torch.cuda.get_device_properties(index)
+            gpus.append({"name": properties.name, "memory": properties.total_memory})
+
+    return {
+        "machine": platform.machine(),
+        "cores": cores,
+        "memory": _physical_memory(),
+        "simd": _cpu_flags(),
+        "torch_cpu_capability": torch.backends.cpu.get_cpu_capability() if hasattr(torch.backends, "cpu") else None,
+        "torch_version": torch.__version__,
+        "gpus": gpus
+    }
+
+def fingerprint(hardware: Dict[str, Any]) -> str:
+    """
+    A digest of the hardware properties tuning depends on, to tell whether a saved profile still
+    applies. Memory is rounded to whole GiB so small reporting differences do not invalidate it.
+    """
+    key = dict(hardware, memory=round(hardware.get("memory", 0) / 2 ** 30))
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
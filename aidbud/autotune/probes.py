@@ -0,0 +1,107 @@
+import time
+import torch
+import numpy as np
+from typing import Dict, Any, List, Callable
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Sizes of the stand-in workloads. The embed probe is one encoder layer of the default embedder
+# (bge-small: 384 hidden, 12 heads); the generate probe is a decoder MLP small enough to run in
+# milliseconds, whose throughput is scaled to the real model by parameter count.
+EMBED_DIM = 384
+EMBED_HEADS = 12
+EMBED_TOKENS = 256
+GENERATE_DIM = 1024
+GENERATE_LAYERS = 2
+BATCH_SIZES = (1, 2, 4, 8, 16)
+
+def _time(fn: Callable[[], Any], repeats: int, warmup: int = 1) -> float:
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+def probe_decode(width: int = 1280, height: int = 720, repeats: int = 10) -> Dict[str, Any]:
+    """
+    Times JPEG decoding plus BGR to RGB conversion of a photo-sized frame, the per-frame work of
+    video sampling.
+    """
+    if cv2 is None:
+        return {"frames_per_s": None}
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    frame = np.clip(gradient + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    encoded = cv2.imencode(".jpg", frame)[1]
+    seconds = _time(lambda: cv2.cvtColor(cv2.imdecode(encoded, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB), repeats)
+    return {"frames_per_s": 1.0 / seconds}
+
+@torch.no_grad()
+def probe_embed(threads: int, repeats: int = 3) -> Dict[str, Any]:
+    torch.set_num_threads(threads)
+    layer = torch.nn.TransformerEncoderLayer(EMBED_DIM, EMBED_HEADS, EMBED_DIM * 4, batch_first=True).eval()
+    tokens = torch.randn(1, EMBED_TOKENS, EMBED_DIM)
+    seconds = _time(lambda: layer(tokens), repeats)
+    return {"tokens_per_s": EMBED_TOKENS / seconds}
+
+def _decoder(dim: int, layers: int) -> torch.nn.Module:
+    blocks = []
+    for _ in range(layers):
+        blocks += [torch.nn.Linear(dim, dim * 4), torch.nn.GELU(), torch.nn.Linear(dim * 4, dim)]
+    return torch.nn.Sequential(*blocks).eval()
+
+@torch.no_grad()
+def probe_generate(threads: int, batch_sizes: List[int] = BATCH_SIZES, repeats: int = 5) -> Dict[str, Any]:
+    """
+    Times one decode step of a stand-in decoder at several batch sizes. Decoding is bound by
+    reading the weights, so batching is nearly free until the step becomes compute bound.
+    """
+    torch.set_num_threads(threads)
+    model = _decoder(GENERATE_DIM, GENERATE_LAYERS)
+    parameters = sum(parameter.numel() for parameter in model.parameters())
+    steps = {}
+    for batch_size in batch_sizes:
+        hidden = torch.randn(batch_size, GENERATE_DIM)
+        steps[batch_size] = _time(lambda: model(hidden), repeats)
+    return {
+        "parameters": parameters,
+        "step_seconds": {str(batch_size): seconds for batch_size, seconds in steps.items()},
+        "tokens_per_s": {str(batch_size): batch_size / seconds for batch_size, seconds in steps.items()}
+    }
+
+def thread_candidates(cores: int) -> List[int]:
+    return sorted({1, max(1, cores // 2), cores})
+
+def run_probes(hardware: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs every micro-benchmark, the embed and generate ones once per candidate thread count. Takes
+    a few seconds.
+    """
+    previous_threads = torch.get_num_threads()
+    try:
+        results = {"decode": probe_decode(), "threads": {}}
+        for threads in thread_candidates(hardware["cores"]):
+            results["threads"][str(threads)] = {
+                "embed": probe_embed(threads),
+                "generate": probe_generate(threads, batch_sizes=[1])
+            }
+        best = choose_threads(results)
+        results["generate"] = probe_generate(best)
+        return results
+    finally:
+        torch.set_num_threads(previous_threads)
+
+def choose_threads(results: Dict[str, Any], tolerance: float = 0.05) -> int:
+    """
+    The thread count with the lowest combined embed and decode-step time, preferring fewer threads
+    when within `tolerance` of the fastest, since those cores then stay free for media decoding.
+    """
+    costs = {}
+    for threads, probes in results["threads"].items():
+        costs[int(threads)] = EMBED_TOKENS / probes["embed"]["tokens_per_s"] + probes["generate"]["step_seconds"]["1"]
+    fastest = min(costs.values())
+    return min(threads for threads, cost in costs.items() if cost <= fastest * (1 + tolerance))
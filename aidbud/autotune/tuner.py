@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import tempfile
+from typing import Dict, Any, Optional
+from ..config import Config
+from .hardware import detect_hardware, fingerprint
+from .probes import run_probes, choose_threads
+
+PROFILE_FORMAT = 1
+# Effective parameters of the default model and image tokens per frame, to scale the stand-in
+# decoder's throughput to the real model.
+MODEL_PARAMETERS = 4e9
+TOKENS_PER_FRAME = 256
+# Seconds of video prefill and of frame decoding a single turn may spend on one video.
+PREFILL_BUDGET = 20.0
+DECODE_BUDGET = 2.0
+MIN_FRAMES, MAX_FRAMES, GPU_FRAMES = 4, 64, 32
+# The smallest batch reaching this share of the best decode throughput is chosen, since larger
+# batches only add queueing latency.
+BATCH_SHARE = 0.85
+
+def choose_settings(hardware: Dict[str, Any], probes: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Turns hardware facts and probe results into config overrides.
+    """
+    cores = hardware["cores"]
+    threads = choose_threads(probes)
+
+    throughput = {int(batch_size): tps for batch_size, tps in probes["generate"]["tokens_per_s"].items()}
+    batch_sizes = sorted(throughput)
+    best = max(throughput.values())
+    max_batch_size = min(batch_size for batch_size in batch_sizes if throughput[batch_size] >= best * BATCH_SHARE)
+
+    if hardware["gpus"]:
+        max_frames = GPU_FRAMES
+    else:
+        prefill_tokens_per_s = throughput[batch_sizes[-1]] * probes["generate"]["parameters"] / MODEL_PARAMETERS
+        max_frames = int(PREFILL_BUDGET * prefill_tokens_per_s / TOKENS_PER_FRAME)
+    if probes["decode"]["frames_per_s"]:
+        max_frames = min(max_frames, int(DECODE_BUDGET * probes["decode"]["frames_per_s"]))
+    if hardware["memory"] and hardware["memory"] < 8 * 2 ** 30:
+        max_frames = min(max_frames, 8)
+    max_frames = max(MIN_FRAMES, min(MAX_FRAMES, max_frames))
+
+    return {
+        "llm": {
+            "torch_threads": threads,
+            "num_workers": max(2, min(cores, 8)),
+            "max_frames": max_frames
+        },
+        "scheduler": {
+            "max_batch_size": max_batch_size
+        }
+    }
+
+def load_profile(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Warning: Could not read autotune profile at {path}. Error: {e}")
+        return None
+    if not isinstance(profile, dict) or profile.get("format") != PROFILE_FORMAT:
+        return None
+    return profile
+
+def save_profile(profile: Dict[str, Any], path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False) as f:
+        json.dump(profile, f, indent=2)
+        temp_path = f.name
+    os.replace(temp_path, path)
+
+def apply_profile(config: Config, profile: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Applies the settings of a profile to every key the config still has at its default, so values
+    set explicitly, from a file or the environment, are kept.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The settings that were applied.
+    """
+    defaults = Config()
+    applied = {}
+    for section, values in profile["settings"].items():
+        for key, value in values.items():
+            if getattr(config, section)[key] == getattr(defaults, section)[key]:
+                applied.setdefault(section, {})[key] = value
+    config.update(applied)
+    return applied
+
+def autotune(config: Config, profile_path: str = None, force: bool = None) -> Dict[str, Any]:
+    """
+    Tunes a config to the machine it runs on.
+
+    The first run detects the hardware, runs the micro-benchmarks and saves the resulting profile.
+    Later runs on the same hardware load the profile instead, so startup is not slowed down again.
+
+    Args:
+        config (Config): The config to tune, updated in place.
+        profile_path (str, optional): Where the profile is saved. Defaults to `config.autotune["profile_path"]`.
+        force (bool, optional): Re-run the benchmarks even if a matching profile exists. Defaults to
+            `config.autotune["force"]`.
+
+    Returns:
+        Dict[str, Any]: The profile: hardware, benchmark results and chosen settings.
+    """
+    profile_path = profile_path if profile_path is not None else config.autotune["profile_path"]
+    force = force if force is not None else config.autotune["force"]
+
+    hardware = detect_hardware()
+    hardware_fingerprint = fingerprint(hardware)
+    profile = None if force else load_profile(profile_path)
+    if profile is None or profile.get("fingerprint") != hardware_fingerprint:
+        print("Auto-tuning for this machine...")
+        start = time.perf_counter()
+        probes = run_probes(hardware)
+        profile = {
+            "format": PROFILE_FORMAT,
+            "fingerprint": hardware_fingerprint,
+            "created_at": time.time(),
+            "benchmark_seconds": time.perf_counter() - start,
+            "hardware": hardware,
+            "probes": probes,
+            "settings": choose_settings(hardware, probes)
+        }
+        save_profile(profile, profile_path)
+
+    applied = apply_profile(config, profile)
+    print(f"Auto-tuned settings: {applied}")
+    return profile
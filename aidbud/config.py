@@ -1,3 +1,79 @@
+import os
+import json
+from typing import Dict, Any
+
+SECTIONS = ("llm", "memo", "attachments", "rag", "router", "conversation", "scheduler", "tracing", "context", "autotune", "server")
+
+# Settings with a non-None default that may also be set to None.
+NULLABLE = {
+    "llm.num_workers", "llm.torch_threads", "llm.max_frames", "llm.max_audio_seconds",
+    "memo.max_entries",
+    "attachments.long_video_seconds",
+    "rag.max_conversation_records", "rag.max_record_age",
+    "conversation.max_messages", "conversation.store_path", "conversation.max_active",
+    "tracing.jsonl_path", "tracing.prometheus_path",
+    "context.legacy_path",
+    "server.timeout"
+}
+
+# Settings with an integer default that may also be fractional.
+FRACTIONAL = {
+    "llm.fps", "llm.max_audio_seconds", "llm.vad_frame_ms", "llm.vad_energy_margin_db", "llm.vad_min_energy_db",
+    "llm.vad_min_speech_ms", "llm.vad_padding_ms", "llm.vad_max_gap_ms", "llm.modality_idle_seconds", "attachments.long_video_seconds",
+    "attachments.segment_seconds", "scheduler.batch_wait_ms", "server.timeout"
+}
+
+# Inclusive (minimum, maximum) bounds of numeric settings.
+RANGES = {
+    "llm.fps": (1e-3, None),
+    "llm.num_workers": (1, None),
+    "llm.max_new_tokens": (1, None),
+    "llm.torch_threads": (1, None),
+    "llm.max_frames": (1, None),
+    "llm.audio_sample_rate": (1, None),
+    "llm.max_audio_seconds": (0, None),
+    "llm.vad_frame_ms": (1, None),
+    "llm.vad_zcr_threshold": (0, 1),
+    "llm.vad_min_speech_ms": (0, None),
+    "llm.vad_padding_ms": (0, None),
+    "llm.vad_max_gap_ms": (0, None),
+    "llm.modality_idle_seconds": (0, None),
+    "memo.max_entries": (1, None),
+    "attachments.registry_size": (0, None),
+    "attachments.long_video_seconds": (0, None),
+    "attachments.segment_seconds": (1, None),
+    "attachments.merge_fan_in": (2, None),
+    "rag.embedder_max_tokens": (1, None),
+    "rag.topK": (1, None),
+    "rag.retrieval_cache_size": (0, None),
+    "rag.context_token_budget": (1, None),
+    "rag.context_response_share": (0, 1),
+    "rag.context_duplicate_threshold": (0, 1),
+    "rag.max_conversation_records": (1, None),
+    "rag.compaction_keep_recent": (0, None),
+    "rag.response_index_m": (2, None),
+    "rag.response_index_ef_construction": (1, None),
+    "rag.response_index_ef_search": (1, None),
+    "rag.attachment_index_m": (2, None),
+    "rag.attachment_index_ef_construction": (1, None),
+    "rag.attachment_index_ef_search": (1, None),
+    "router.function_threshold": (0, 1),
+    "router.query_threshold": (0, 1),
+    "conversation.max_messages": (1, None),
+    "conversation.max_active": (1, None),
+    "scheduler.max_concurrent": (1, None),
+    "scheduler.max_batch_size": (1, None),
+    "scheduler.batch_wait_ms": (0, None),
+    "context.write_delay": (0, None),
+    "server.timeout": (0, None)
+}
+
+# Allowed values of string settings.
+CHOICES = {
+    "rag.response_index_space": ("l2", "cosine", "ip"),
+    "rag.attachment_index_space": ("l2", "cosine", "ip")
+}
+
 class Config:
     def __init__(self):
         #========== DATA PROCESSING ==========#
@@ -5,7 +81,39 @@ class Config:
         self.llm["fps"] = 1
         self.llm["num_workers"] = 4
         self.llm["model_id"] = "google/gemma-3n-E4B-it"
+        self.llm["max_new_tokens"] = 1024
+        self.llm["do_sample"] = None # None keeps the model's own generation config
+        self.llm["constrained_decoding"] = False # Constrain outputs to the pcard/fcall/attachment JSON schemas, each step checks the whole vocabulary when sampling
+        self.llm["torch_threads"] = None # None keeps torch's default
+        self.llm["max_frames"] = None # Most frames sampled per video, None samples every frame at `fps`
+        self.llm["lazy_modalities"] = False # Load the vision and audio encoders only when a request needs them (CPU only)
+        self.llm["modality_idle_seconds"] = None # Release an encoder unused for this long, None keeps it loaded
+        self.llm["audio_sample_rate"] = 16000 # Audio is resampled to the rate the audio encoder expects
+        self.llm["max_audio_seconds"] = 30 # Total audio per query after silence trimming, None for no cap
+        self.llm["vad_enabled"] = True # Trim silence from audio before the model sees it
+        self.llm["vad_frame_ms"] = 30
+        self.llm["vad_energy_margin_db"] = 12 # Speech must be this much louder than the clip's noise floor
+        self.llm["vad_min_energy_db"] = -50 # Frames quieter than this (dBFS) are always silence
+        self.llm["vad_zcr_threshold"] = 0.3 # Zero-crossing rate of unvoiced consonants
+        self.llm["vad_min_speech_ms"] = 90 # Shorter bursts are dropped as clicks
+        self.llm["vad_padding_ms"] = 150 # Kept around every speech run
+        self.llm["vad_max_gap_ms"] = 400 # Longer pauses between speech are cut
+
+        #========== GENERATION MEMO ==========#
+        self.memo = {}
+        self.memo["enabled"] = False
+        self.memo["path"] = "./generation_memo.sqlite"
+        self.memo["max_entries"] = 4096
         
+        #========== ATTACHMENTS ==========#
+        self.attachments = {}
+        self.attachments["registry_size"] = 1024
+        self.attachments["hash_content"] = True
+        self.attachments["long_video_seconds"] = 120 # Longer videos are described segment by segment and merged, None disables
+        self.attachments["segment_seconds"] = 30 # Length of one segment, which bounds its frames and audio
+        self.attachments["merge_fan_in"] = 8 # Segment descriptions merged per call, more are merged in rounds
+        self.attachments["reuse_descriptions"] = True # Reuse the description of media already seen in any conversation, False keeps conversations isolated
+
         #========== RAG ==========#
         self.rag = {}
         self.rag["db_path"] = "./chroma_db"
@@ -13,7 +121,188 @@ class Config:
         self.rag["embedder_max_tokens"] = 512
         self.rag["tokeniser"] = "cl100k_base"
         self.rag["topK"] = 5
+        self.rag["retrieval_cache_size"] = 256
+        self.rag["context_token_budget"] = 2048
+        self.rag["context_response_share"] = 0.6
+        self.rag["context_duplicate_threshold"] = 0.8
+        self.rag["context_diversity_weight"] = 0.5
+        self.rag["context_recency_weight"] = 0.3
+        self.rag["max_conversation_records"] = 200
+        self.rag["max_record_age"] = None
+        self.rag["compaction_keep_recent"] = 20
+        # HNSW index of each collection. Space, M and ef_construction are fixed when a collection is
+        # created; a changed ef_search also applies to an existing one, from the next start.
+        self.rag["response_index_space"] = "l2" # Distance metric: "l2", "cosine" or "ip"
+        self.rag["response_index_m"] = 16 # Graph links per record, more raise recall and index memory
+        self.rag["response_index_ef_construction"] = 100 # Candidates considered while building, more raise recall and insert time
+        self.rag["response_index_ef_search"] = 100 # Candidates considered per query, more raise recall and query time
+        self.rag["attachment_index_space"] = "l2"
+        self.rag["attachment_index_m"] = 16
+        self.rag["attachment_index_ef_construction"] = 100
+        self.rag["attachment_index_ef_search"] = 100
+
+        #========== ROUTER ==========#
+        self.router = {}
+        self.router["enabled"] = False # The thresholds are untuned for the embedder, calibrate them on your own conversations before enabling
+        self.router["function_threshold"] = 0.8
+        self.router["query_threshold"] = 0.5
+        self.router["margin"] = 0.05
+
+        #========== CONVERSATION ==========#
+        self.conversation = {}
+        self.conversation["max_messages"] = 100 # Most recent messages kept in memory per conversation
+        self.conversation["store_path"] = "~/.cache/aidbud/conversations" # None keeps conversations in memory only
+        self.conversation["max_active"] = 64 # Conversations kept in memory, older ones are reloaded on use
+
+        #========== SCHEDULER ==========#
+        self.scheduler = {}
+        self.scheduler["max_concurrent"] = 4
+        self.scheduler["max_batch_size"] = 8
+        self.scheduler["batch_wait_ms"] = 10
+        self.scheduler["triage_priorities"] = {
+            "Red": 0, "Immediate": 0,
+            "Yellow": 1, "Urgent": 1, "Delayed": 1,
+            "Green": 2, "Minor": 2,
+            "Black": 3, "Expectant": 3
+        }
+        self.scheduler["default_priority"] = 2
+
+        #========== TRACING ==========#
+        self.tracing = {}
+        self.tracing["enabled"] = False
+        self.tracing["jsonl_path"] = None
+        self.tracing["prometheus_path"] = None
 
         #========== CONTEXT ==========#
         self.context = {}
-        self.context["context_path"] = "./context"
\ No newline at end of file
+        self.context["context_path"] = "./context.json"
+        self.context["legacy_path"] = "./context" # Pickled context of earlier versions, migrated on first load
+        self.context["write_delay"] = 0.5 # Seconds changes are batched before being written, 0 writes on every change
+
+        #========== AUTOTUNE ==========#
+        self.autotune = {}
+        self.autotune["enabled"] = False
+        self.autotune["profile_path"] = "./aidbud_profile.json"
+        self.autotune["force"] = False # Re-run the micro-benchmarks even if a matching profile is saved
+
+        #========== MODEL SERVER ==========#
+        self.server = {}
+        self.server["enabled"] = False # Use the models of a running `python -m aidbud.server` instead of loading them
+        self.server["socket_path"] = "~/.cache/aidbud/server.sock"
+        self.server["timeout"] = 600 # Seconds to wait for one reply, None waits indefinitely
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {section: dict(getattr(self, section)) for section in SECTIONS}
+
+    def update(self, overrides: Dict[str, Dict[str, Any]]) -> "Config":
+        """
+        Applies overrides of the form {"section": {"key": value}} after validating them.
+
+        Raises:
+            ValueError: If a section or key does not exist, or a value has the wrong type or is out
+                of range. Nothing is applied if any override is invalid.
+        """
+        defaults = Config()
+        for section, values in overrides.items():
+            if section not in SECTIONS:
+                raise ValueError(f"Unknown config section: '{section}'")
+            if not isinstance(values, dict):
+                raise ValueError(f"Config section '{section}' must be a mapping, got {type(values).__name__}")
+            for key, value in values.items():
+                if key not in getattr(defaults, section):
+                    raise ValueError(f"Unknown config key: '{section}.{key}'")
+                _validate(f"{section}.{key}", value, getattr(defaults, section)[key])
+
+        for section, values in overrides.items():
+            getattr(self, section).update(values)
+        return self
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Dict[str, Any]]) -> "Config":
+        return cls().update(data)
+
+    @classmethod
+    def from_file(cls, path: str) -> "Config":
+        """
+        Loads a config from a JSON or TOML file holding only the settings that differ from the defaults.
+
+        Example (config.json):
+            {"llm": {"fps": 2}, "rag": {"topK": 8}}
+        """
+        if path.endswith(".toml"):
+            import tomllib
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_env(cls, prefix: str = "AIDBUD_", environ: Dict[str, str] = None, base: "Config" = None) -> "Config":
+        """
+        Applies settings from environment variables named `<prefix><SECTION>__<KEY>`, matched case
+        insensitively, e.g. `AIDBUD_LLM__FPS=2` or `AIDBUD_RAG__TOPK=8`. Values are read as JSON
+        (`null`, `true`, numbers, objects) and otherwise taken as strings.
+
+        Args:
+            prefix (str, optional): Prefix of the variables. Defaults to "AIDBUD_".
+            environ (Dict[str, str], optional): Variables to read. Defaults to `os.environ`.
+            base (Config, optional): Config to apply them to, e.g. one loaded with `from_file`.
+                Defaults to a new default config.
+        """
+        environ = os.environ if environ is None else environ
+        config = base if base is not None else cls()
+        overrides = {}
+        for name, raw in environ.items():
+            if not name.upper().startswith(prefix.upper()) or "__" not in name[len(prefix):]:
+                continue
+            section, key = name[len(prefix):].lower().split("__", 1)
+            if section not in SECTIONS:
+                raise ValueError(f"Unknown config section in {name}: '{section}'")
+            keys = {existing.lower(): existing for existing in getattr(config, section)}
+            if key not in keys:
+                raise ValueError(f"Unknown config key in {name}: '{section}.{key}'")
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = raw
+            overrides.setdefault(section, {})[keys[key]] = value
+        return config.update(overrides)
+
+def _validate(name: str, value: Any, default: Any):
+    if value is None:
+        if default is not None and name not in NULLABLE:
+            raise ValueError(f"Config key '{name}' cannot be None")
+        return
+
+    if isinstance(default, bool):
+        valid = isinstance(value, bool)
+    elif isinstance(default, float) or name in FRACTIONAL:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif isinstance(default, int):
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif default is None:
+        valid = isinstance(value, (bool, int, float, str))
+    else:
+        valid = isinstance(value, type(default))
+    if not valid:
+        if name in FRACTIONAL:
+            expected = "a number"
+        else:
+            expected = type(default).__name__ if default is not None else "bool, number or string"
+        raise ValueError(f"Config key '{name}' must be {expected}, got {type(value).__name__}: {value!r}")
+
+    bounds = RANGES.get(name)
+    if bounds is not None and not isinstance(value, bool):
+        low, high = bounds
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ValueError(f"Config key '{name}' must be within [{low}, {high if high is not None else 'inf'}], got {value!r}")
+
+    choices = CHOICES.get(name)
+    if choices is not None and value not in choices:
+        raise ValueError(f"Config key '{name}' must be one of {list(choices)}, got {value!r}")
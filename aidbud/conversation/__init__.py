@@ -1,3 +1,4 @@
 from .conversation import Conversation
+from .store import ConversationStore
 
-__all__ = ["Conversation"]
\ No newline at end of file
+__all__ = ["Conversation", "ConversationStore"]
@@ -1,24 +1,68 @@
-from typing import List, Dict
-from IPython.display import Markdown, display
+from typing import List, Dict, Optional
+from ..config import Config
+from .store import ConversationStore
 
 class Conversation:
-    def __init__(self):
-        self.current_conversation = 0
-        self.reset()
+    """
+    The current conversation of an `AidBud` instance.
+
+    A new conversation is only created in the store when its ID is first needed, by the first turn,
+    so an instance that resumes a stored conversation, or never runs a turn, writes nothing.
+
+    Args:
+        config (Config, optional): `conversation` settings of the default store.
+        store (ConversationStore, optional): Store to keep conversations in instead.
+        conversation_id (int, optional): A stored conversation to resume. Defaults to a new one.
+    """
+    def __init__(self, config: Config = Config(), store: ConversationStore = None, conversation_id: Optional[int] = None):
+        self.store = store if store is not None else ConversationStore(
+            config.conversation["store_path"],
+            max_active=config.conversation["max_active"],
+            max_messages=config.conversation["max_messages"]
+        )
+        self.conversation_id = None
+        if conversation_id is not None:
+            self.resume(conversation_id)
+
+    @property
+    def current_conversation(self) -> int:
+        if self.conversation_id is None:
+            self.conversation_id = self.store.create()
+        return self.conversation_id
+
+    @property
+    def messages(self) -> List[Dict]:
+        if self.conversation_id is None:
+            return []
+        return list(self.store.get(self.conversation_id).messages)
+
+    @property
+    def pcard(self) -> Dict[str, str]:
+        if self.conversation_id is None:
+            return {}
+        return self.store.get(self.conversation_id).pcard
     
     def reset(self):
-        self.current_conversation += 1
-        self.messages = []
-        self.pcard = {}
+        self.conversation_id = None
+
+    def resume(self, conversation_id: int):
+        """
+        Makes a stored conversation the current one, reloading its messages and Patient Card.
+
+        Raises:
+            KeyError: If there is no conversation with this ID.
+        """
+        self.store.get(conversation_id)
+        self.conversation_id = conversation_id
     
-    def add_message(self, message, role="user", attachment_paths = List[str]):
-        self.messages.append({"role": role, "content": message, "attachment_paths": attachment_paths})
+    def add_message(self, message, role="user", attachment_paths: List[str] = None):
+        self.store.add_message(self.current_conversation, message, role, attachment_paths)
     
     def get_messages(self):
         return self.messages
     
     def add_pcard(self, pcard):
-        self.pcard = pcard
+        self.store.set_pcard(self.current_conversation, pcard)
     
     def get_pcard(self):
         return self.pcard
@@ -37,21 +81,12 @@ class Conversation:
                 print(f"Warning: '{key}' is not a recognized Patient Card field and will be ignored.")
 
         filtered_pcard = {k: v for k, v in pcard.items() if k in allowed_keys}
-        self.pcard.update(filtered_pcard)
+        if filtered_pcard:
+            self.store.update_pcard(self.current_conversation, filtered_pcard)
     
     def display_pcard(self):
         if self.pcard:
-            lines = []
-            for key, value in self.pcard.items():
-                lines.append(f">#### **{key}**")
-                for line in str(value).splitlines():
-                    lines.append(f">#### {line}")
-                lines.append(">####")  
-                lines.append(">####")  
-            while lines and lines[-1].strip() == ">####":
-                lines.pop()
-            if lines:
-                display(Markdown("## Patient Card Details"))
-                display(Markdown(f"### 📝\n" + "\n".join(lines)))
+            from ..display import NotebookRenderer
+            NotebookRenderer().render_pcard(self.pcard)
         else:
-            print("No Patient Card to show.")
\ No newline at end of file
+            print("No Patient Card to show.")
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional
+
+class ConversationState:
+    __slots__ = ("id", "messages", "pcard", "file")
+
+    def __init__(self, conversation_id: int, max_messages: Optional[int] = None):
+        self.id = conversation_id
+        self.messages = deque(maxlen=max_messages)
+        self.pcard = {}
+        self.file = None
+
+class ConversationStore:
+    """
+    Keeps the messages and Patient Card of every conversation.
+
+    Each conversation is an append-only JSON Lines file, `<id>.jsonl`, holding one record per
+    message or Patient Card update, so a turn costs one short append and a crash loses at most the
+    line being written. Only the `max_active` most recently used conversations are held in memory;
+    others are evicted and replayed from their file when they are next used.
+
+    Args:
+        path (str, optional): Directory of the conversation files. If None, conversations are only
+            kept in memory and evicted ones cannot be resumed.
+        max_active (int, optional): Conversations kept in memory. Defaults to 64.
+        max_messages (int, optional): Most recent messages kept in memory per conversation. Files
+            keep every message. Defaults to None (no limit).
+    """
+    def __init__(self, path: Optional[str] = None, max_active: int = 64, max_messages: Optional[int] = None):
+        self.path = os.path.expanduser(path) if path is not None else None
+        self.max_active = max_active
+        self.max_messages = max_messages
+        self.active = OrderedDict()
+        self.lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+        ids = self.conversations()
+        self.next_id = max(ids) + 1 if ids else 1
+
+    def conversations(self) -> List[int]:
+        """
+        Returns the IDs of every stored conversation, oldest first.
+        """
+        if self.path is None:
+            with self.lock:
+                return sorted(self.active)
+        ids = []
+        for name in os.listdir(self.path):
+            stem, extension = os.path.splitext(name)
+            if extension == ".jsonl" and stem.isdigit():
+                ids.append(int(stem))
+        return sorted(ids)
+
+    def exists(self, conversation_id: int) -> bool:
+        with self.lock:
+            if conversation_id in self.active:
+                return True
+        return self.path is not None and os.path.isfile(self._file_path(conversation_id))
+
+    def create(self) -> int:
+        """
+        Starts a new conversation and returns its ID.
+        """
+        with self.lock:
+            conversation_id = self.next_id
+            self.next_id += 1
+            self._activate(ConversationState(conversation_id, self.max_messages))
+            self._append(conversation_id, {"type": "created", "time": time.time()})
+            return conversation_id
+
+    def get(self, conversation_id: int) -> ConversationState:
+        """
+        Returns a conversation, reloading it from its file if it is not in memory.
+
+        Raises:
+            KeyError: If there is no conversation with this ID.
+        """
+        with self.lock:
+            state = self.active.get(conversation_id)
+            if state is not None:
+                self.active.move_to_end(conversation_id)
+                return state
+            if not self.exists(conversation_id):
+                raise KeyError(f"No conversation with ID {conversation_id}.")
+            return self._activate(self._load(conversation_id))
+
+    def add_message(self, conversation_id: int, content: str, role: str = "user", attachment_paths: List[str] = None) -> Dict[str, Any]:
+        message = {"role": role, "content": content, "attachment_paths": attachment_paths}
+        with self.lock:
+            state = self.get(conversation_id)
+            state.messages.append(message)
+            self._append(conversation_id, dict(message, type="message", time=time.time()))
+        return message
+
+    def update_pcard(self, conversation_id: int, fields: Dict[str, str]):
+        """
+        Merges fields into the Patient Card of a conversation.
+        """
+        with self.lock:
+            self.get(conversation_id).pcard.update(fields)
+            self._append(conversation_id, {"type": "pcard", "fields": fields, "time": time.time()})
+
+    def set_pcard(self, conversation_id: int, pcard: Dict[str, str]):
+        """
+        Replaces the Patient Card of a conversation.
+        """
+        with self.lock:
+            self.get(conversation_id).pcard = dict(pcard)
+            self._append(conversation_id, {"type": "pcard", "fields": pcard, "replace": True, "time": time.time()})
+
+    def evict(self, conversation_id: int):
+        with self.lock:
+            state = self.active.pop(conversation_id, None)
+            if state is not None:
+                self._close(state)
+
+    def close(self):
+        with self.lock:
+            for state in self.active.values():
+                self._close(state)
+            self.active.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "active": len(self.active),
+                "max_active": self.max_active,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "next_id": self.next_id
+            }
+
+    def _file_path(self, conversation_id: int) -> str:
+        return os.path.join(self.path, f"{conversation_id}.jsonl")
+
+    def _activate(self, state: ConversationState) -> ConversationState:
+        self.active[state.id] = state
+        self.active.move_to_end(state.id)
+        while self.max_active is not None and len(self.active) > self.max_active:
+            _, evicted = self.active.popitem(last=False)
+            self._close(evicted)
+            self.evictions += 1
+        return state
+
+    def _close(self, state: ConversationState):
+        if state.file is not None:
+            state.file.close()
+            state.file = None
+
+    def _append(self, conversation_id: int, record: Dict[str, Any]):
+        if self.path is None:
+            return
+        state = self.active[conversation_id]
+        if state.file is None:
+            path = self._file_path(conversation_id)
+            torn = self._ends_torn(path)
+            state.file = open(path, "a", encoding="utf-8", buffering=1)
+            if torn:
+                state.file.write("\n")
+        state.file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _ends_torn(self, path: str) -> bool:
+        """
+        Whether a file ends in a partly written line, which must be terminated before appending.
+        """
+        try:
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except FileNotFoundError:
+            return False
+
+    def _load(self, conversation_id: int) -> ConversationState:
+        state = ConversationState(conversation_id, self.max_messages)
+        path = self._file_path(conversation_id)
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash while it was being written.
+                    print(f"Warning: Skipping unreadable line {number} of {path}.")
+                    continue
+                kind = record.get("type")
+                if kind == "message":
+                    state.messages.append({
+                        "role": record.get("role"),
+                        "content": record.get("content"),
+                        "attachment_paths": record.get("attachment_paths")
+                    })
+                elif kind == "pcard":
+                    if record.get("replace"):
+                        state.pcard = dict(record.get("fields", {}))
+                    else:
+                        state.pcard.update(record.get("fields", {}))
+        self.loads += 1
+        return state
@@ -2,79 +2,97 @@ from .config import Config
 from .utils import Context
 from .workflow import Workflow
 from .conversation import Conversation
-from typing import List 
-from IPython.display import Audio, Image, Video, Markdown, display
+from .result import QueryResult
+from typing import List
+import time
 
 class AidBud:
-    def __init__(self):
-        self.config = Config()
-        self.context = Context()
-        self.conversation = Conversation()
-        
+    def __init__(self, config: Config = None, renderer=None):
+        self.config = config if config is not None else Config()
+        if self.config.autotune["enabled"]:
+            from .autotune import autotune
+            autotune(self.config)
+        self.context = Context(self.config)
+        self.conversation = Conversation(self.config)
+        self.renderer = renderer
+
     def initialise(self):
         self.workflow = Workflow(context=self.context, config=self.config)
         self.workflow.rag.reset_collections() # RESET COLLECTIONS FOR NOW
         self.context.reset() # RESET CONTEXT FOR NOW TOO
-    
+
     def new_conversation(self):
         self.conversation.reset()
-    
+
+    def resume_conversation(self, conversation_id: int):
+        """
+        Continues a stored conversation, with its messages and Patient Card, from any earlier session.
+        """
+        self.conversation.resume(conversation_id)
+
     def reset(self):
         self.initialise()
         self.new_conversation()
-    
-    def query(self, query: str = None, attachment_paths: List[str] = None):
+
+    def query(self, query: str = None, attachment_paths: List[str] = None) -> QueryResult:
+        """
+        Runs one turn of the current conversation.
+
+        Args:
+            query (str, optional): The user's query.
+            attachment_paths (List[str], optional): Paths or URLs of images, videos or audio sent with the query.
+
+        Returns:
+            QueryResult: The response, the Patient Card fields changed this turn, the merged Patient
+            Card, the descriptors of the accepted attachments, and stage timings in seconds.
+
+        Nothing is displayed unless the instance was created with a renderer, such as
+        `aidbud.display.NotebookRenderer`, or `display` is called on the result.
+        """
         if query == None and attachment_paths == None:
             raise ValueError("At least query or attahment_paths must be provided.")
-        
-        video_paths, audio_paths, image_paths = self.workflow.classify_attachments(attachment_paths)
-        if query == None and video_paths == None and audio_paths == None and image_paths == None:
+
+        start = time.perf_counter()
+        attachments = self.workflow.registry.probe_all(attachment_paths)
+        classify_time = time.perf_counter() - start
+        if query == None and not attachments:
             raise ValueError("At least query or valid attachments must be provided.")
-        
-        output = self.workflow.run(conversation_id=self.conversation.current_conversation, query=query, attachment_paths=attachment_paths)
 
-        if output.get("error"):
-            display(Markdown("## Error"))
-            display(Markdown(f"### ❌\n#### {output["error"]}"))
-        
-        display(Markdown("## Conversation Details"))
+        valid_paths = [attachment.path for attachment in attachments] or None
+        conversation_id = self.conversation.current_conversation
+        output = self.workflow.run(conversation_id=conversation_id, query=query, attachment_paths=valid_paths)
+
+        if not output.get("error"):
+            self.conversation.add_message(query, "user", attachment_paths=valid_paths)
+            if output.get("response"):
+                self.conversation.add_message(output["response"], "assistant")
+            if output.get("pcard"):
+                self.conversation.update_pcard(output["pcard"])
+
+        timings = dict(output.get("timings", {}), classify=classify_time)
+        timings["total"] = time.perf_counter() - start
+        result = QueryResult(
+            conversation_id=conversation_id,
+            query=query,
+            response=output.get("response"),
+            pcard=output.get("pcard"),
+            merged_pcard=dict(self.conversation.pcard),
+            attachments=attachments,
+            error=output.get("error"),
+            timings=timings,
+            context_usage=output.get("context_usage")
+        )
 
-        for video_path in video_paths:
-            display(Video(video_path))
-        for audio_path in audio_paths:
-            display(Audio(audio_path))
-        for image_path in image_paths:
-            display(Image(image_path))
-        
-        if query:
-            display(Markdown(f"### 🙋‍♂️\n>#### {query}"))
-        
-        if output.get("response"):
-            self.conversation.add_message(output["response"], "user", attachment_paths=attachment_paths)
-            display(Markdown(f"### 🤖\n>#### {output['response']}"))
+        if self.renderer is not None:
+            self.renderer.render(result)
+        return result
 
-        if output.get("pcard"):
-            self.conversation.update_pcard(output["pcard"])
-            lines = []
-            for key, value in output["pcard"].items():
-                lines.append(f">#### **{key}**")
-                for line in str(value).splitlines():
-                    lines.append(f">### {line}")
-                lines.append(">####")  
-            while lines and lines[-1].strip() == ">####":
-                lines.pop()
-            display(Markdown(f"📝\n" + "\n".join(lines)))
-        
-        if self.conversation.pcard:
-            lines = []
-            for key, value in self.conversation.pcard.items():
-                lines.append(f">#### **{key}**")
-                for line in str(value).splitlines():
-                    lines.append(f">#### {line}")
-                lines.append(">####")  
-                lines.append(">####")  
-            while lines and lines[-1].strip() == ">####":
-                lines.pop()
-            if lines:
-                display(Markdown("## Patient Card Details"))
-                display(Markdown(f"### 📝\n" + "\n".join(lines)))
\ No newline at end of file
+    def display(self, result: QueryResult):
+        """
+        Renders a query result in a notebook, importing IPython only when called.
+        """
+        renderer = self.renderer
+        if renderer is None:
+            from .display import NotebookRenderer
+            renderer = NotebookRenderer()
+        renderer.render(result)
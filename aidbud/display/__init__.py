@@ -0,0 +1,3 @@
+from .notebook import NotebookRenderer, pcard_markdown, result_markdown
+
+__all__ = ["NotebookRenderer", "pcard_markdown", "result_markdown"]
@@ -0,0 +1,70 @@
+from typing import Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..result import QueryResult
+
+def pcard_markdown(pcard: Dict[str, str], heading: str = "####", spacer: int = 1) -> str:
+    lines = []
+    for key, value in pcard.items():
+        lines.append(f">#### **{key}**")
+        for line in str(value).splitlines():
+            lines.append(f">{heading} {line}")
+        lines.extend([">####"] * spacer)
+    while lines and lines[-1].strip() == ">####":
+        lines.pop()
+    return "\n".join(lines)
+
+def result_markdown(result: "QueryResult") -> str:
+    """
+    Formats a query result as Markdown: the error if there is one, the query, the response, the
+    Patient Card changes of this turn and the merged Patient Card.
+    """
+    sections = []
+    if result.error:
+        sections.append(f"## Error\n### ❌\n#### {result.error}")
+    sections.append("## Conversation Details")
+    if result.query:
+        sections.append(f"### 🙋‍♂️\n>#### {result.query}")
+    if result.response:
+        sections.append(f"### 🤖\n>#### {result.response}")
+    if result.pcard:
+        sections.append("📝\n" + pcard_markdown(result.pcard, heading="###"))
+    if result.merged_pcard:
+        sections.append("## Patient Card Details\n### 📝\n" + pcard_markdown(result.merged_pcard, spacer=2))
+    return "\n\n".join(sections)
+
+class NotebookRenderer:
+    """
+    Displays query results in a Jupyter notebook. IPython is imported on first use, so only callers
+    that render pay for it.
+    """
+    def render(self, result: "QueryResult"):
+        from IPython.display import Audio, Image, Video, Markdown, display
+
+        if result.error:
+            display(Markdown("## Error"))
+            display(Markdown(f"### ❌\n#### {result.error}"))
+
+        display(Markdown("## Conversation Details"))
+        for video_path in result.paths("video"):
+            display(Video(video_path))
+        for audio_path in result.paths("audio"):
+            display(Audio(audio_path))
+        for image_path in result.paths("image"):
+            display(Image(image_path))
+
+        if result.query:
+            display(Markdown(f"### 🙋‍♂️\n>#### {result.query}"))
+        if result.response:
+            display(Markdown(f"### 🤖\n>#### {result.response}"))
+        if result.pcard:
+            display(Markdown("📝\n" + pcard_markdown(result.pcard, heading="###")))
+        self.render_pcard(result.merged_pcard)
+
+    def render_pcard(self, pcard: Dict[str, str]):
+        from IPython.display import Markdown, display
+
+        lines = pcard_markdown(pcard, spacer=2) if pcard else ""
+        if lines:
+            display(Markdown("## Patient Card Details"))
+            display(Markdown("### 📝\n" + lines))
@@ -3,15 +3,18 @@ import tiktoken
 from typing import List, Dict, Union, Any, Tuple, Optional
 from sentence_transformers import SentenceTransformer
 from ...config import Config
+from ...tracing import get_tracer
 import numpy as np
 
 class Embedder:
     def __init__(self, config: Config = Config()):
-        self.embedding_model = SentenceTransformer(config.rag["embedder"])
-        self.tokenizer = tiktoken.get_encoding(config.rag["tokeniser"])
+        self.embedding_model, self.tokenizer = self._load_model(config)
         self.max_token_length = config.rag["embedder_max_tokens"]
         print(f"Initialised embedding model: {config.rag['embedder']} (max_tokens={self.max_token_length})")
 
+    def _load_model(self, config: Config) -> Tuple[Any, Any]:
+        return SentenceTransformer(config.rag["embedder"]), tiktoken.get_encoding(config.rag["tokeniser"])
+
     def _chunk_text(self, text: str, max_tokens: int = -1, overlap: int = 50) -> List[str]:
         if max_tokens == -1:
             max_tokens = self.max_token_length
@@ -84,7 +87,8 @@ class Embedder:
             texts = [texts]
 
         try:
-            embeddings = self.embedding_model.encode(texts).tolist()
+            with get_tracer().span("embedder.encode", texts=len(texts)):
+                embeddings = self.embedding_model.encode(texts).tolist()
 
             return [np.array(vec, dtype=np.float32) for vec in embeddings]
         except Exception as e:
@@ -1,3 +1,7 @@
 from .llm import LLM
+from .memo import GenerationMemo
+from .constrained import JsonSchemaLogitsProcessor
+from .lazy import ModalityTowers
+from .segments import segment_path, split_segment, plan_segments
 
-__all__ = ["LLM"]
\ No newline at end of file
+__all__ = ["LLM", "GenerationMemo", "JsonSchemaLogitsProcessor", "ModalityTowers", "segment_path", "split_segment", "plan_segments"]
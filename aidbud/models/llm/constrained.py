@@ -0,0 +1,353 @@
+import re
+import copy
+import torch
+from typing import List, Dict, Any, Optional
+
+MAX_WHITESPACE = 16
+WHITESPACE = " \t\n\r"
+HEX_DIGITS = "0123456789abcdefABCDEF"
+BYTE_TOKEN = re.compile(r"<0x([0-9A-Fa-f]{2})>")
+
+class _Branch:
+    __slots__ = ("properties", "required", "min_properties")
+
+    def __init__(self, schema: Dict[str, Any]):
+        if schema.get("type") != "object":
+            raise ValueError(f"Constrained decoding only supports object schemas, got: {schema.get('type')}")
+        self.properties = {}
+        for name, spec in schema.get("properties", {}).items():
+            if spec.get("type") not in ("string", "integer"):
+                raise ValueError(f"Unsupported type for property '{name}': {spec.get('type')}")
+            self.properties[name] = spec
+        self.required = frozenset(schema.get("required", []))
+        self.min_properties = schema.get("minProperties", 0)
+
+def compile_schema(schema: Dict[str, Any]) -> List[_Branch]:
+    """
+    Compiles a JSON schema into the object branches the matcher walks. Supported: a flat object, or
+    `anyOf` a list of flat objects, whose properties are strings (optionally `enum`) or integers.
+    Additional properties are never allowed.
+    """
+    return [_Branch(branch) for branch in schema.get("anyOf", [schema])]
+
+class SchemaMatcher:
+    """
+    Character-level recogniser for JSON documents of a compiled schema. `feed` advances it and
+    reports whether the text is still a valid prefix; `complete` is set once the object is closed.
+    """
+    def __init__(self, branches: List[_Branch]):
+        self.all_branches = branches
+        self.branches = tuple(range(len(branches)))
+        self.phase = "start"
+        self.used = frozenset()
+        self.key = ""
+        self.spec = None
+        self.buffer = ""
+        self.whitespace = 0
+        self.unicode = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.phase == "done"
+
+    def copy(self) -> "SchemaMatcher":
+        return copy.copy(self)
+
+    def feed(self, text: str) -> bool:
+        for char in text:
+            if not self._step(char):
+                return False
+        return True
+
+    def _allowed_keys(self) -> List[str]:
+        keys = []
+        for index in self.branches:
+            keys.extend(key for key in self.all_branches[index].properties if key not in self.used)
+        return keys
+
+    def _can_close(self) -> bool:
+        for index in self.branches:
+            branch = self.all_branches[index]
+            if branch.required <= self.used and len(self.used) >= branch.min_properties:
+                return True
+        return False
+
+    def _skip_whitespace(self, char: str) -> bool:
+        if char in WHITESPACE and self.whitespace < MAX_WHITESPACE:
+            self.whitespace += 1
+            return True
+        return False
+
+    def _end_value(self):
+        self.used = self.used | {self.key}
+        self.phase = "after_value"
+        self.whitespace = 0
+
+    def _step(self, char: str) -> bool:
+        phase = self.phase
+
+        if phase == "string":
+            if char == '"':
+                self._end_value()
+            elif char == "\\":
+                self.phase = "escape"
+            elif char < " ":
+                return False
+            return True
+        if phase == "escape":
+            if char == "u":
+                self.phase, self.unicode = "unicode", 4
+                return True
+            if char in '"\\/bfnrt':
+                self.phase = "string"
+                return True
+            return False
+        if phase == "unicode":
+            if char not in HEX_DIGITS:
+                return False
+            self.unicode -= 1
+            if self.unicode == 0:
+                self.phase = "string"
+            return True
+
+        if phase == "key":
+            if char == '"':
+                if self.key not in self._allowed_keys():
+                    return False
+                self.branches = tuple(i for i in self.branches if self.key in self.all_branches[i].properties and self.key not in self.used)
+                self.spec = self.all_branches[self.branches[0]].properties[self.key]
+                self.phase, self.whitespace = "colon", 0
+                return True
+            prefix = self.key + char
+            if not any(key.startswith(prefix) for key in self._allowed_keys()):
+                return False
+            self.key = prefix
+            return True
+        if phase == "enum":
+            if char == '"':
+                if self.buffer not in self.spec["enum"]:
+                    return False
+                self._end_value()
+                return True
+            prefix = self.buffer + char
+            if not any(value.startswith(prefix) for value in self.spec["enum"]):
+                return False
+            self.buffer = prefix
+            return True
+        if phase == "integer":
+            if char.isdigit() and char.isascii():
+                if self.buffer in ("0", "-0"):
+                    return False
+                self.buffer += char
+                return True
+            if self.buffer == "-":
+                return False
+            self._end_value()
+            return self._step(char)
+
+        if self._skip_whitespace(char):
+            return True
+        self.whitespace = 0
+
+        if phase == "start":
+            if char == "{":
+                self.phase = "open"
+                return True
+            return False
+        if phase in ("open", "comma"):
+            if char == '"' and self._allowed_keys():
+                self.phase, self.key = "key", ""
+                return True
+            if char == "}" and phase == "open" and self._can_close():
+                self.phase = "done"
+                return True
+            return False
+        if phase == "colon":
+            if char == ":":
+                self.phase = "value"
+                return True
+            return False
+        if phase == "value":
+            if self.spec["type"] == "integer":
+                if char == "-" or (char.isdigit() and char.isascii()):
+                    self.phase, self.buffer = "integer", char
+                    return True
+                return False
+            if char == '"':
+                if "enum" in self.spec:
+                    self.phase, self.buffer = "enum", ""
+                else:
+                    self.phase = "string"
+                return True
+            return False
+        if phase == "after_value":
+            if char == "," and self._allowed_keys():
+                self.phase = "comma"
+                return True
+            if char == "}" and self._can_close():
+                self.phase = "done"
+                return True
+            return False
+        return False
+
+class TokenTexts:
+    """
+    The text each token of a tokenizer adds to the output, as the matcher sees it. Texts are decoded
+    on first use and kept for the lifetime of the instance, so one instance should be shared by
+    every generation with the same tokenizer.
+    """
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.texts = {}
+        self.first_chars = None
+        self.plain = None
+        self.special = None
+
+    def __getitem__(self, token: int) -> str:
+        text = self.texts.get(token)
+        if text is None:
+            piece = self.tokenizer.convert_ids_to_tokens(token) or ""
+            byte = BYTE_TOKEN.fullmatch(piece)
+            if byte is not None:
+                value = int(byte.group(1), 16)
+                # A lone byte of a multi-byte character can only appear inside a string.
+                text = chr(value) if value < 0x80 else "ÿ"
+            else:
+                text = self.tokenizer.decode([token])
+                if piece.startswith("▁") and not text.startswith(" "):
+                    text = " " + text
+            self.texts[token] = text
+        return text
+
+    def index(self):
+        """
+        Decodes the whole vocabulary once and groups it for full-vocabulary masks: `first_chars`
+        maps a first character to the tokens starting with it, `plain` lists the tokens that only
+        continue a string, with no quote, backslash or control character, and `special` the rest.
+        """
+        if self.special is not None:
+            return
+        first_chars, plain, special = {}, [], []
+        for token in range(len(self.tokenizer)):
+            text = self[token]
+            if not text:
+                continue
+            first_chars.setdefault(text[0], []).append(token)
+            if '"' not in text and "\\" not in text and min(text) >= " ":
+                plain.append(token)
+            else:
+                special.append(token)
+        self.first_chars, self.plain, self.special = first_chars, plain, special
+
+class JsonSchemaLogitsProcessor:
+    """
+    Masks every token that would take the output outside a JSON schema, so generation can only
+    produce a document of that schema followed by end-of-sequence.
+
+    With greedy decoding the mask is built lazily: only the `top_k` highest scoring tokens are
+    checked against the schema, widening the window fourfold until at least one passes, which picks
+    exactly the token an eager full-vocabulary mask would at a fraction of the checks. When sampling,
+    every token of the vocabulary is checked, so the sampling distribution (and any top-k or top-p
+    applied after this processor) covers every valid token; this decodes the whole vocabulary once
+    per `TokenTexts` and costs more per step than the greedy mask.
+    """
+    def __init__(
+        self,
+        schema: Dict[str, Any],
+        tokenizer,
+        eos_token_ids: List[int],
+        top_k: int = 32,
+        sample: bool = False,
+        token_texts: Optional[TokenTexts] = None
+    ):
+        self.branches = compile_schema(schema)
+        self.tokenizer = tokenizer
+        self.eos_token_ids = [token for token in eos_token_ids if token is not None]
+        self.top_k = top_k
+        self.sample = sample
+        self.token_texts = token_texts if token_texts is not None else TokenTexts(tokenizer)
+        self.prompt_length = None
+        self.matchers = []
+        self.consumed = []
+        self.finished = []
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+            self.matchers = [SchemaMatcher(self.branches) for _ in range(input_ids.shape[0])]
+            self.consumed = [0] * input_ids.shape[0]
+            self.finished = [False] * input_ids.shape[0]
+
+        mask = torch.full_like(scores, float("-inf"))
+        for row in range(input_ids.shape[0]):
+            self._advance(row, input_ids[row, self.prompt_length + self.consumed[row]:].tolist())
+            mask[row, self._allowed(row, scores[row])] = 0
+        return scores + mask
+
+    def _advance(self, row: int, tokens: List[int]):
+        self.consumed[row] += len(tokens)
+        for token in tokens:
+            if self.finished[row]:
+                return
+            if token in self.eos_token_ids:
+                self.finished[row] = True
+            elif not self.matchers[row].feed(self.token_texts[token]):
+                self.finished[row] = True
+
+    def _allowed(self, row: int, row_scores: torch.Tensor) -> List[int]:
+        matcher = self.matchers[row]
+        if self.finished[row] or matcher.complete:
+            return self.eos_token_ids
+        if self.sample:
+            return self._all_allowed(matcher)
+
+        vocab_size = row_scores.shape[-1]
+        k, checked = min(self.top_k, vocab_size), 0
+        while True:
+            candidates = torch.topk(row_scores, k).indices.tolist()
+            allowed = [token for token in candidates[checked:] if self._accepts(matcher, token)]
+            if allowed:
+                return allowed
+            if k == vocab_size:
+                return self.eos_token_ids
+            checked, k = k, min(k * 4, vocab_size)
+
+    def _all_allowed(self, matcher: SchemaMatcher) -> List[int]:
+        texts = self.token_texts
+        texts.index()
+        if matcher.phase == "string":
+            # Plain tokens keep any string going, so only the rest need checking.
+            allowed = texts.plain + [token for token in texts.special if self._accepts(matcher, token)]
+        else:
+            allowed = []
+            for char, tokens in texts.first_chars.items():
+                if matcher.copy().feed(char):
+                    allowed.extend(token for token in tokens if self._accepts(matcher, token))
+        allowed = [token for token in allowed if token not in self.eos_token_ids]
+        return allowed or self.eos_token_ids
+
+    def _accepts(self, matcher: SchemaMatcher, token: int) -> bool:
+        if token in self.eos_token_ids:
+            return False
+        text = self.token_texts[token]
+        return bool(text) and matcher.copy().feed(text)
+
+def schema_processor(
+    schema: Optional[Dict[str, Any]],
+    processor,
+    model,
+    sample: bool = False,
+    token_texts: Optional[TokenTexts] = None
+) -> Optional[JsonSchemaLogitsProcessor]:
+    """
+    Builds the logits processor for a schema from a Hugging Face processor and model, or returns
+    None if there is no schema. Pass `sample` when generation samples, and the `TokenTexts` of the
+    processor's tokenizer to reuse the tokens decoded by earlier generations.
+    """
+    if schema is None:
+        return None
+    tokenizer = getattr(processor, "tokenizer", processor)
+    eos_token_ids = getattr(model.generation_config, "eos_token_id", None)
+    if not isinstance(eos_token_ids, list):
+        eos_token_ids = [eos_token_ids if eos_token_ids is not None else tokenizer.eos_token_id]
+    return JsonSchemaLogitsProcessor(schema, tokenizer, eos_token_ids, sample=sample, token_texts=token_texts)
@@ -0,0 +1,243 @@
+import json
+import mmap
+import time
+import threading
+from typing import List, Dict, Any, Tuple, Optional
+
+import torch
+from ...tracing import get_tracer
+
+try:
+    from accelerate import init_empty_weights
+except ImportError:
+    init_empty_weights = None
+
+try:
+    from transformers import AutoConfig, AutoModelForImageTextToText, GenerationConfig
+    from transformers.utils import cached_file
+except ImportError:
+    AutoConfig = AutoModelForImageTextToText = GenerationConfig = cached_file = None
+
+# The modality encoders of Gemma 3n, by the attribute they are held in. The small embedders that
+# project their outputs into the text model stay loaded, as text-only forward passes use them too.
+TOWERS = {"vision": "vision_tower", "audio": "audio_tower"}
+
+_DTYPES = {
+    "BF16": torch.bfloat16, "F16": torch.float16, "F32": torch.float32, "F64": torch.float64,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8, "BOOL": torch.bool
+}
+
+class SafetensorsFile:
+    """
+    A memory-mapped safetensors file whose tensors are views on the mapping, not copies.
+
+    The mapping is copy-on-write, so pages are read from disk on first touch, shared with the page
+    cache, and can be dropped by the OS under memory pressure.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            header_length = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_length))
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        header.pop("__metadata__", None)
+        self.offset = 8 + header_length
+        self.entries = header
+
+    def keys(self) -> List[str]:
+        return list(self.entries)
+
+    def tensor(self, key: str) -> torch.Tensor:
+        entry = self.entries[key]
+        dtype = _DTYPES[entry["dtype"]]
+        start, end = entry["data_offsets"]
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        if count == 0:
+            return torch.empty(entry["shape"], dtype=dtype)
+        return torch.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.offset + start).view(entry["shape"])
+
+def checkpoint_files(model_id: str) -> List[str]:
+    """
+    Returns the local paths of a model's safetensors files, downloading them if needed, or an empty
+    list if the model has none.
+    """
+    index = cached_file(model_id, "model.safetensors.index.json", _raise_exceptions_for_missing_entries=False)
+    if index is not None:
+        with open(index, "r", encoding="utf-8") as f:
+            shards = sorted(set(json.load(f)["weight_map"].values()))
+        return [cached_file(model_id, shard) for shard in shards]
+    single = cached_file(model_id, "model.safetensors", _raise_exceptions_for_missing_entries=False)
+    return [single] if single is not None else []
+
+def _find_module(model: torch.nn.Module, attribute: str) -> Tuple[Optional[str], Optional[torch.nn.Module]]:
+    # The outermost submodule held in `attribute`, e.g. "model.vision_tower".
+    for name, module in model.named_modules():
+        if name.split(".")[-1] == attribute:
+            return name, module
+    return None, None
+
+class ModalityTowers:
+    """
+    Loads the vision and audio encoders of a model only when a request needs them, and releases them
+    again after `idle_seconds` without use.
+
+    A released tower keeps its modules and buffers but its parameters are on the meta device, so it
+    holds no memory. Loading assigns views on the memory-mapped checkpoint to its parameters (cast
+    if the checkpoint is in another dtype).
+
+    Args:
+        model (torch.nn.Module): The model, with its towers not yet loaded.
+        files (List[SafetensorsFile]): The model's checkpoint.
+        prefixes (Dict[str, str]): Checkpoint key prefix of each lazy tower's module, by modality.
+        dtype (torch.dtype): Dtype of the loaded parameters.
+        idle_seconds (float, optional): Seconds without use after which a tower is released. Defaults
+            to None (never released).
+    """
+    def __init__(self, model: torch.nn.Module, files: List[SafetensorsFile], prefixes: Dict[str, str], dtype: torch.dtype, idle_seconds: Optional[float] = None):
+        self.model = model
+        self.files = files
+        self.prefixes = prefixes
+        self.dtype = dtype
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.in_use = {modality: 0 for modality in prefixes}
+        self.last_used = {modality: 0.0 for modality in prefixes}
+        self.loaded = {modality: False for modality in prefixes}
+        self.timers = {}
+        self.loads = 0
+        self.releases = 0
+
+    @property
+    def modalities(self) -> List[str]:
+        return list(self.prefixes)
+
+    def acquire(self, modalities: List[str]):
+        """
+        Loads the towers of the given modalities if needed and marks them in use until `release`.
+        """
+        with self.lock:
+            for modality in modalities:
+                if modality not in self.prefixes:
+                    continue
+                self.in_use[modality] += 1
+                if not self.loaded[modality]:
+                    self._load(modality)
+
+    def release(self, modalities: List[str]):
+        with self.lock:
+            for modality in modalities:
+                if modality not in self.prefixes:
+                    continue
+                self.in_use[modality] -= 1
+                self.last_used[modality] = time.monotonic()
+                if self.idle_seconds is not None and self.in_use[modality] == 0:
+                    self._schedule_release(modality)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"loaded": dict(self.loaded), "loads": self.loads, "releases": self.releases}
+
+    def _module(self, modality: str) -> torch.nn.Module:
+        return self.model.get_submodule(self.prefixes[modality])
+
+    def _load(self, modality: str):
+        prefix = self.prefixes[modality] + "."
+        with get_tracer().span("llm.load_tower", modality=modality) as span:
+            state = {}
+            for file in self.files:
+                for key in file.keys():
+                    if key.startswith(prefix):
+                        tensor = file.tensor(key)
+                        state[key[len(prefix):]] = tensor.to(self.dtype) if tensor.is_floating_point() else tensor
+            module = self._module(modality)
+            module.load_state_dict(state, strict=False, assign=True)
+            span.set(tensors=len(state))
+        if any(parameter.is_meta for parameter in module.parameters()):
+            raise RuntimeError(f"The checkpoint does not hold every weight of the {modality} tower.")
+        self.loaded[modality] = True
+        self.loads += 1
+        get_tracer().metric("llm.tower.loads", 1, modality=modality)
+
+    def _unload(self, modality: str):
+        for module in self._module(modality).modules():
+            for name, parameter in list(module._parameters.items()):
+                if parameter is not None:
+                    module._parameters[name] = torch.nn.Parameter(torch.empty_like(parameter, device="meta"), requires_grad=False)
+        self.loaded[modality] = False
+        self.releases += 1
+
+    def _schedule_release(self, modality: str):
+        timer = self.timers.pop(modality, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(self.idle_seconds, self._release_if_idle, args=(modality,))
+        timer.daemon = True
+        self.timers[modality] = timer
+        timer.start()
+
+    def _release_if_idle(self, modality: str):
+        with self.lock:
+            idle = time.monotonic() - self.last_used[modality]
+            if self.loaded[modality] and self.in_use[modality] == 0 and idle >= self.idle_seconds * 0.99:
+                self._unload(modality)
+
+def load_lazy_model(model_id: str, dtype: torch.dtype = torch.bfloat16, idle_seconds: Optional[float] = None) -> Tuple[Optional[torch.nn.Module], Optional[ModalityTowers]]:
+    """
+    Builds a model with empty weights and fills everything but its modality towers from the
+    memory-mapped checkpoint. The towers are loaded by the returned `ModalityTowers` when needed.
+
+    Returns:
+        Tuple[Optional[torch.nn.Module], Optional[ModalityTowers]]: The model and its towers, or
+        (None, None) if the model cannot be loaded this way, e.g. it has no safetensors checkpoint
+        or its checkpoint keys are in a legacy layout that transformers renames on load (Gemma 3n's
+        are not), so the caller loads it eagerly.
+    """
+    if init_empty_weights is None or AutoModelForImageTextToText is None:
+        print("Warning: Lazy modality loading needs `accelerate`. Loading the full model.")
+        return None, None
+    paths = checkpoint_files(model_id)
+    if not paths:
+        print(f"Warning: No safetensors checkpoint found for {model_id}. Loading the full model.")
+        return None, None
+
+    config = AutoConfig.from_pretrained(model_id)
+    with init_empty_weights():
+        model = AutoModelForImageTextToText.from_config(config, dtype=dtype)
+
+    prefixes = {}
+    for modality, attribute in TOWERS.items():
+        name, _ = _find_module(model, attribute)
+        if name is not None:
+            prefixes[modality] = name
+            # Registered last, so the model's first parameter, which `model.device` and generation
+            # go by, is never an unloaded tower's.
+            parent = model.get_submodule(name.rpartition(".")[0])
+            parent._modules[attribute] = parent._modules.pop(attribute)
+
+    files = [SafetensorsFile(path) for path in paths]
+    expected = model.state_dict()
+    state = {}
+    for file in files:
+        for key in file.keys():
+            if any(key.startswith(prefix + ".") for prefix in prefixes.values()):
+                continue
+            if key not in expected:
+                print(f"Warning: Checkpoint key {key} does not match the model. Loading the full model.")
+                return None, None
+            tensor = file.tensor(key)
+            state[key] = tensor.to(dtype) if tensor.is_floating_point() else tensor
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+
+    towers = tuple(prefix + "." for prefix in prefixes.values())
+    missing = [name for name, parameter in model.named_parameters() if parameter.is_meta and not name.startswith(towers)]
+    if missing:
+        print(f"Warning: {len(missing)} weights, e.g. {missing[0]}, are not in the checkpoint. Loading the full model.")
+        return None, None
+
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(model_id)
+    except OSError:
+        pass
+    model.eval()
+    return model, ModalityTowers(model, files, prefixes, dtype, idle_seconds)
@@ -1,7 +1,10 @@
 import os
 import io
+import math
+import importlib.util
 import base64
 import time
+import threading
 import requests
 import torch
 import cv2
@@ -11,13 +14,20 @@ from typing import List, Dict, Any, Tuple, Union
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import tempfile
 from ...config import Config
+from ...tracing import get_tracer
+from .memo import GenerationMemo
+from .constrained import TokenTexts, schema_processor
+from .vad import VoiceActivityDetector, resample, trim_audios
+from .segments import split_segment
+from .lazy import load_lazy_model
 
 try:
-    from transformers import AutoProcessor, AutoModelForImageTextToText
+    from transformers import AutoProcessor, AutoModelForImageTextToText, LogitsProcessorList
 except ImportError:
     print("Hugging Face `transformers` is not installed. Please run `pip install transformers`.")
     AutoProcessor = None
     AutoModelForImageTextToText = None
+    LogitsProcessorList = None
 
 try:
     import timm
@@ -31,11 +41,10 @@ except ImportError:
     print("`soundfile` library is not installed. Please run `pip install soundfile`.")
     sf = None
 
-try:
-    from moviepy import VideoFileClip
-except ImportError:
+# moviepy imports IPython when it is imported, so it is only loaded once audio is extracted from a video.
+MOVIEPY_AVAILABLE = importlib.util.find_spec("moviepy") is not None
+if not MOVIEPY_AVAILABLE:
     print("`moviepy` library is not installed. Please run `pip install moviepy`.")
-    VideoFileClip = None
 
 try:
     import cv2
@@ -44,26 +53,54 @@ except ImportError:
     cv2 = None
 
 
+class _FirstStepTimer:
+    def __init__(self):
+        self.first_step = None
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if self.first_step is None:
+            self.first_step = time.perf_counter()
+        return scores
+
 class LLM:
-    def __init__(self, config: Config = Config()):
+    def __init__(self, config: Config = Config(), registry=None):
         if AutoProcessor is None or AutoModelForImageTextToText is None:
             raise RuntimeError("Hugging Face `transformers` library not found. Cannot initialize.")
 
         self.config = config
+        self.registry = registry
         self.model_id = self.config.llm["model_id"]
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        if self.config.llm["torch_threads"] is not None:
+            torch.set_num_threads(self.config.llm["torch_threads"])
         
         print(f"Loading model '{self.model_id}' on device: {self.device}...")
 
-        self.processor = AutoProcessor.from_pretrained(self.model_id)
-        self.model = AutoModelForImageTextToText.from_pretrained(
-            self.model_id, 
-            torch_dtype=torch.bfloat16, 
-            device_map="auto"
-        )
+        self.towers = None
+        self.processor, self.model = self._load_model()
+        self.token_texts = TokenTexts(getattr(self.processor, "tokenizer", self.processor))
         print("Model loaded successfully.")
         
         self.fps = self.config.llm["fps"]
+        self.max_frames = self.config.llm["max_frames"]
+        self.audio_sample_rate = self.config.llm["audio_sample_rate"]
+        self.max_audio_seconds = self.config.llm["max_audio_seconds"]
+        self.vad = VoiceActivityDetector(
+            self.audio_sample_rate,
+            frame_ms=self.config.llm["vad_frame_ms"],
+            energy_margin_db=self.config.llm["vad_energy_margin_db"],
+            min_energy_db=self.config.llm["vad_min_energy_db"],
+            zcr_threshold=self.config.llm["vad_zcr_threshold"],
+            min_speech_ms=self.config.llm["vad_min_speech_ms"],
+            padding_ms=self.config.llm["vad_padding_ms"],
+            max_gap_ms=self.config.llm["vad_max_gap_ms"]
+        ) if self.config.llm["vad_enabled"] else None
+        self.audio_stats = {"clips": 0, "original_seconds": 0.0, "kept_seconds": 0.0}
+        self.audio_stats_lock = threading.Lock()
+        self.generation_kwargs = {"max_new_tokens": self.config.llm["max_new_tokens"]}
+        if self.config.llm["do_sample"] is not None:
+            self.generation_kwargs["do_sample"] = self.config.llm["do_sample"]
+        self.memo = GenerationMemo(config.memo["path"], config.memo["max_entries"]) if config.memo["enabled"] else None
         self.max_workers = self.config.llm["num_workers"] if self.config.llm["num_workers"] is not None else os.cpu_count()
 
         self.image_processing = True
@@ -75,7 +112,7 @@ class LLM:
             print("OpenCV is not available. Cannot process video.")
             self.video_processing = False
         
-        if VideoFileClip is None:
+        if not MOVIEPY_AVAILABLE:
             print("moviepy library is not available. Cannot extract audio from videos.")
             self.video_audio_processing = False
         
@@ -83,6 +120,26 @@ class LLM:
             print("Soundfile library is not available. Cannot process audio.")
             self.audio_processing = False
 
+    def _load_model(self) -> Tuple[Any, Any]:
+        """
+        Loads the processor and model for `self.model_id`. Subclasses override this to run the
+        pipeline on other models, such as the stand-ins used by the benchmarks.
+        """
+        processor = AutoProcessor.from_pretrained(self.model_id)
+        if self.config.llm["lazy_modalities"]:
+            if self.device == "cpu":
+                model, self.towers = load_lazy_model(self.model_id, torch.bfloat16, self.config.llm["modality_idle_seconds"])
+                if model is not None:
+                    return processor, model
+            else:
+                print("Lazy modality loading only applies on CPU. Loading the full model.")
+        model = AutoModelForImageTextToText.from_pretrained(
+            self.model_id, 
+            torch_dtype=torch.bfloat16, 
+            device_map="auto"
+        )
+        return processor, model
+
     def _prepare_prompt(self, prompt: str, images: List[Image.Image] = None, audios: List[np.ndarray] = None) -> List[Dict[str, Any]]:
         """
         Prepares a prompt for the LLM model by adding any given images and audio data to the prompt string.
@@ -127,126 +184,155 @@ class LLM:
         except Exception as e:
             return None
     
-    def _prepare_video(self, video_path: str) -> Tuple[List[Image.Image], Union[np.ndarray, None]]:
+    def _prepare_video(self, video_path: str) -> Tuple[Union[np.ndarray, None], Union[np.ndarray, None]]:
         """
         Prepares video frames and extracts audio from a given video path.
 
         Args:
-            video_path (str): The path or URL to the video file.
+            video_path (str): The path or URL to the video file, optionally with a "#t=start,end"
+                fragment (see `segment_path`) to read only those seconds of it.
 
         Returns:
-            Tuple[List[Image.Image], Union[np.ndarray, None]]: A tuple containing a list of extracted 
-            video frames as PIL Image objects and the extracted audio data as a numpy array 
-            (or None if audio extraction is disabled or fails).
-            
-        This function manages both local and remote video files. It extracts frames at a rate specified 
-        by the instance's fps attribute and converts them to RGB images. If video_audio_processing is 
-        enabled, it also extracts audio from the video and returns it as a numpy array.
+            Tuple[Union[np.ndarray, None], Union[np.ndarray, None]]: The sampled frames as one RGB
+            uint8 array of shape (frames, height, width, 3), and the extracted audio data as a numpy
+            array. Either is None if it could not be read, or audio extraction is disabled.
+
+        Remote videos are downloaded to a temporary file first and then read like local ones. Frames
+        are sampled at the instance's fps attribute, within the max_frames budget.
         """
-        images = []
-        audio = None
-        
-        if video_path.startswith("http://") or video_path.startswith("https://"):
-            try:
-                response = requests.get(video_path, stream=True)
-                response.raise_for_status() 
-            
-                with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        temp_file.write(chunk)
-                    temp_file_path = temp_file.name
-
-                video_reader = cv2.VideoCapture(temp_file_path)
-                if not video_reader.isOpened():
-                    print(f"Warning: Could not open video file at {temp_file_path}. Skipping.")
-                    os.remove(temp_file_path)
-                    return [], None
-
-                base_fps = video_reader.get(cv2.CAP_PROP_FPS)
-                frame_interval = int(round(base_fps / self.fps))
-                frame_count = 0
-                while True:
-                    success, frame = video_reader.read()
-                    if not success:
-                        break
-                    if frame_count % frame_interval == 0:
-                        try:
-                            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                            images.append(Image.fromarray(rgb_frame))
-                        except Exception as e:
-                            print(f"Warning: Could not process frame {frame_count}. Error: {e}")
-                    frame_count += 1
-                    if frame_count > video_reader.get(cv2.CAP_PROP_FRAME_COUNT):
-                        break
-                video_reader.release()
-
-                if self.video_audio_processing:
-                    try:
-                        video_clip = VideoFileClip(temp_file_path)
-                        audio_clip = video_clip.audio
-                        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as audio_temp_file:
-                            audio_temp_path = audio_temp_file.name
-                        audio_clip.write_audiofile(audio_temp_path, codec='pcm_s16le', fps=44100, logger=None)
-                        audio_data, _ = sf.read(audio_temp_path, dtype='float32')
-                        if audio_data.ndim > 1:
-                            audio_data = audio_data.mean(axis=1) 
-                        audio = audio_data
-                        video_clip.close()
-                        os.remove(audio_temp_path)
-                    except Exception as e:
-                        print(f"Warning: Could not extract audio from video {temp_file_path}. Error: {e}")
+        video_path, segment = split_segment(video_path)
+        if not (video_path.startswith("http://") or video_path.startswith("https://")):
+            return self._read_video(video_path, self._video_properties(video_path), segment)
 
+        temp_file_path = None
+        try:
+            response = requests.get(video_path, stream=True)
+            response.raise_for_status()
+            with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
+                temp_file_path = temp_file.name
+                for chunk in response.iter_content(chunk_size=8192):
+                    temp_file.write(chunk)
+            return self._read_video(temp_file_path, segment=segment)
+        except Exception as e:
+            print(f"Warning: Failed to download or process video from URL {video_path}. Error: {e}")
+            return None, None
+        finally:
+            if temp_file_path is not None and os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
 
-            except Exception as e:
-                print(f"Warning: Failed to download or process video from URL {video_path}. Error: {e}")
-        else:
-            video_reader = cv2.VideoCapture(video_path)
-            if not video_reader.isOpened():
-                print(f"Warning: Could not open video file at {video_path}. Skipping.")
-                return [], None
-
-            base_fps = video_reader.get(cv2.CAP_PROP_FPS)
-            frame_interval = int(round(base_fps / self.fps))
-            frame_count = 0
-            while True:
-                success, frame = video_reader.read()
-                if not success:
+    def _read_video(
+        self,
+        path: str,
+        properties: Tuple[float, float] = None,
+        segment: Tuple[float, float] = None
+    ) -> Tuple[Union[np.ndarray, None], Union[np.ndarray, None]]:
+        video_reader = cv2.VideoCapture(path)
+        if not video_reader.isOpened():
+            print(f"Warning: Could not open video file at {path}. Skipping.")
+            return None, None
+        try:
+            base_fps, total_frames = properties if properties is not None else (
+                video_reader.get(cv2.CAP_PROP_FPS), video_reader.get(cv2.CAP_PROP_FRAME_COUNT)
+            )
+            if segment is not None:
+                first = int(segment[0] * base_fps)
+                last = math.ceil(segment[1] * base_fps)
+                if total_frames > 0:
+                    last = min(last, total_frames)
+                video_reader.set(cv2.CAP_PROP_POS_FRAMES, first)
+                total_frames = last - first
+            frames = self._read_frames(video_reader, base_fps, total_frames) if segment is None or total_frames > 0 else None
+        finally:
+            video_reader.release()
+
+        audio = self._extract_video_audio(path, segment) if self.video_audio_processing else None
+        return frames, audio
+
+    def _read_frames(self, video_reader, base_fps: float, total_frames: float) -> Union[np.ndarray, None]:
+        """
+        Samples frames straight into one preallocated RGB buffer. Skipped frames are only grabbed,
+        never retrieved, and each sampled frame is converted from BGR into its slot of the buffer,
+        so no per-frame array or image object is created.
+        """
+        frame_interval = self._frame_interval(base_fps, total_frames)
+        capacity = max(1, math.ceil(total_frames / frame_interval)) if total_frames > 0 else 16
+        frames = None
+        count = 0
+        frame_count = 0
+        frame = None
+        while total_frames <= 0 or frame_count < total_frames:
+            if frame_count % frame_interval:
+                if not video_reader.grab():
                     break
-                if frame_count % frame_interval == 0:
-                    try:
-                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        images.append(Image.fromarray(rgb_frame))
-                    except Exception as e:
-                        print(f"Warning: Could not process frame {frame_count}. Error: {e}")
                 frame_count += 1
-                if frame_count > video_reader.get(cv2.CAP_PROP_FRAME_COUNT):
-                    break
-            video_reader.release()
-            
-            if self.video_audio_processing:
-                try:
-                    video_clip = VideoFileClip(video_path)
-                    audio_clip = video_clip.audio
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as audio_temp_file:
-                        audio_temp_path = audio_temp_file.name
+                continue
+
+            success, frame = video_reader.read(frame)
+            if not success:
+                break
+            frame_count += 1
+            if frames is None:
+                frames = np.empty((capacity,) + frame.shape, dtype=np.uint8)
+            elif count == len(frames):
+                # The container under-reported its frame count.
+                frames = np.concatenate([frames, np.empty_like(frames)])
+            try:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frames[count])
+                count += 1
+            except Exception as e:
+                print(f"Warning: Could not process frame {frame_count - 1}. Error: {e}")
 
-                    audio_clip.write_audiofile(audio_temp_path, codec='pcm_s16le', fps=44100, logger=None)
+        if not count:
+            return None
+        return frames[:count]
+
+    def _extract_video_audio(self, path: str, segment: Tuple[float, float] = None) -> Union[np.ndarray, None]:
+        try:
+            from moviepy import VideoFileClip
+            video_clip = VideoFileClip(path)
+            try:
+                audio_clip = video_clip.audio
+                if audio_clip is None:
+                    return None
+                if segment is not None:
+                    if segment[0] >= audio_clip.duration:
+                        return None
+                    audio_clip = audio_clip.subclipped(segment[0], min(segment[1], audio_clip.duration))
+                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as audio_temp_file:
+                    audio_temp_path = audio_temp_file.name
+                try:
+                    audio_clip.write_audiofile(audio_temp_path, codec='pcm_s16le', fps=self.audio_sample_rate, logger=None)
                     audio_data, _ = sf.read(audio_temp_path, dtype='float32')
+                finally:
+                    os.remove(audio_temp_path)
+            finally:
+                video_clip.close()
+            if audio_data.ndim > 1:
+                audio_data = audio_data.mean(axis=1)
+            return audio_data
+        except Exception as e:
+            print(f"Warning: Could not extract audio from video {path}. Error: {e}")
+            return None
 
-                    if audio_data.ndim > 1:
-                        audio_data = audio_data.mean(axis=1)
+    def _frame_interval(self, base_fps: float, total_frames: float) -> int:
+        """
+        Returns how many frames to step between samples: one sample per 1 / `fps` seconds, spaced
+        further apart if that would take more than `max_frames` samples from the video.
+        """
+        interval = max(1, int(round(base_fps / self.fps)))
+        if self.max_frames is not None and total_frames > 0:
+            interval = max(interval, math.ceil(total_frames / self.max_frames))
+        return interval
 
-                    os.remove(audio_temp_path)
-                    if audio_data.ndim > 1:
-                        audio_data = audio_data.mean(axis=1) 
-                    audio = audio_data
-                    
-                    video_clip.close()
-                except Exception as e:
-                    print(f"Warning: Could not extract audio from video {video_path}. Error: {e}")
-        
-        return images, audio
+    def _video_properties(self, video_path: str) -> Union[Tuple[float, float], None]:
+        """
+        Returns the fps and frame count of a video from its registry descriptor, or None if there is
+        no descriptor and they have to be read from the video itself.
+        """
+        descriptor = self.registry.probe(video_path) if self.registry is not None else None
+        if descriptor is not None and descriptor.fps and descriptor.frame_count:
+            return descriptor.fps, descriptor.frame_count
+        return None
 
     def _prepare_audio(self, path: str) -> np.ndarray:
         """
@@ -268,7 +354,7 @@ class LLM:
             
             if audio_data.ndim > 1:
                 audio_data = audio_data.mean(axis=1)
-            return audio_data
+            return resample(audio_data, samplerate, self.audio_sample_rate)
         except Exception as e:
             print(f"Warning: Could not read audio file at {path}. Error: {e}")
             return None
@@ -278,7 +364,9 @@ class LLM:
         prompt: str,
         image_paths: List[str] = None,
         video_paths: List[str] = None,
-        audio_paths: List[str] = None
+        audio_paths: List[str] = None,
+        use_memo: bool = True,
+        schema: Dict[str, Any] = None
     ) -> str:
         """
         Generate a response based on the given prompt and optional multimedia inputs.
@@ -288,10 +376,138 @@ class LLM:
         image_paths: A list of paths to image files to use as input.
         video_paths: A list of paths to video files to use as input.
         audio_paths: A list of paths to audio files to use as input.
+        use_memo: Set to False to always run the model, even if the generation memo is enabled.
+        schema: A JSON schema the response must follow. Decoding is constrained so that the response
+            is always a single JSON object of this schema.
 
         Returns:
         A string containing the generated response.
         """
+        key = self._memo_key(prompt, image_paths, video_paths, audio_paths, schema) if use_memo else None
+        if key is not None:
+            response = self.memo.get(key)
+            get_tracer().metric("llm.memo.hits" if response is not None else "llm.memo.misses", 1)
+            if response is not None:
+                return response
+
+        response = self._generate(prompt, image_paths, video_paths, audio_paths, schema)
+        if key is not None:
+            self.memo.put(key, response)
+        return response
+
+    def _generate(
+        self,
+        prompt: str,
+        image_paths: List[str] = None,
+        video_paths: List[str] = None,
+        audio_paths: List[str] = None,
+        schema: Dict[str, Any] = None
+    ) -> str:
+        tracer = get_tracer()
+        with tracer.span("llm.generate", model=self.model_id):
+            with tracer.span("llm.decode_media") as span:
+                images, audios = self._load_media(image_paths, video_paths, audio_paths)
+                span.set(images=len(images), audios=len(audios))
+
+            with tracer.span("llm.preprocess"):
+                messages = self._prepare_prompt(prompt, images, audios)
+                prompt_text = self.processor.apply_chat_template(
+                    messages,
+                    add_generation_prompt=True,
+                    return_tensors=False
+                )
+
+                inputs = self.processor(
+                    text=prompt_text,
+                    images=images if images else None,
+                    audio=audios if audios else None,
+                    return_tensors="pt"
+                )
+                
+                inputs = self._to_model_inputs(inputs)
+
+            modalities = [modality for modality, media in (("vision", images), ("audio", audios)) if media]
+            if self.towers is not None:
+                self.towers.acquire(modalities)
+            try:
+                outputs = self._run_model(inputs, schema)
+            finally:
+                if self.towers is not None:
+                    self.towers.release(modalities)
+
+            with tracer.span("llm.postprocess"):
+                response_text = self.processor.batch_decode(outputs, skip_special_tokens=True)
+                raw_response = response_text[0].strip()
+
+                prompt_length = len(prompt) +len("user\n") -1
+                idx = raw_response.find("model\n", prompt_length)
+
+                if idx != -1:
+                    model_response = raw_response[idx + len("model\n"):].strip()
+                else:
+                    model_response = raw_response[prompt_length:].strip()
+
+        return model_response
+
+    def generate_batch(self, prompts: List[str], use_memo: bool = True, schema: Dict[str, Any] = None) -> List[str]:
+        """
+        Generate responses for several text-only prompts in one batched pass over the model.
+
+        Args:
+            prompts (List[str]): The text prompts to generate responses for.
+            use_memo (bool, optional): Set to False to always run the model. Defaults to True.
+            schema (Dict[str, Any], optional): A JSON schema every response must follow. Defaults to None.
+
+        Returns:
+            List[str]: The generated responses, in the same order as the prompts.
+
+        Prompts are left-padded to a common length so every decode step runs as a single forward
+        pass across the batch. With the generation memo enabled, only the prompts it misses are run.
+        """
+        keys = [self._memo_key(prompt, schema=schema) if use_memo else None for prompt in prompts]
+        responses = [self.memo.get(key) if key is not None else None for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            generated = self._generate_batch([prompts[i] for i in missing], schema)
+            for i, response in zip(missing, generated):
+                responses[i] = response
+                if keys[i] is not None:
+                    self.memo.put(keys[i], response)
+        return responses
+
+    def _generate_batch(self, prompts: List[str], schema: Dict[str, Any] = None) -> List[str]:
+        if len(prompts) == 1:
+            return [self._generate(prompts[0], schema=schema)]
+
+        prompt_texts = [
+            self.processor.apply_chat_template(
+                self._prepare_prompt(prompt),
+                add_generation_prompt=True,
+                return_tensors=False
+            )
+            for prompt in prompts
+        ]
+
+        tokenizer = self.processor.tokenizer
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"
+        try:
+            inputs = self.processor(text=prompt_texts, padding=True, return_tensors="pt")
+        finally:
+            tokenizer.padding_side = padding_side
+
+        inputs = self._to_model_inputs(inputs)
+        outputs = self._run_model(inputs, schema)
+
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        return [text.strip() for text in self.processor.batch_decode(new_tokens, skip_special_tokens=True)]
+
+    def _load_media(
+        self,
+        image_paths: List[str] = None,
+        video_paths: List[str] = None,
+        audio_paths: List[str] = None
+    ) -> Tuple[List[Union[Image.Image, np.ndarray]], List[np.ndarray]]:
         image_paths = image_paths if image_paths is not None else []
         video_paths = video_paths if video_paths is not None else []
         audio_paths = audio_paths if audio_paths is not None else []
@@ -324,40 +540,146 @@ class LLM:
 
         if image_paths and self.image_processing:
             for path in image_paths:
-                img = self._prepare_image(path)
+                with get_tracer().span("llm.prepare_image", path=path):
+                    img = self._prepare_image(path)
                 if img:
                     images.append(img)
 
         if video_paths and self.video_processing:
             for path in video_paths:
-                video_frames, video_audio = self._prepare_video(path)
-                if video_frames:
+                with get_tracer().span("llm.prepare_video", path=path) as span:
+                    video_frames, video_audio = self._prepare_video(path)
+                    span.set(frames=len(video_frames) if video_frames is not None else 0)
+                if video_frames is not None:
+                    # One image per sampled frame, as views into the frame buffer. The processor resizes
+                    # each into a new array, so the buffer only saves allocations while decoding.
                     images.extend(video_frames)
                 if video_audio is not None:
                     audios.append(video_audio)
 
         if audio_paths and self.audio_processing:
             for path in audio_paths:
-                audio_data = self._prepare_audio(path)
+                with get_tracer().span("llm.prepare_audio", path=path):
+                    audio_data = self._prepare_audio(path)
                 if audio_data is not None:
                     audios.append(audio_data)
 
-        messages = self._prepare_prompt(prompt, images, audios)
-        prompt_text = self.processor.apply_chat_template(
-            messages,
-            add_generation_prompt=True,
-            return_tensors=False
-        )
+        if audios:
+            audios = self._trim_audios(audios)
 
-        inputs = self.processor(
-            text=prompt_text,
-            images=images if images else None,
-            audio=audios if audios else None,
-            return_tensors="pt"
-        )
-        
+        return images, audios
+
+    def _trim_audios(self, audios: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Trims silence from the audio of one call and caps its total length, recording how much was
+        removed in the trace and in `audio_stats`.
+        """
+        with get_tracer().span("llm.trim_audio") as span:
+            audios, report = trim_audios(audios, self.vad, self.max_audio_seconds, self.audio_sample_rate)
+            span.set(**report)
+        get_tracer().metric("llm.audio.removed_seconds", report["original_seconds"] - report["kept_seconds"])
+        with self.audio_stats_lock:
+            self.audio_stats["clips"] += report["clips"]
+            self.audio_stats["original_seconds"] += report["original_seconds"]
+            self.audio_stats["kept_seconds"] += report["kept_seconds"]
+        return audios
+
+    def _run_model(self, inputs: Dict[str, torch.Tensor], schema: Dict[str, Any] = None) -> torch.Tensor:
+        """
+        Runs `model.generate` on prepared inputs. With tracing enabled, the time to the first logits
+        call is recorded as prefill and the rest as decode, along with token counts and rates.
+        With a schema, decoding is constrained to JSON objects of that schema, checking the whole
+        vocabulary each step when sampling so the constraint does not narrow the distribution.
+        """
+        tracer = get_tracer()
+        processors = []
+        sample = bool(self._decoding_params().get("do_sample"))
+        constraint = schema_processor(schema, self.processor, self.model, sample=sample, token_texts=self.token_texts)
+        if constraint is not None:
+            processors.append(constraint)
+        if not tracer.enabled:
+            return self.model.generate(**inputs, **self.generation_kwargs, logits_processor=LogitsProcessorList(processors))
+
+        timer = _FirstStepTimer()
+        with tracer.span("llm.model_generate", constrained=constraint is not None) as span:
+            start = time.perf_counter()
+            outputs = self.model.generate(
+                **inputs,
+                **self.generation_kwargs,
+                logits_processor=LogitsProcessorList([timer] + processors)
+            )
+            end = time.perf_counter()
+
+            batch_size, input_tokens = inputs["input_ids"].shape
+            output_tokens = (outputs.shape[1] - input_tokens) * batch_size
+            first_step = timer.first_step or end
+            prefill_time = first_step - start
+            decode_time = end - first_step
+            span.set(
+                batch_size=batch_size,
+                input_tokens=input_tokens * batch_size,
+                output_tokens=output_tokens,
+                prefill_time=prefill_time,
+                decode_time=decode_time,
+                prefill_tokens_per_s=input_tokens * batch_size / prefill_time if prefill_time > 0 else None,
+                decode_tokens_per_s=output_tokens / decode_time if decode_time > 0 else None
+            )
+        return outputs
+
+    def _decoding_params(self) -> Dict[str, Any]:
+        generation_config = getattr(self.model, "generation_config", None)
+        params = {
+            name: getattr(generation_config, name, None)
+            for name in ("do_sample", "num_beams", "temperature", "top_k", "top_p", "repetition_penalty")
+        }
+        params.update(self.generation_kwargs)
+        return params
+
+    def _audio_params(self) -> Dict[str, Any]:
+        params = {"sample_rate": self.audio_sample_rate, "max_seconds": self.max_audio_seconds}
+        if self.vad is not None:
+            params["vad"] = {name: value for name, value in self.config.llm.items() if name.startswith("vad_")}
+        return params
+
+    def _memo_key(
+        self,
+        prompt: str,
+        image_paths: List[str] = None,
+        video_paths: List[str] = None,
+        audio_paths: List[str] = None,
+        schema: Dict[str, Any] = None
+    ) -> Union[str, None]:
+        """
+        Returns the generation memo key of a call, or None if the call must not be memoized: the memo
+        is disabled, decoding samples, or an attachment has no content hash (URLs, or no registry).
+        """
+        if self.memo is None:
+            return None
+        decoding = self._decoding_params()
+        if decoding.get("do_sample"):
+            return None
+
+        media = []
+        for kind, paths in (("image", image_paths), ("video", video_paths), ("audio", audio_paths)):
+            for path in paths or []:
+                path, segment = split_segment(path)
+                descriptor = self.registry.probe(path) if self.registry is not None else None
+                if descriptor is None or descriptor.content_hash is None:
+                    return None
+                media.append((kind, descriptor.content_hash) if segment is None else (kind, descriptor.content_hash, *segment))
+        if video_paths or audio_paths:
+            decoding["audio"] = self._audio_params()
+        if video_paths:
+            decoding["fps"] = self.fps
+            if self.max_frames is not None:
+                decoding["max_frames"] = self.max_frames
+        if schema is not None:
+            decoding["schema"] = schema
+        return GenerationMemo.make_key(self.model_id, prompt, media, decoding)
+
+    def _to_model_inputs(self, inputs) -> Dict[str, torch.Tensor]:
         model_dtype = next(self.model.parameters()).dtype
-        inputs = {
+        return {
             k: (
                 v.to(self.model.device, dtype=model_dtype)
                 if v.dtype in [torch.float16, torch.bfloat16, torch.float32]
@@ -365,20 +687,3 @@ class LLM:
             )
             for k, v in inputs.items()
         }
-        outputs = self.model.generate(
-            **inputs,
-            max_new_tokens=1024
-        )
-
-        response_text = self.processor.batch_decode(outputs, skip_special_tokens=True)
-        raw_response = response_text[0].strip()
-
-        prompt_length = len(prompt) +len("user\n") -1
-        idx = raw_response.find("model\n", prompt_length)
-
-        if idx != -1:
-            model_response = raw_response[idx + len("model\n"):].strip()
-        else:
-            model_response = raw_response[prompt_length:].strip()
-
-        return model_response
\ No newline at end of file
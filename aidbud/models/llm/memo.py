@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+MEMO_VERSION = 1
+
+class GenerationMemo:
+    def __init__(self, path: str, max_entries: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, media: list, decoding: Dict[str, Any]) -> str:
+        """
+        Builds the memo key of one generation.
+
+        Args:
+            model_id (str): The model that generates.
+            prompt (str): The full prompt text.
+            media (list): (kind, content hash) of every attachment, in the order they are passed.
+            decoding (Dict[str, Any]): Every setting that affects the output, such as the decoding
+                parameters and the video sampling rate.
+
+        Returns:
+            str: A hex digest that changes whenever any of the inputs do.
+        """
+        payload = json.dumps(
+            {"version": MEMO_VERSION, "model_id": model_id, "prompt": prompt, "media": media, "decoding": decoding},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT response FROM generations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """
+        Stores a response, evicting the least recently used entries beyond `max_entries`.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO generations (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            if self.max_entries is not None:
+                self.connection.execute(
+                    "DELETE FROM generations WHERE key IN ("
+                    "SELECT key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM generations")
+            self.connection.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,31 @@
+import math
+import re
+from typing import List, Tuple, Optional
+
+# A W3C media fragment of a time range in seconds, "#t=start,end", appended to a video path.
+_FRAGMENT = re.compile(r"#t=(\d+(?:\.\d+)?),(\d+(?:\.\d+)?)$")
+
+def segment_path(path: str, start: float, end: float) -> str:
+    """
+    Returns the path of the [start, end) seconds of a video, which `LLM.generate` reads like a
+    video of its own.
+    """
+    return f"{path}#t={start:g},{end:g}"
+
+def split_segment(path: str) -> Tuple[str, Optional[Tuple[float, float]]]:
+    """
+    Splits a segment path into the video path and its (start, end) seconds, or None for a whole video.
+    """
+    match = _FRAGMENT.search(path)
+    if match is None:
+        return path, None
+    return path[:match.start()], (float(match.group(1)), float(match.group(2)))
+
+def plan_segments(duration: float, segment_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Splits a duration into consecutive segments of `segment_seconds`. The remainder is spread over
+    all of them rather than left as a short last segment.
+    """
+    count = max(1, math.ceil(duration / segment_seconds))
+    length = duration / count
+    return [(round(i * length, 3), round(duration if i == count - 1 else (i + 1) * length, 3)) for i in range(count)]
@@ -0,0 +1,131 @@
+import numpy as np
+from typing import List, Dict, Any, Tuple
+
+EPSILON = 1e-10
+
+def resample(audio: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """
+    Linearly resamples mono audio. Enough for speech going into the audio encoder, which works on
+    16 kHz log-mel features.
+    """
+    if sample_rate == target_rate or len(audio) == 0:
+        return audio.astype(np.float32, copy=False)
+    length = int(round(len(audio) * target_rate / sample_rate))
+    positions = np.arange(length, dtype=np.float64) * (sample_rate / target_rate)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start (inclusive) and end (exclusive) indices of every run of True in a boolean array.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+class VoiceActivityDetector:
+    """
+    Energy and zero-crossing voice activity detection on fixed frames, vectorized over the whole clip.
+
+    A frame is speech if its energy is `energy_margin_db` above the clip's noise floor (its 10th
+    percentile frame energy), or if it is within 6 dB of that and crosses zero often, as unvoiced
+    consonants do. Frames below `min_energy_db` dBFS are always silence. Speech runs shorter than
+    `min_speech_ms` are dropped as clicks, kept runs are padded by `padding_ms` on both sides, and
+    pauses up to `max_gap_ms` between them are kept so speech is not run together.
+    """
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: float = 30,
+        energy_margin_db: float = 12,
+        min_energy_db: float = -50,
+        zcr_threshold: float = 0.3,
+        min_speech_ms: float = 90,
+        padding_ms: float = 150,
+        max_gap_ms: float = 400
+    ):
+        self.sample_rate = sample_rate
+        self.frame = max(1, int(sample_rate * frame_ms / 1000))
+        self.energy_margin_db = energy_margin_db
+        self.min_energy_db = min_energy_db
+        self.zcr_threshold = zcr_threshold
+        self.min_speech = max(1, int(round(min_speech_ms / frame_ms)))
+        self.padding = int(round(padding_ms / frame_ms))
+        self.max_gap = int(round(max_gap_ms / frame_ms))
+
+    def speech_mask(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Returns one boolean per frame of `audio`, the last frame possibly partial.
+        """
+        count = -(-len(audio) // self.frame)
+        frames = np.zeros(count * self.frame, dtype=np.float32)
+        frames[:len(audio)] = audio
+        frames = frames.reshape(count, self.frame)
+
+        energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + EPSILON)
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        threshold = np.percentile(energy, 10) + self.energy_margin_db
+        voiced = energy > threshold
+        unvoiced = (energy > threshold - 6) & (zcr > self.zcr_threshold)
+        mask = (voiced | unvoiced) & (energy > self.min_energy_db)
+
+        starts, ends = _runs(mask)
+        for start, end in zip(starts, ends):
+            if end - start < self.min_speech:
+                mask[start:end] = False
+
+        if self.padding:
+            # The centre of the full convolution, which keeps one entry per frame even when the clip
+            # is shorter than the kernel, where mode="same" would return the kernel's length.
+            padded = np.convolve(mask, np.ones(2 * self.padding + 1), mode="full")
+            mask = padded[self.padding:self.padding + len(mask)] > 0
+
+        starts, ends = _runs(~mask)
+        for start, end in zip(starts, ends):
+            if 0 < start and end < len(mask) and end - start <= self.max_gap:
+                mask[start:end] = True
+        return mask
+
+    def trim(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Removes leading, trailing and long internal silence. A clip with no detected speech is
+        returned unchanged, rather than dropped on a detection miss.
+        """
+        if len(audio) < self.frame:
+            return audio
+        starts, ends = _runs(self.speech_mask(audio))
+        if len(starts) == 0:
+            return audio
+        return np.concatenate([audio[start * self.frame:end * self.frame] for start, end in zip(starts, ends)])
+
+def trim_audios(audios: List[np.ndarray], detector: VoiceActivityDetector = None, max_seconds: float = None, sample_rate: int = 16000) -> Tuple[List[np.ndarray], Dict[str, Any]]:
+    """
+    Trims silence from every clip of a query, then caps their total length at `max_seconds`,
+    keeping clips in order and cutting the last one that does not fit.
+
+    Returns:
+        Tuple[List[np.ndarray], Dict[str, Any]]: The trimmed clips, and a report of the seconds
+        before and after trimming and how many were removed by silence trimming and by the cap.
+    """
+    original = sum(len(audio) for audio in audios) / sample_rate
+    trimmed = [detector.trim(audio) for audio in audios] if detector is not None else list(audios)
+    voiced = sum(len(audio) for audio in trimmed) / sample_rate
+
+    if max_seconds is not None:
+        budget = int(max_seconds * sample_rate)
+        capped = []
+        for audio in trimmed:
+            if budget <= 0:
+                break
+            capped.append(audio[:budget])
+            budget -= len(capped[-1])
+        trimmed = capped
+    kept = sum(len(audio) for audio in trimmed) / sample_rate
+
+    return trimmed, {
+        "clips": len(audios),
+        "original_seconds": original,
+        "kept_seconds": kept,
+        "silence_seconds": original - voiced,
+        "capped_seconds": voiced - kept
+    }
@@ -0,0 +1,49 @@
+from typing import List, Dict, Any, Optional
+from .utils import AttachmentDescriptor
+
+class QueryResult:
+    __slots__ = (
+        "conversation_id", "query", "response", "pcard", "merged_pcard", "attachments",
+        "error", "timings", "context_usage"
+    )
+
+    def __init__(
+        self,
+        conversation_id: int,
+        query: Optional[str] = None,
+        response: Optional[str] = None,
+        pcard: Optional[Dict[str, str]] = None,
+        merged_pcard: Optional[Dict[str, str]] = None,
+        attachments: Optional[List[AttachmentDescriptor]] = None,
+        error: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+        context_usage: Optional[Dict[str, Any]] = None
+    ):
+        self.conversation_id = conversation_id
+        self.query = query
+        self.response = response
+        self.pcard = pcard or {}
+        self.merged_pcard = merged_pcard or {}
+        self.attachments = attachments or []
+        self.error = error
+        self.timings = timings or {}
+        self.context_usage = context_usage
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def paths(self, kind: str) -> List[str]:
+        return [descriptor.path for descriptor in self.attachments if descriptor.kind == kind]
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result["attachments"] = [descriptor.to_dict() for descriptor in self.attachments]
+        return result
+
+    def _repr_markdown_(self) -> str:
+        from .display import result_markdown
+        return result_markdown(self)
+
+    def __repr__(self) -> str:
+        return f"QueryResult(conversation_id={self.conversation_id}, response={self.response!r}, pcard={self.pcard}, error={self.error!r})"
@@ -0,0 +1,4 @@
+from .scheduler import Scheduler, ScheduledRequest
+from .batcher import BatchingLLM
+
+__all__ = ["Scheduler", "ScheduledRequest", "BatchingLLM"]
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any
+from ..config import Config
+
+def _schema_key(schema: Dict[str, Any]) -> str:
+    # Schemas are compared by value, as the server decodes a new copy of one for every request.
+    return json.dumps(schema, sort_keys=True) if schema is not None else None
+
+class BatchingLLM:
+    def __init__(self, llm, config: Config = Config()):
+        self.llm = llm
+        self.max_batch_size = config.scheduler["max_batch_size"]
+        self.batch_wait = config.scheduler["batch_wait_ms"] / 1000
+        self.model_lock = threading.Lock()
+        self.queue = []
+        self.queue_lock = threading.Condition()
+        self.batches = 0
+        self.batched_requests = 0
+        self.worker = threading.Thread(target=self._loop, name="aidbud-batcher", daemon=True)
+        self.worker.start()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+    def generate(
+        self,
+        prompt: str,
+        image_paths: List[str] = None,
+        video_paths: List[str] = None,
+        audio_paths: List[str] = None,
+        use_memo: bool = True,
+        schema: Dict[str, Any] = None
+    ) -> str:
+        """
+        Drop-in replacement for `LLM.generate` that merges concurrent text-only calls into one batch.
+
+        Calls with attachments, and calls that bypass the generation memo, skip batching and run on
+        their own, holding the model between batches. Calls are only batched with calls of the same
+        output schema.
+        """
+        if image_paths or video_paths or audio_paths or not use_memo:
+            with self.model_lock:
+                return self.llm.generate(prompt, image_paths, video_paths, audio_paths, use_memo=use_memo, schema=schema)
+
+        future = Future()
+        with self.queue_lock:
+            self.queue.append((prompt, schema, _schema_key(schema), future))
+            self.queue_lock.notify()
+        return future.result()
+
+    def generate_batch(self, prompts: List[str], use_memo: bool = True, schema: Dict[str, Any] = None) -> List[str]:
+        """
+        Runs a batch the caller already has as one pass, holding the model between batches.
+        """
+        with self.model_lock:
+            return self.llm.generate_batch(prompts, use_memo=use_memo, schema=schema)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0
+        }
+
+    def _loop(self):
+        while True:
+            with self.queue_lock:
+                while not self.queue:
+                    self.queue_lock.wait()
+                deadline = time.monotonic() + self.batch_wait
+                while len(self.queue) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.queue_lock.wait(remaining)
+                _, schema, key, _ = self.queue[0]
+                batch, rest = [], []
+                for request in self.queue:
+                    (batch if request[2] == key and len(batch) < self.max_batch_size else rest).append(request)
+                self.queue = rest
+
+            prompts = [prompt for prompt, _, _, _ in batch]
+            try:
+                with self.model_lock:
+                    responses = self.llm.generate_batch(prompts, schema=schema)
+            except Exception as e:
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for (_, _, _, future), response in zip(batch, responses):
+                future.set_result(response)
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional
+from ..config import Config
+from .batcher import BatchingLLM
+
+class ScheduledRequest:
+    def __init__(self, conversation_id: int, query: str, attachment_paths: List[str] = None, priority: int = None):
+        self.conversation_id = conversation_id
+        self.query = query
+        self.attachment_paths = attachment_paths
+        self.priority = priority
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def queue_time(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def result(self, timeout: float = None) -> Dict[str, Any]:
+        return self.future.result(timeout)
+
+class Scheduler:
+    def __init__(self, workflow, config: Config = Config()):
+        self.workflow = workflow
+        if not isinstance(workflow.llm, BatchingLLM):
+            workflow.llm = BatchingLLM(workflow.llm, config)
+        self.max_concurrent = config.scheduler["max_concurrent"]
+        self.triage_priorities = {level.lower(): priority for level, priority in config.scheduler["triage_priorities"].items()}
+        self.default_priority = config.scheduler["default_priority"]
+
+        self.triage = {}
+        self.conversations = {}
+        self.running = set()
+        self.ready = []
+        self.sequence = itertools.count()
+        self.lock = threading.Condition()
+        self.completed = 0
+        self.total_queue_time = 0.0
+        self.stopped = False
+        self.workers = [
+            threading.Thread(target=self._worker, name=f"aidbud-scheduler-{i}", daemon=True)
+            for i in range(self.max_concurrent)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, conversation_id: int, query: str = None, attachment_paths: List[str] = None, priority: int = None) -> ScheduledRequest:
+        """
+        Queues a query for a conversation.
+
+        Args:
+            conversation_id (int): The conversation the query belongs to.
+            query (str, optional): The user's query.
+            attachment_paths (List[str], optional): Paths or URLs of attachments sent with the query.
+            priority (int, optional): Lower runs first. Defaults to the priority of the conversation's
+                last reported TRIAGE level.
+
+        Returns:
+            ScheduledRequest: Handle with the result future and the request's queue and run times.
+
+        Requests of one conversation run strictly in submission order; requests of different
+        conversations run concurrently, with their text-only generations batched together.
+        """
+        if query is None and attachment_paths is None:
+            raise ValueError("At least query or attachment_paths must be provided.")
+
+        request = ScheduledRequest(conversation_id, query, attachment_paths, priority)
+        with self.lock:
+            if self.stopped:
+                raise RuntimeError("Scheduler has been stopped.")
+            pending = self.conversations.setdefault(conversation_id, deque())
+            pending.append(request)
+            if len(pending) == 1 and conversation_id not in self.running:
+                self._push(request)
+            self.lock.notify()
+        return request
+
+    def set_triage(self, conversation_id: int, triage: str):
+        with self.lock:
+            self.triage[conversation_id] = triage
+
+    def priority(self, conversation_id: int) -> int:
+        triage = self.triage.get(conversation_id)
+        if not triage:
+            return self.default_priority
+        return self.triage_priorities.get(str(triage).strip().lower(), self.default_priority)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            queued = sum(len(pending) for pending in self.conversations.values())
+            stats = {
+                "queued": queued,
+                "running": len(self.running),
+                "completed": self.completed,
+                "mean_queue_time": self.total_queue_time / self.completed if self.completed else 0.0
+            }
+        stats.update(self.workflow.llm.stats())
+        return stats
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+        for worker in self.workers:
+            worker.join()
+        asyncio.run(self.workflow.wait_for_writes())
+
+    def _push(self, request: ScheduledRequest):
+        priority = request.priority if request.priority is not None else self.priority(request.conversation_id)
+        heapq.heappush(self.ready, (priority, next(self.sequence), request))
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                while not self.ready and not self.stopped:
+                    self.lock.wait()
+                if self.stopped and not self.ready:
+                    return
+                _, _, request = heapq.heappop(self.ready)
+                self.running.add(request.conversation_id)
+                request.started_at = time.monotonic()
+
+            try:
+                output = self.workflow.run(request.conversation_id, request.query, request.attachment_paths)
+                triage = (output.get("pcard") or {}).get("TRIAGE")
+                if triage:
+                    self.set_triage(request.conversation_id, triage)
+                request.finished_at = time.monotonic()
+                request.future.set_result(output)
+            except Exception as e:
+                request.finished_at = time.monotonic()
+                request.future.set_exception(e)
+
+            with self.lock:
+                self.running.discard(request.conversation_id)
+                self.completed += 1
+                self.total_queue_time += request.queue_time
+                pending = self.conversations[request.conversation_id]
+                pending.popleft()
+                if pending:
+                    self._push(pending[0])
+                    self.lock.notify()
+                else:
+                    del self.conversations[request.conversation_id]
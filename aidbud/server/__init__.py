@@ -0,0 +1,4 @@
+from .server import ModelServer
+from .client import ModelClient, RemoteLLM, RemoteEmbedder
+
+__all__ = ["ModelServer", "ModelClient", "RemoteLLM", "RemoteEmbedder"]
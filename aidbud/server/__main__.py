@@ -0,0 +1,28 @@
+import sys
+import signal
+import argparse
+import threading
+from ..config import Config
+from .server import ModelServer
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m aidbud.server", description="Serve the AidBud LLM and embedder to other processes over a Unix socket.")
+    parser.add_argument("--config", default=None, help="Settings file (JSON or TOML), applied over the defaults and before AIDBUD_* environment variables.")
+    parser.add_argument("--socket", default=None, help="Socket path. Defaults to server.socket_path.")
+    args = parser.parse_args(argv)
+
+    config = Config.from_env(base=Config.from_file(args.config) if args.config else None)
+    if args.socket:
+        config.update({"server": {"socket_path": args.socket}})
+
+    server = ModelServer(config)
+    # serve_forever blocks the main thread, so the shutdown it waits for has to come from another one.
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import socket
+import itertools
+import threading
+from typing import List, Dict, Any, Tuple, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+import tiktoken
+
+from ..config import Config
+from ..models import Embedder
+from . import protocol
+
+class ModelClient:
+    """
+    A connection to a running `ModelServer`.
+
+    Each thread gets its own connection, opened on first use, so threads wait on the server rather
+    than on each other and concurrent calls can be batched by it.
+
+    Args:
+        socket_path (str): The server's socket.
+        timeout (float, optional): Seconds to wait for one reply. Defaults to None (no limit).
+    """
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        self.socket_path = os.path.expanduser(socket_path)
+        self.timeout = timeout
+        self.local = threading.local()
+        self.request_ids = itertools.count(1)
+        self.sockets = []
+        self.sockets_lock = threading.Lock()
+
+    def request(self, opcode: int, metadata: Dict[str, Any] = None, blob: bytes = b"") -> Tuple[Dict[str, Any], memoryview]:
+        """
+        Sends one request and waits for its reply.
+
+        Raises:
+            ConnectionError: If the server cannot be reached or closes the connection. The connection
+                is dropped and the next request opens a new one.
+            RuntimeError: If the server failed to run the request.
+        """
+        sock = self._socket()
+        request_id = next(self.request_ids)
+        try:
+            protocol.send_message(sock, opcode, request_id, metadata, blob)
+            reply_opcode, reply_id, reply, reply_blob = protocol.recv_message(sock)
+        except (OSError, ConnectionError) as e:
+            self._drop(sock)
+            raise ConnectionError(f"Lost connection to the model server at {self.socket_path}. Error: {e}") from e
+        if reply_id != request_id:
+            self._drop(sock)
+            raise ConnectionError(f"Reply {reply_id} from the model server does not match request {request_id}.")
+        if reply_opcode == protocol.ERROR:
+            raise RuntimeError(f"Model server error ({reply.get('type')}): {reply.get('message')}")
+        return reply, reply_blob
+
+    def ping(self) -> bool:
+        try:
+            self.request(protocol.PING)
+            return True
+        except (ConnectionError, RuntimeError):
+            return False
+
+    def info(self) -> Dict[str, Any]:
+        return self.request(protocol.INFO)[0]
+
+    def close(self):
+        with self.sockets_lock:
+            for sock in self.sockets:
+                sock.close()
+            self.sockets.clear()
+        self.local = threading.local()
+
+    def _socket(self) -> socket.socket:
+        sock = getattr(self.local, "socket", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(f"Could not connect to the model server at {self.socket_path}. Is `python -m aidbud.server` running? Error: {e}") from e
+            self.local.socket = sock
+            with self.sockets_lock:
+                self.sockets.append(sock)
+        return sock
+
+    def _drop(self, sock: socket.socket):
+        self.local.socket = None
+        with self.sockets_lock:
+            if sock in self.sockets:
+                self.sockets.remove(sock)
+        sock.close()
+
+def _absolute(paths: Optional[List[str]]) -> Optional[List[str]]:
+    # The server resolves paths from its own working directory.
+    if not paths:
+        return paths
+    return [path if urlparse(path).scheme in ["http", "https"] else os.path.abspath(path) for path in paths]
+
+class RemoteLLM:
+    """
+    Drop-in replacement for `LLM` that generates on a `ModelServer`.
+
+    Generation memo, attachment registry and batching all live on the server, so they are shared by
+    every client.
+    """
+    def __init__(self, config: Config = Config(), registry=None, client: ModelClient = None):
+        self.client = client if client is not None else ModelClient(config.server["socket_path"], config.server["timeout"])
+        self.registry = registry
+        self.model_id = self.client.info()["llm"]
+
+    def generate(
+        self,
+        prompt: str,
+        image_paths: List[str] = None,
+        video_paths: List[str] = None,
+        audio_paths: List[str] = None,
+        use_memo: bool = True,
+        schema: Dict[str, Any] = None
+    ) -> str:
+        reply, _ = self.client.request(protocol.GENERATE, {
+            "prompt": prompt,
+            "image_paths": _absolute(image_paths),
+            "video_paths": _absolute(video_paths),
+            "audio_paths": _absolute(audio_paths),
+            "use_memo": use_memo,
+            "schema": schema
+        })
+        return reply["response"]
+
+    def generate_batch(self, prompts: List[str], use_memo: bool = True, schema: Dict[str, Any] = None) -> List[str]:
+        reply, _ = self.client.request(protocol.GENERATE_BATCH, {"prompts": prompts, "use_memo": use_memo, "schema": schema})
+        return reply["responses"]
+
+class _RemoteEncoder:
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        reply, blob = self.client.request(protocol.EMBED, {"texts": list(texts)})
+        return protocol.unpack_array(reply, blob)
+
+class RemoteEmbedder(Embedder):
+    """
+    An `Embedder` whose model runs on a `ModelServer`. Chunking stays local, with the tokeniser the
+    server reports, and only the chunks are sent to be embedded.
+    """
+    def __init__(self, config: Config = Config(), client: ModelClient = None):
+        self.client = client if client is not None else ModelClient(config.server["socket_path"], config.server["timeout"])
+        super().__init__(config)
+        self.max_token_length = self.info["embedder_max_tokens"]
+
+    def _load_model(self, config: Config) -> Tuple[Any, Any]:
+        self.info = self.client.info()
+        return _RemoteEncoder(self.client), tiktoken.get_encoding(self.info["tokeniser"])
@@ -0,0 +1,80 @@
+import json
+import socket
+import struct
+from typing import Dict, Any, Tuple, Optional
+
+import numpy as np
+
+VERSION = 1
+
+# Every message is a fixed header, a JSON metadata object and a raw binary blob. The header holds the
+# protocol version, the opcode, the request ID the reply echoes, and the lengths of the two parts.
+HEADER = struct.Struct("!BBIII")
+
+PING = 0
+INFO = 1
+GENERATE = 2
+GENERATE_BATCH = 3
+EMBED = 4
+RESULT = 64
+ERROR = 65
+
+def send_message(sock: socket.socket, opcode: int, request_id: int, metadata: Optional[Dict[str, Any]] = None, blob: bytes = b""):
+    """
+    Sends one message. The header, metadata and blob go out in a single gathered write, so the blob,
+    such as a batch of embeddings, is never copied into a combined buffer.
+    """
+    encoded = json.dumps(metadata or {}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    blob = memoryview(blob).cast("B")
+    views = [memoryview(HEADER.pack(VERSION, opcode, request_id, len(encoded), len(blob))), memoryview(encoded), blob]
+    views = [view for view in views if len(view)]
+    while views:
+        sent = sock.sendmsg(views)
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+def recv_message(sock: socket.socket) -> Tuple[int, int, Dict[str, Any], memoryview]:
+    """
+    Receives one message.
+
+    Returns:
+        Tuple[int, int, Dict[str, Any], memoryview]: The opcode, request ID, metadata and blob.
+
+    Raises:
+        ConnectionError: If the peer closes the connection, or speaks another protocol version.
+    """
+    version, opcode, request_id, metadata_length, blob_length = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if version != VERSION:
+        raise ConnectionError(f"Unsupported protocol version {version}, expected {VERSION}.")
+    metadata = json.loads(bytes(_recv_exactly(sock, metadata_length))) if metadata_length else {}
+    blob = _recv_exactly(sock, blob_length) if blob_length else memoryview(b"")
+    return opcode, request_id, metadata, blob
+
+def _recv_exactly(sock: socket.socket, length: int) -> memoryview:
+    buffer = memoryview(bytearray(length))
+    received = 0
+    while received < length:
+        count = sock.recv_into(buffer[received:], length - received)
+        if count == 0:
+            raise ConnectionError("Connection closed by peer.")
+        received += count
+    return buffer
+
+def pack_array(array: np.ndarray) -> Tuple[Dict[str, Any], memoryview]:
+    """
+    Returns the metadata and blob of a numeric array, its raw bytes without a copy where the array
+    is already contiguous.
+    """
+    array = np.ascontiguousarray(array)
+    return {"dtype": array.dtype.str, "shape": list(array.shape)}, memoryview(array).cast("B")
+
+def unpack_array(metadata: Dict[str, Any], blob: memoryview) -> np.ndarray:
+    """
+    Returns the array a blob holds, as a view on the received buffer.
+    """
+    return np.frombuffer(blob, dtype=np.dtype(metadata["dtype"])).reshape(metadata["shape"])
@@ -0,0 +1,146 @@
+import os
+import socket
+import socketserver
+import threading
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+from ..config import Config
+from ..models import LLM, Embedder
+from ..scheduler import BatchingLLM
+from ..tracing import get_tracer, configure_tracing
+from ..utils import AttachmentRegistry
+from . import protocol
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                opcode, request_id, metadata, blob = protocol.recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply, reply_blob = self.server.model_server.handle(opcode, metadata, blob)
+                protocol.send_message(self.request, protocol.RESULT, request_id, reply, reply_blob)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                protocol.send_message(self.request, protocol.ERROR, request_id, {"type": type(e).__name__, "message": str(e)})
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+class ModelServer:
+    """
+    Keeps the LLM and embedder loaded in one long-lived process and serves them to other processes
+    over a Unix domain socket, so each client starts without loading any weights.
+
+    Media are passed by path and read by the server itself, so only prompts, responses and embeddings
+    cross the socket. Concurrent text-only generations, from any number of clients, are batched into
+    one pass over the model by a `BatchingLLM`.
+
+    Args:
+        config (Config, optional): Models and settings to serve, and `server["socket_path"]`.
+        llm (LLM, optional): A loaded LLM to serve instead of loading one from the config.
+        embedder (Embedder, optional): A loaded embedder to serve instead of loading one from the config.
+    """
+    def __init__(self, config: Config = Config(), llm: LLM = None, embedder: Embedder = None):
+        self.config = config
+        self.socket_path = os.path.expanduser(config.server["socket_path"])
+        configure_tracing(config)
+        self.registry = AttachmentRegistry(config)
+        llm = llm if llm is not None else LLM(config, registry=self.registry)
+        if getattr(llm, "registry", None) is None:
+            llm.registry = self.registry
+        self.llm = BatchingLLM(llm, config)
+        self.embedder = embedder if embedder is not None else Embedder(config)
+        self.server = None
+        self.requests = 0
+        self.requests_lock = threading.Lock()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "llm": self.llm.model_id,
+            "embedder": self.config.rag["embedder"],
+            "tokeniser": self.config.rag["tokeniser"],
+            "embedder_max_tokens": self.embedder.max_token_length,
+            "requests": self.requests,
+            "batching": self.llm.stats()
+        }
+
+    def handle(self, opcode: int, metadata: Dict[str, Any], blob: memoryview) -> Tuple[Dict[str, Any], bytes]:
+        """
+        Runs one request and returns the metadata and blob of its reply.
+
+        Raises:
+            ValueError: If the opcode is unknown.
+        """
+        with self.requests_lock:
+            self.requests += 1
+        if opcode == protocol.PING:
+            return {}, b""
+        if opcode == protocol.INFO:
+            return self.info(), b""
+        if opcode == protocol.GENERATE:
+            with get_tracer().span("server.generate", attachments=sum(len(metadata.get(kind) or []) for kind in ("image_paths", "video_paths", "audio_paths"))):
+                response = self.llm.generate(
+                    metadata["prompt"],
+                    metadata.get("image_paths"),
+                    metadata.get("video_paths"),
+                    metadata.get("audio_paths"),
+                    use_memo=metadata.get("use_memo", True),
+                    schema=metadata.get("schema")
+                )
+            return {"response": response}, b""
+        if opcode == protocol.GENERATE_BATCH:
+            with get_tracer().span("server.generate_batch", prompts=len(metadata["prompts"])):
+                responses = self.llm.generate_batch(metadata["prompts"], use_memo=metadata.get("use_memo", True), schema=metadata.get("schema"))
+            return {"responses": responses}, b""
+        if opcode == protocol.EMBED:
+            with get_tracer().span("server.embed", texts=len(metadata["texts"])):
+                embeddings = self.embedder.embedding_model.encode(metadata["texts"])
+            return protocol.pack_array(np.asarray(embeddings, dtype=np.float32))
+        raise ValueError(f"Unknown opcode {opcode}.")
+
+    def serve_forever(self):
+        """
+        Listens on the socket until `shutdown` is called or the process is interrupted.
+
+        Raises:
+            RuntimeError: If another server is already listening on the socket.
+        """
+        self._claim_socket()
+        self.server = _UnixServer(self.socket_path, _Handler)
+        self.server.model_server = self
+        os.chmod(self.socket_path, 0o600)
+        print(f"Model server listening on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+    def _claim_socket(self):
+        """
+        Removes a socket file left behind by a server that exited without cleaning up, but not the
+        socket of one that is still running.
+        """
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"A model server is already listening on {self.socket_path}.")
@@ -0,0 +1,4 @@
+from .tracer import Tracer, get_tracer, configure_tracing
+from .sinks import JsonLinesSink, MemorySink, PrometheusSink
+
+__all__ = ["Tracer", "get_tracer", "configure_tracing", "JsonLinesSink", "MemorySink", "PrometheusSink"]
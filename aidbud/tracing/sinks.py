@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+
+class JsonLinesSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+class MemorySink:
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any]):
+        with self.lock:
+            self.records.append(record)
+
+    def spans(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [r for r in self.records if r["type"] == "span" and (name is None or r["name"] == name)]
+
+    def metrics(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [r for r in self.records if r["type"] == "metric" and (name is None or r["name"] == name)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Aggregates the recorded spans by name into call counts and total/mean wall and CPU time.
+        """
+        totals = defaultdict(lambda: {"count": 0, "wall_time": 0.0, "cpu_time": 0.0})
+        for span in self.spans():
+            entry = totals[span["name"]]
+            entry["count"] += 1
+            entry["wall_time"] += span["wall_time"]
+            entry["cpu_time"] += span["cpu_time"]
+        for entry in totals.values():
+            entry["mean_wall_time"] = entry["wall_time"] / entry["count"]
+        return dict(totals)
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+
+class PrometheusSink:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.span_counts = defaultdict(int)
+        self.span_wall = defaultdict(float)
+        self.span_cpu = defaultdict(float)
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.peak_rss = None
+
+    def emit(self, record: Dict[str, Any]):
+        with self.lock:
+            if record["type"] == "span":
+                self.span_counts[record["name"]] += 1
+                self.span_wall[record["name"]] += record["wall_time"]
+                self.span_cpu[record["name"]] += record["cpu_time"]
+                if record.get("peak_rss_bytes") is not None:
+                    self.peak_rss = max(self.peak_rss or 0, record["peak_rss_bytes"])
+            else:
+                key = (record["name"], tuple(sorted(record["labels"].items())))
+                if record["kind"] == "gauge":
+                    self.gauges[key] = record["value"]
+                else:
+                    self.counters[key] += record["value"]
+        if self.path and record["type"] == "span" and record["parent_id"] is None:
+            self.write(self.path)
+
+    def render(self) -> str:
+        """
+        Renders the aggregated spans and metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            lines.append("# TYPE aidbud_stage_calls_total counter")
+            for name, count in sorted(self.span_counts.items()):
+                lines.append(f'aidbud_stage_calls_total{{stage="{name}"}} {count}')
+            lines.append("# TYPE aidbud_stage_wall_seconds_total counter")
+            for name, value in sorted(self.span_wall.items()):
+                lines.append(f'aidbud_stage_wall_seconds_total{{stage="{name}"}} {value}')
+            lines.append("# TYPE aidbud_stage_cpu_seconds_total counter")
+            for name, value in sorted(self.span_cpu.items()):
+                lines.append(f'aidbud_stage_cpu_seconds_total{{stage="{name}"}} {value}')
+            if self.peak_rss is not None:
+                lines.append("# TYPE aidbud_peak_rss_bytes gauge")
+                lines.append(f"aidbud_peak_rss_bytes {self.peak_rss}")
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                family = None
+                for (name, labels), value in sorted(values.items()):
+                    metric = "aidbud_" + name.replace(".", "_").replace("-", "_")
+                    if kind == "counter":
+                        metric += "_total"
+                    label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                    # One TYPE line per metric family, however many label sets it has.
+                    if metric != family:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        family = metric
+                    lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
@@ -0,0 +1,151 @@
+import sys
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional
+from ..config import Config
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_current_span = ContextVar("aidbud_current_span", default=None)
+_span_ids = itertools.count(1)
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes everywhere else.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "attributes", "span_id", "parent_id", "trace_id", "start_wall", "start_cpu", "token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.token = _current_span.set(self)
+        self.start_cpu = time.thread_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.thread_time() - self.start_cpu
+        _current_span.reset(self.token)
+        record = {
+            "type": "span",
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "trace_id": self.trace_id,
+            "timestamp": time.time(),
+            "wall_time": wall,
+            "cpu_time": cpu,
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "error": repr(exc) if exc is not None else None,
+            "attributes": self.attributes
+        }
+        self.tracer.emit(record)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class Tracer:
+    def __init__(self, enabled: bool = False, sinks: List[Any] = None):
+        self.enabled = enabled
+        self.sinks = list(sinks) if sinks else []
+        self.lock = threading.Lock()
+
+    def span(self, name: str, **attributes):
+        """
+        Opens a timed span around a pipeline stage.
+
+        Args:
+            name (str): Dotted stage name, e.g. "llm.generate".
+            **attributes: Initial attributes; more can be added with `span.set(...)`.
+
+        Returns:
+            A context manager recording wall time, thread CPU time and peak RSS of the stage, nested
+            under whichever span is current in the calling context. When tracing is disabled this is
+            a shared no-op object, so instrumented code pays only for the call.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def metric(self, name: str, value: float, kind: str = "counter", **labels):
+        """
+        Records a counter increment or gauge value, e.g. cache hits.
+        """
+        if not self.enabled:
+            return
+        self.emit({"type": "metric", "name": name, "kind": kind, "value": value, "labels": labels, "timestamp": time.time()})
+
+    def emit(self, record: Dict[str, Any]):
+        with self.lock:
+            sinks = list(self.sinks)
+        for sink in sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"Warning: Tracing sink {type(sink).__name__} failed. Error: {e}")
+
+    def add_sink(self, sink):
+        with self.lock:
+            self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        with self.lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+def configure_tracing(config: Config = Config()) -> Tracer:
+    """
+    Sets up the process-wide tracer from `config.tracing`.
+
+    Tracing is enabled if `enabled` is set; a JSON lines sink is attached if `jsonl_path` is set and
+    a Prometheus text sink if `prometheus_path` is set.
+    """
+    from .sinks import JsonLinesSink, PrometheusSink
+
+    for sink_type, path in ((JsonLinesSink, config.tracing["jsonl_path"]), (PrometheusSink, config.tracing["prometheus_path"])):
+        if path and not any(isinstance(sink, sink_type) and sink.path == path for sink in _tracer.sinks):
+            _tracer.add_sink(sink_type(path))
+    if config.tracing["enabled"]:
+        _tracer.enable()
+    return _tracer
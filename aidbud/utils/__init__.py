@@ -2,5 +2,7 @@ from .rag import RAG
 from .context import Context
 from .prompt import PromptBuilder
 from .parser import Parser
+from .assembler import ContextAssembler
+from .attachment import AttachmentRegistry, AttachmentDescriptor
 
-__all__ = ["RAG", "Context", "PromptBuilder", "Parser"]
\ No newline at end of file
+__all__ = ["RAG", "Context", "PromptBuilder", "Parser", "ContextAssembler", "AttachmentRegistry", "AttachmentDescriptor"]
\ No newline at end of file
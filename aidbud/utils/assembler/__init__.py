@@ -0,0 +1,3 @@
+from .assembler import ContextAssembler
+
+__all__ = ["ContextAssembler"]
@@ -0,0 +1,112 @@
+from ...config import Config
+from typing import List, Dict, Any, Tuple, Set
+
+class ContextAssembler:
+    def __init__(self, tokenizer, config: Config = Config()):
+        self.tokenizer = tokenizer
+        self.token_budget = config.rag["context_token_budget"]
+        self.response_share = config.rag["context_response_share"]
+        self.duplicate_threshold = config.rag["context_duplicate_threshold"]
+        self.diversity_weight = config.rag["context_diversity_weight"]
+        self.recency_weight = config.rag["context_recency_weight"]
+
+    def assemble(
+        self,
+        response_ids: List[str],
+        response_documents: List[str],
+        attachment_ids: List[str],
+        attachment_documents: List[str]
+    ) -> Tuple[List[str], List[str], Dict[str, Any]]:
+        """
+        Packs retrieved response and attachment documents into the prompt token budget.
+
+        Args:
+            response_ids (List[str]): IDs of the retrieved responses, in retrieval order.
+            response_documents (List[str]): The retrieved response documents.
+            attachment_ids (List[str]): IDs of the retrieved attachments, in retrieval order.
+            attachment_documents (List[str]): The attachment documents, already formatted for the prompt.
+
+        Returns:
+            Tuple[List[str], List[str], Dict[str, Any]]: The selected response documents, the selected
+            attachment documents (both in chronological order) and a usage report with the tokens each
+            section used and how many documents were dropped as duplicates or for lack of budget.
+
+        Responses get `context_response_share` of the budget first; whatever they leave unused goes
+        to attachments. Within a section, documents are picked greedily by a mix of retrieval rank
+        and recency, penalised by their token overlap with documents already picked (MMR), and
+        near-duplicates such as overlapping chunks of one response are skipped outright.
+        """
+        response_budget = int(self.token_budget * self.response_share)
+        responses, response_report = self._pack(response_ids, response_documents, response_budget)
+        attachment_budget = self.token_budget - response_report["tokens"]
+        attachments, attachment_report = self._pack(attachment_ids, attachment_documents, attachment_budget)
+
+        report = {
+            "budget": self.token_budget,
+            "total_tokens": response_report["tokens"] + attachment_report["tokens"],
+            "responses": response_report,
+            "attachments": attachment_report
+        }
+        return responses, attachments, report
+
+    def _pack(self, ids: List[str], documents: List[str], budget: int) -> Tuple[List[str], Dict[str, Any]]:
+        report = {"budget": budget, "tokens": 0, "selected": 0, "duplicates": 0, "over_budget": 0}
+        if not documents:
+            return [], report
+
+        tokens = [self.tokenizer.encode(document) for document in documents]
+        token_sets = [set(document_tokens) for document_tokens in tokens]
+        relevance = self._rank_scores(len(documents))
+        recency = self._recency_scores(ids)
+        base_scores = [
+            (1 - self.recency_weight) * relevance[i] + self.recency_weight * recency[i]
+            for i in range(len(documents))
+        ]
+
+        remaining = list(range(len(documents)))
+        selected = []
+        used = 0
+        while remaining:
+            best_index = None
+            best_score = None
+            for i in remaining:
+                overlap = max((self._overlap(token_sets[i], token_sets[j]) for j in selected), default=0.0)
+                score = base_scores[i] - self.diversity_weight * overlap
+                if best_score is None or score > best_score:
+                    best_index, best_score = i, score
+            remaining.remove(best_index)
+
+            if any(self._overlap(token_sets[best_index], token_sets[j]) >= self.duplicate_threshold for j in selected):
+                report["duplicates"] += 1
+                continue
+            if used + len(tokens[best_index]) > budget:
+                report["over_budget"] += 1
+                continue
+            selected.append(best_index)
+            used += len(tokens[best_index])
+
+        selected.sort(key=lambda i: self._id_order(ids[i]))
+        report["tokens"] = used
+        report["selected"] = len(selected)
+        return [documents[i] for i in selected], report
+
+    def _rank_scores(self, count: int) -> List[float]:
+        if count == 1:
+            return [1.0]
+        return [1 - i / (count - 1) for i in range(count)]
+
+    def _recency_scores(self, ids: List[str]) -> List[float]:
+        numeric = [int(id_) if str(id_).isdigit() else None for id_ in ids]
+        known = [id_ for id_ in numeric if id_ is not None]
+        if not known or max(known) == min(known):
+            return [0.0] * len(ids)
+        low, high = min(known), max(known)
+        return [(id_ - low) / (high - low) if id_ is not None else 0.0 for id_ in numeric]
+
+    def _id_order(self, id_: str) -> Tuple[int, Any]:
+        return (0, int(id_)) if str(id_).isdigit() else (1, str(id_))
+
+    def _overlap(self, a: Set[int], b: Set[int]) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
@@ -0,0 +1,3 @@
+from .registry import AttachmentRegistry, AttachmentDescriptor
+
+__all__ = ["AttachmentRegistry", "AttachmentDescriptor"]
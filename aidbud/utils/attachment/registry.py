@@ -0,0 +1,255 @@
+import os
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+from typing import List, Dict, Any, Tuple, Optional
+import requests
+from ...config import Config
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+SNIFF_BYTES = 64
+HASH_BLOCK_SIZE = 1 << 20
+
+class AttachmentDescriptor:
+    __slots__ = (
+        "path", "is_url", "kind", "mime_type", "size", "mtime", "content_hash",
+        "duration", "fps", "frame_count", "width", "height", "sample_rate"
+    )
+
+    def __init__(self, path: str, is_url: bool, kind: str, mime_type: str, size: Optional[int] = None, mtime: Optional[int] = None):
+        self.path = path
+        self.is_url = is_url
+        self.kind = kind
+        self.mime_type = mime_type
+        self.size = size
+        self.mtime = mtime
+        self.content_hash = None
+        self.duration = None
+        self.fps = None
+        self.frame_count = None
+        self.width = None
+        self.height = None
+        self.sample_rate = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"AttachmentDescriptor({self.to_dict()})"
+
+class AttachmentRegistry:
+    def __init__(self, config: Config = Config()):
+        self.max_entries = config.attachments["registry_size"]
+        self.hash_attachments = config.attachments["hash_content"]
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def probe(self, path: str) -> Optional[AttachmentDescriptor]:
+        """
+        Returns the descriptor of an attachment, probing it only the first time it is seen.
+
+        Args:
+            path (str): Local path or http(s) URL of the attachment.
+
+        Returns:
+            Optional[AttachmentDescriptor]: The attachment's type, size, content hash and media
+            properties, or None if it does not exist or is not an image, video or audio file.
+
+        Local files are re-probed only when their size or modification time changes. Their type is
+        sniffed from the leading magic bytes, falling back to the extension. URLs are checked with a
+        single HEAD request and typed from the returned Content-Type.
+        """
+        is_url = urlparse(path).scheme in ["http", "https"]
+        stat = None
+        if not is_url:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                print(f"[SKIPPED] File does not exist: {path}")
+                return None
+
+        with self.lock:
+            descriptor = self.entries.get(path)
+            if descriptor is not None and (is_url or (descriptor.size == stat.st_size and descriptor.mtime == stat.st_mtime_ns)):
+                self.entries.move_to_end(path)
+                return descriptor
+
+        descriptor = self._probe_url(path) if is_url else self._probe_file(path, stat)
+        if descriptor is not None:
+            with self.lock:
+                self.entries[path] = descriptor
+                self.entries.move_to_end(path)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return descriptor
+
+    def probe_all(self, paths: List[str]) -> List[AttachmentDescriptor]:
+        if not paths:
+            return []
+        return [descriptor for descriptor in (self.probe(path) for path in paths) if descriptor is not None]
+
+    def classify(self, paths: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        image_paths = []
+        video_paths = []
+        audio_paths = []
+        for descriptor in self.probe_all(paths):
+            if descriptor.kind == "image":
+                image_paths.append(descriptor.path)
+            elif descriptor.kind == "video":
+                video_paths.append(descriptor.path)
+            elif descriptor.kind == "audio":
+                audio_paths.append(descriptor.path)
+        return image_paths, video_paths, audio_paths
+
+    def _probe_file(self, path: str, stat: os.stat_result) -> Optional[AttachmentDescriptor]:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(SNIFF_BYTES)
+        except OSError as e:
+            print(f"[SKIPPED] Could not read file: {path}. Error: {e}")
+            return None
+
+        mime_type = sniff_mime_type(header) or mimetypes.guess_type(path)[0]
+        kind = self._kind(mime_type, path)
+        if kind is None:
+            return None
+
+        descriptor = AttachmentDescriptor(path, False, kind, mime_type, stat.st_size, stat.st_mtime_ns)
+        if self.hash_attachments:
+            descriptor.content_hash = self._hash_file(path)
+        self._read_media_properties(descriptor)
+        return descriptor
+
+    def _probe_url(self, path: str) -> Optional[AttachmentDescriptor]:
+        try:
+            response = requests.head(path, allow_redirects=True, timeout=5)
+            if response.status_code >= 400:
+                print(f"[SKIPPED] URL does not exist or is inaccessible: {path}")
+                return None
+        except requests.RequestException:
+            print(f"[SKIPPED] Failed to check URL: {path}")
+            return None
+
+        mime_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if not mime_type.startswith(("image/", "video/", "audio/")):
+            mime_type = mimetypes.guess_type(urlparse(path).path)[0]
+        kind = self._kind(mime_type, path)
+        if kind is None:
+            return None
+
+        size = response.headers.get("Content-Length")
+        return AttachmentDescriptor(path, True, kind, mime_type, int(size) if size and size.isdigit() else None)
+
+    def _kind(self, mime_type: Optional[str], path: str) -> Optional[str]:
+        if mime_type is None:
+            print(f"[SKIPPED] Unknown MIME type: {path}")
+            return None
+        kind = mime_type.split("/")[0]
+        if kind not in ("image", "video", "audio"):
+            print(f"[SKIPPED] Unsupported MIME type: {mime_type} - {path}")
+            return None
+        return kind
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _read_media_properties(self, descriptor: AttachmentDescriptor):
+        try:
+            if descriptor.kind == "image" and Image is not None:
+                with Image.open(descriptor.path) as img:
+                    descriptor.width, descriptor.height = img.size
+            elif descriptor.kind == "video" and cv2 is not None:
+                video_reader = cv2.VideoCapture(descriptor.path)
+                if video_reader.isOpened():
+                    descriptor.fps = video_reader.get(cv2.CAP_PROP_FPS) or None
+                    descriptor.frame_count = int(video_reader.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+                    descriptor.width = int(video_reader.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+                    descriptor.height = int(video_reader.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None
+                    if descriptor.fps and descriptor.frame_count:
+                        descriptor.duration = descriptor.frame_count / descriptor.fps
+                video_reader.release()
+            elif descriptor.kind == "audio" and sf is not None:
+                info = sf.info(descriptor.path)
+                descriptor.sample_rate = info.samplerate
+                descriptor.duration = info.duration
+        except Exception as e:
+            print(f"Warning: Could not read media properties of {descriptor.path}. Error: {e}")
+
+def sniff_mime_type(header: bytes) -> Optional[str]:
+    """
+    Identifies an image, video or audio file from its leading bytes.
+
+    Args:
+        header (bytes): The first bytes of the file; 16 are enough for every format checked here.
+
+    Returns:
+        Optional[str]: The MIME type, or None if the signature is not recognised.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if header.startswith((b"II*\x00", b"MM\x00*")):
+        return "image/tiff"
+    if header.startswith(b"RIFF") and len(header) >= 12:
+        form = header[8:12]
+        if form == b"WEBP":
+            return "image/webp"
+        if form == b"WAVE":
+            return "audio/wav"
+        if form == b"AVI ":
+            return "video/x-msvideo"
+        return None
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in (b"M4A ", b"M4B ", b"M4P "):
+            return "audio/mp4"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic"
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand.startswith(b"3g"):
+            return "video/3gpp"
+        return "video/mp4"
+    if header.startswith(b"\x1aE\xdf\xa3"):
+        return "video/webm" if b"webm" in header else "video/x-matroska"
+    if header.startswith((b"\x00\x00\x01\xba", b"\x00\x00\x01\xb3")):
+        return "video/mpeg"
+    if header.startswith(b"fLaC"):
+        return "audio/flac"
+    if header.startswith(b"OggS"):
+        return "audio/ogg"
+    if header.startswith(b"#!AMR"):
+        return "audio/amr"
+    if header.startswith(b"ID3"):
+        return "audio/mpeg"
+    if len(header) >= 2 and header[0] == 0xFF:
+        if header[1] & 0xF6 == 0xF0:
+            return "audio/aac"
+        if header[1] & 0xE0 == 0xE0:
+            return "audio/mpeg"
+    if header.startswith(b"BM") and len(header) >= 14 and header[6:10] == b"\x00\x00\x00\x00":
+        return "image/bmp"
+    return None
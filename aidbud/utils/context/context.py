@@ -2,73 +2,211 @@ from .currentsituation import CurrentSituationContext
 from .firstaidavail import FirstAidAvailableContext
 from .triage import TriageContext
 from ...config import Config
+import os
+import json
+import atexit
 import pickle
-from typing import Dict
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any
+
+FORMAT_VERSION = 1
 
 class Context:
+    """
+    The triage, first aid and current situation settings that shape every prompt.
+
+    Changes are written behind: they are batched for `write_delay` seconds and then written as JSON
+    to a temporary file that atomically replaces the context file, so a crash leaves either the old
+    or the new context on disk, never a partial one. Group several changes with `transaction()` to
+    apply them together. `version` increases with every committed change, for caches to key on.
+    """
     def __init__(self, config: Config = Config()):
         self.context_path = config.context["context_path"]
+        self.legacy_path = config.context["legacy_path"]
+        self.write_delay = config.context["write_delay"]
+        self.version = 0
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self.depth = 0
+        self.changed = False
+        self.dirty = False
+        self.timer = None
+        self.written_version = -1
         self.load()
-    
+        atexit.register(self.flush)
+
     def load(self):
+        """
+        Loads the context file, migrating a pickled context of an earlier version if there is no JSON
+        context yet, and falling back to the defaults if neither can be read.
+        """
+        with self.lock:
+            data = None
+            try:
+                with open(self.context_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = self._load_legacy()
+            except ValueError as e:
+                print(f"Warning: Could not read context file at {self.context_path}, using the defaults. Error: {e}")
+
+            try:
+                if data is not None and not isinstance(data, dict):
+                    raise TypeError(f"expected an object, got {type(data).__name__}")
+                self.from_dict(data or {})
+            except (TypeError, ValueError, AttributeError) as e:
+                print(f"Warning: Invalid context file at {self.context_path}, using the defaults. Error: {e}")
+                self.from_dict({})
+                data = None
+            self.version += 1
+            if data is None or data.get("format") != FORMAT_VERSION:
+                self.save()
+
+    def _load_legacy(self) -> Dict[str, Any]:
+        if not self.legacy_path or not os.path.isfile(self.legacy_path):
+            return None
         try:
-            with open(self.context_path, "rb") as f:
+            with open(self.legacy_path, "rb") as f:
                 data = pickle.load(f)
-            self.triage_context = data["triage"]
-            self.firstaidavail_context = data["firstaid"]
-            self.currentsituation_context = data["situation"]
-        except (FileNotFoundError, pickle.PickleError, KeyError):
+            print(f"Migrating context from {self.legacy_path} to {self.context_path}.")
+            return {
+                "triage": data["triage"].to_dict(),
+                "firstaid": data["firstaid"].to_dict(),
+                "situation": data["situation"].to_dict()
+            }
+        except (pickle.PickleError, KeyError, AttributeError, EOFError) as e:
+            print(f"Warning: Could not migrate context from {self.legacy_path}. Error: {e}")
+            return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "format": FORMAT_VERSION,
+                "triage": self.triage_context.to_dict(),
+                "firstaid": self.firstaidavail_context.to_dict(),
+                "situation": self.currentsituation_context.to_dict()
+            }
+
+    def from_dict(self, data: Dict[str, Any]):
+        with self.lock:
+            self.triage_context = TriageContext.from_dict(data.get("triage", {}))
+            self.firstaidavail_context = FirstAidAvailableContext.from_dict(data.get("firstaid", {}))
+            self.currentsituation_context = CurrentSituationContext.from_dict(data.get("situation", {}))
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups changes into one version and one write. If the block raises, every change made in it
+        is rolled back.
+
+        Example:
+            with context.transaction():
+                context.enable_triage()
+                context.set_triage({"Red": "Immediate"})
+        """
+        with self.lock:
+            snapshot = self.to_dict() if self.depth == 0 else None
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                if snapshot is not None:
+                    self.from_dict(snapshot)
+                    self.changed = False
+                raise
+            finally:
+                self.depth -= 1
+            if self.depth == 0 and self.changed:
+                self.changed = False
+                self.version += 1
+                self._schedule_write()
+
+    def _schedule_write(self):
+        self.dirty = True
+        if self.write_delay <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = threading.Timer(self.write_delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """
+        Writes pending changes now instead of waiting for the write delay.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            self.dirty = False
+            data, version = self.to_dict(), self.version
+
+        with self.write_lock:
+            if version > self.written_version:
+                self._write(data)
+                self.written_version = version
+
+    def _write(self, data: Dict[str, Any]):
+        directory = os.path.dirname(os.path.abspath(self.context_path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=".context-", suffix=".tmp", delete=False) as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+            temp_path = f.name
+        try:
+            os.replace(temp_path, self.context_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
+    def save(self):
+        """
+        Writes the context immediately.
+        """
+        with self.lock:
+            self.dirty = True
+        self.flush()
+
+    def _change(self, apply):
+        with self.transaction():
+            apply()
+            self.changed = True
+
+    def reset(self):
+        def apply():
             self.triage_context = TriageContext()
             self.firstaidavail_context = FirstAidAvailableContext()
             self.currentsituation_context = CurrentSituationContext()
-            self.save()
+        self._change(apply)
 
-    def save(self):
-        with open(self.context_path, "wb") as f:
-            pickle.dump({
-                "triage": self.triage_context,
-                "firstaid": self.firstaidavail_context,
-                "situation": self.currentsituation_context
-            }, f)
-    
-    def reset(self):
-        self.triage_context = TriageContext()
-        self.firstaidavail_context = FirstAidAvailableContext()
-        self.currentsituation_context = CurrentSituationContext()
-        self.save()
-    
     def enable_triage(self):
-        self.triage_context.enable()
-        self.save()
-    
+        self._change(self.triage_context.enable)
+
     def disable_triage(self):
-        self.triage_context.disable()
-        self.save()
-    
+        self._change(self.triage_context.disable)
+
     def enable_first_aid(self):
-        self.firstaidavail_context.enable()
-        self.save()
-    
+        self._change(self.firstaidavail_context.enable)
+
     def disable_first_aid(self):
-        self.firstaidavail_context.disable()
-        self.save()
-    
+        self._change(self.firstaidavail_context.disable)
+
     def enable_current_situation(self):
-        self.currentsituation_context.enable()
-        self.save()
-    
+        self._change(self.currentsituation_context.enable)
+
     def disable_current_situation(self):
-        self.currentsituation_context.disable()
-        self.save()
-    
+        self._change(self.currentsituation_context.disable)
+
     def set_current_situation(self, situation: str):
-        self.currentsituation_context.set_situation(situation)
-        self.save()
-    
+        self._change(lambda: self.currentsituation_context.set_situation(situation))
+
     def set_first_aid(self, availability: str):
-        self.firstaidavail_context.set_availability(availability)
-        self.save()
-    
+        self._change(lambda: self.firstaidavail_context.set_availability(availability))
+
     def set_triage(self, triage: Dict[str, str]):
-        self.triage_context.update_protocol(triage)
-        self.save()
\ No newline at end of file
+        self._change(lambda: self.triage_context.update_protocol(triage))
@@ -1,3 +1,5 @@
+from typing import Dict, Any
+
 class CurrentSituationContext:
     def __init__(self):
         self.enabled = False
@@ -10,4 +12,14 @@ class CurrentSituationContext:
         self.enabled = True
     
     def disable(self):
-        self.enabled = False
\ No newline at end of file
+        self.enabled = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "situation": self.situation}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CurrentSituationContext":
+        context = cls()
+        context.enabled = bool(data.get("enabled", False))
+        context.situation = str(data.get("situation", ""))
+        return context
@@ -1,3 +1,5 @@
+from typing import Dict, Any
+
 class FirstAidAvailableContext:
     def __init__(self):
         self.enabled = False
@@ -13,4 +15,14 @@ class FirstAidAvailableContext:
         self.enabled = True
     
     def disable(self):
-        self.enabled = False
\ No newline at end of file
+        self.enabled = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "availability": self.current_availability}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FirstAidAvailableContext":
+        context = cls()
+        context.enabled = bool(data.get("enabled", False))
+        context.set_availability(data.get("availability", "Immediate"))
+        return context
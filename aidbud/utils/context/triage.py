@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, Any
 
 class TriageContext:
     def __init__(self):
@@ -13,4 +13,13 @@ class TriageContext:
     
     def disable(self):
         self.enabled = False
-    
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "protocol": dict(self.protocol)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TriageContext":
+        context = cls()
+        context.enabled = bool(data.get("enabled", False))
+        context.protocol = dict(data.get("protocol", {}))
+        return context
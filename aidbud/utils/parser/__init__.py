@@ -1,3 +1,5 @@
 from .parser import Parser
+from .incremental import IncrementalParser
+from .schemas import SCHEMAS
 
-__all__ = ["Parser"]
\ No newline at end of file
+__all__ = ["Parser", "IncrementalParser", "SCHEMAS"]
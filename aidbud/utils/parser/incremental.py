@@ -0,0 +1,197 @@
+import re
+import json
+from typing import Optional, Dict, Any
+
+_OPENERS = re.compile(r"[{\[]")
+_STRUCTURAL = re.compile(r'[{}\[\]",\\]')
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+# A decode error this close to the end of the text may be a literal, number or escape that is still
+# being written, so the value could yet turn out valid.
+_OPEN_TAIL = 6
+
+class IncrementalParser:
+    """
+    Finds and classifies the first JSON object in model output as it arrives.
+
+    Text is fed in deltas and scanned once. At each top-level bracket the C decoder is tried first,
+    which settles complete output in one call; if the value is not complete yet, a small
+    bracket/string state machine follows it through later deltas and decodes it once, when its
+    closing bracket arrives.
+    Markdown fences and surrounding prose are skipped, and a bracket in prose that never closes
+    into valid JSON is stepped over the way `jsonfinder` does.
+
+    Results match the `jsonfinder` parser: a function call anywhere in the output wins, so with
+    `find_function` a response is only settled by `close`; otherwise the first object decides, and
+    an empty one means no response.
+
+    Args:
+        find_function (bool, optional): Classify objects with an "ID" key as function calls. Defaults to True.
+        attachment (bool, optional): Look for an attachment description instead: objects without a
+            "description" are skipped. Defaults to False.
+    """
+    def __init__(self, find_function: bool = True, attachment: bool = False):
+        self.find_function = find_function
+        self.attachment = attachment
+        self.text = ""
+        self.result = None
+        self.candidate = None
+        self.done = False
+        self.final = False
+        self._reset(0)
+
+    def feed(self, delta: str) -> Optional[Dict[str, Any]]:
+        """
+        Scans a new piece of output.
+
+        Returns:
+            Optional[Dict[str, Any]]: The classified result once the first matching object is
+            complete, otherwise None. Later deltas are ignored once a result is found.
+        """
+        if self.done or not delta:
+            return self.result
+        self.text += delta
+        self._scan()
+        return self.result
+
+    def close(self, delta: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Scans the last piece of output, if any, and marks the end of the output. A top-level bracket
+        that is still open can no longer close, so scanning resumes just after it.
+        """
+        self.final = True
+        self.feed(delta)
+        while not self.done and self.start is not None:
+            self._reset(self.start + 1)
+            self._scan()
+        if self.result is None and self.candidate:
+            self.result = {"type": "response", "context": self.candidate}
+        self.done = True
+        return self.result
+
+    def partial(self) -> Dict[str, Any]:
+        """
+        Returns the fields of the object being streamed: every complete field, plus the string value
+        currently being written, cut off where the output is.
+        """
+        if self.result is not None:
+            context = self.result["context"]
+            return context if isinstance(context, dict) else {}
+        if self.candidate is not None:
+            return self.candidate
+        if self.start is None or self.stack[:1] != ["{"]:
+            return {}
+
+        text = self.text[self.start:]
+        if self.escape:
+            text = text[:-1]
+        closing = ('"' if self.in_string else "") + "".join(_CLOSERS[opener] for opener in reversed(self.stack))
+        for candidate in (text + closing, self.text[self.start:self.last_field] + "}"):
+            try:
+                value = json.loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                return value
+        return {}
+
+    def _reset(self, position: int):
+        self.position = position
+        self.start = None
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.last_field = None
+
+    def _scan(self):
+        text = self.text
+        while not self.done:
+            if self.start is None:
+                match = _OPENERS.search(text, self.position)
+                if match is None:
+                    self.position = len(text)
+                    return
+                try:
+                    value, end = _DECODER.raw_decode(text, match.start())
+                except json.JSONDecodeError as e:
+                    if self.final or (e.pos < len(text) - _OPEN_TAIL and not e.msg.startswith("Unterminated string")):
+                        self.position = match.start() + 1
+                        continue
+                    self.start = match.start()
+                    self.last_field = self.start + 1
+                    self.stack = [match.group()]
+                    self.position = match.end()
+                else:
+                    self.position = end
+                    self._accept(value)
+                continue
+
+            if self.escape:
+                if self.position >= len(text):
+                    return
+                self.escape = False
+                self.position += 1
+                continue
+
+            match = _STRUCTURAL.search(text, self.position)
+            if match is None:
+                self.position = len(text)
+                return
+            char = match.group()
+            self.position = match.end()
+
+            if self.in_string:
+                if char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == ",":
+                if len(self.stack) == 1:
+                    self.last_field = match.start()
+            elif char in _CLOSERS:
+                self.stack.append(char)
+            elif _CLOSERS[self.stack[-1]] != char:
+                self._reset(self.start + 1)
+            else:
+                self.stack.pop()
+                if not self.stack:
+                    self._complete(self.start, self.position)
+
+    def _complete(self, start: int, end: int):
+        try:
+            value = json.loads(self.text[start:end])
+        except ValueError:
+            self._reset(start + 1)
+            return
+
+        self._reset(end)
+        self._accept(value)
+
+    def _accept(self, value: Any):
+        if not isinstance(value, dict):
+            return
+        if self.attachment:
+            if value.get("description"):
+                self._finish({"type": "attachment", "context": str(value.get("description"))})
+            return
+
+        if self.find_function and value.get("ID"):
+            ID = value.get("ID")
+            REMARKS = value.get("REMARKS")
+            if isinstance(ID, int):
+                self._finish({"type": "fcall", "context": {"id": ID, "remarks": REMARKS if isinstance(REMARKS, str) else ""}})
+            else:
+                self._finish({"type": "fcall", "context": None})
+            return
+
+        if self.candidate is None:
+            # Only the first object can be the response, and an empty one is none.
+            self.candidate = value
+            if not self.find_function:
+                self._finish({"type": "response", "context": value} if value else None)
+
+    def _finish(self, result: Optional[Dict[str, Any]]):
+        self.result = result
+        self.done = True
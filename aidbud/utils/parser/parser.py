@@ -1,51 +1,23 @@
-from jsonfinder import jsonfinder
-import re
 from typing import Optional, List, Dict, Any, Union, Tuple
+from ...tracing import get_tracer
+from .incremental import IncrementalParser
 
 class Parser:
     def parse_response(self, response: str, find_function: bool = True) -> Optional[Dict[str, Any]]:
-        if find_function:
-            fcall = self._find_fcall(response)
+        with get_tracer().span("parser.parse_response", characters=len(response)):
+            return self._parse_response(response, find_function)
 
-            if isinstance(fcall, dict):
-                ID = fcall.get("ID")
-                REMARKS = fcall.get("REMARKS")
-                if isinstance(ID, int):
-                    if isinstance(REMARKS, str):
-                        return {"type": "fcall", "context": {"id": ID, "remarks": REMARKS}}
-                    else:
-                        return {"type": "fcall", "context": {"id": ID, "remarks": ""}}
-            
-            if fcall:
-                return {"type": "fcall", "context": None}
-        
-        response = self._find_pcard(response)
-
-        if response:
-            return {"type": "response", "context": response}
-        
-        return None
+    def _parse_response(self, response: str, find_function: bool = True) -> Optional[Dict[str, Any]]:
+        return IncrementalParser(find_function=find_function).close(response)
 
     def parse_attachment_response(self, response: str) -> str:
-        for start, end, match in jsonfinder(response):
-            if isinstance(match, dict):
-                if match.get("description"):
-                    return str(match.get("description"))
-        
-        return None
-        
-    
-    def _find_fcall(self, response: str) -> Optional[Dict]:
-        for start, end, match in jsonfinder(response):
-            if isinstance(match, dict):
-                if match.get("ID"):
-                    return match
-        
-        return None
+        with get_tracer().span("parser.parse_attachment_response", characters=len(response)):
+            result = IncrementalParser(attachment=True).close(response)
+            return result["context"] if result else None
 
-    def _find_pcard(self, response: str) -> Optional[Dict]:
-        for start, end, match in jsonfinder(response):
-            if isinstance(match, dict):
-                return match
-        
-        return None
\ No newline at end of file
+    def stream(self, find_function: bool = True, attachment: bool = False) -> IncrementalParser:
+        """
+        Returns an incremental parser to feed streamed output into, for reading partial fields
+        before generation finishes.
+        """
+        return IncrementalParser(find_function=find_function, attachment=attachment)
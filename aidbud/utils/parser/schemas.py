@@ -0,0 +1,53 @@
+PCARD_FIELDS = [
+    "TRIAGE",
+    "INJURY IDENTIFICATION",
+    "INJURY DESCRIPTION",
+    "PATIENT DESCRIPTION",
+    "INTERVENTION PLAN",
+    "RESPONSE"
+]
+
+PCARD_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in PCARD_FIELDS},
+    "additionalProperties": False,
+    "minProperties": 1
+}
+
+FUNCTION_PCARD_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in PCARD_FIELDS + ["ATTACHMENT"]},
+    "additionalProperties": False,
+    "minProperties": 1
+}
+
+FCALL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ID": {"type": "integer"},
+        "REMARKS": {"type": "string"}
+    },
+    "required": ["ID", "REMARKS"],
+    "additionalProperties": False
+}
+
+QUERY_FUNCTION_SCHEMA = {
+    "anyOf": [FCALL_SCHEMA, PCARD_SCHEMA]
+}
+
+ATTACHMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"}
+    },
+    "required": ["description"],
+    "additionalProperties": False
+}
+
+SCHEMAS = {
+    "pcard": PCARD_SCHEMA,
+    "function_pcard": FUNCTION_PCARD_SCHEMA,
+    "fcall": FCALL_SCHEMA,
+    "query_function": QUERY_FUNCTION_SCHEMA,
+    "attachment": ATTACHMENT_SCHEMA
+}
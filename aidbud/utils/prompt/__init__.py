@@ -1,3 +1,4 @@
 from .prompt import PromptBuilder
+from .template import Template
 
-__all__ = ["PromptBuilder"]
\ No newline at end of file
+__all__ = ["PromptBuilder", "Template"]
@@ -1,114 +1,160 @@
-from typing import List
+import functools
+from typing import List, Dict, Tuple
 from ..context import Context
+from ...tracing import get_tracer
+from .template import Template
+
+FIRST_AID_LEGEND = "Where IMMEDIATE means basic first aid is readily available, NON-IMMEDIATE means basic first aid is not readily available, and UNAVAILABLE means basic first aid is not available."
+
+def timestamp(seconds: float) -> str:
+    """
+    Formats a position in a video as MM:SS, or H:MM:SS from an hour on.
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+@functools.lru_cache(maxsize=None)
+def load_template(name: str) -> Template:
+    """
+    Loads and compiles a template once per process.
+    """
+    return Template.load(name)
 
 class PromptBuilder:
+    """
+    Builds prompts from the compiled templates in one join per call.
+
+    The triage, first aid and current situation sections only change with the context, so they are
+    bound into each template once and reused until the context version changes. Only the query,
+    attachment description and conversation context are filled in per call.
+    """
     def __init__(
         self,
         context: Context
     ):
-        self.current_situation = context.currentsituation_context
-        self.first_aid_available = context.firstaidavail_context
-        self.triage = context.triage_context
-    
-    def insert_query(self, prompt: str, query: str) -> str:
+        self.context = context
+        self._bound = {}
+
+    @property
+    def current_situation(self):
+        return self.context.currentsituation_context
+
+    @property
+    def first_aid_available(self):
+        return self.context.firstaidavail_context
+
+    @property
+    def triage(self):
+        return self.context.triage_context
+
+    def query_section(self, query: str = None) -> str:
         if query:
-            prompt = prompt.replace("[QUERY]", f"\n** Query:**\n{query}\n""", 1)
-        else:
-            prompt = prompt.replace("[QUERY]", "", 1)
-        return prompt
+            return f"\n** Query:**\n{query}\n"
+        return ""
 
-    def insert_triage(self, prompt: str) -> str:
+    def triage_section(self) -> str:
         if self.triage.enabled:
-            prompt = prompt.replace("[TRIAGE]", f"\n**Triage:**\n{self.triage.protocol}\n", 1)
-        else:
-            prompt = prompt.replace("[TRIAGE]", "", 1)
-        return prompt
+            return f"\n**Triage:**\n{self.triage.protocol}\n"
+        return ""
 
-    def insert_first_aid(self, prompt: str) -> str:
+    def first_aid_section(self) -> str:
         if self.first_aid_available.enabled:
-            prompt = prompt.replace("[FIRST AID AVAILABILITY]", f"\n**First Aid:**\nWhere IMMEDIATE means basic first aid is readily available, NON-IMMEDIATE means basic first aid is not readily available, and UNAVAILABLE means basic first aid is not available.\n{self.first_aid_available.protocol}\n", count=1)
-        else:
-            prompt = prompt.replace("[FIRST AID AVAILABILITY]", "", 1)
-        return prompt
-    
-    def insert_current_situation(self, prompt: str) -> str:
+            return f"\n**First Aid:**\n{FIRST_AID_LEGEND}\n{self.first_aid_available.current_availability}\n"
+        return ""
+
+    def current_situation_section(self) -> str:
         if self.current_situation.enabled:
-            prompt = prompt.replace("[CURRENT SITUATION]", f"\n**Current Situation:**\n{self.current_situation.situation}\n", 1)
-        else:
-            prompt = prompt.replace("[CURRENT SITUATION]", "", 1)
-        return prompt
-    
-    def insert_attachment_description(self, prompt: str, attachment_description: str = None) -> str:
+            return f"\n**Current Situation:**\n{self.current_situation.situation}\n"
+        return ""
+
+    def attachment_description_section(self, attachment_description: str = None) -> str:
         if attachment_description:
-            prompt = prompt.replace("[ATTACHMENT DESCRIPTION]", f"\n**Attachment Description:**\n{attachment_description}\n", 1)
-        else:
-            prompt = prompt.replace("[ATTACHMENT DESCRIPTION]", "", 1)
-        return prompt
-
-    def insert_conversation_context(self, prompt: str, response_context: List[str] = None, attachment_context: List[str] = None) -> str:
-        response_context_section = None
-        attachment_context_section = None
+            return f"\n**Attachment Description:**\n{attachment_description}\n"
+        return ""
+
+    def segment_section(self, index: int, count: int, start: float, end: float) -> str:
+        return (
+            f"\n**Video Segment:**\nThe video attachment is part {index + 1} of {count} of a longer recording, "
+            f"covering {timestamp(start)} to {timestamp(end)}. Describe only this part; it will be combined "
+            "with the descriptions of the other parts.\n"
+        )
+
+    def segment_descriptions_section(self, descriptions: List[Tuple[float, float, str]]) -> str:
+        lines = [f"[{timestamp(start)} - {timestamp(end)}] {description}" for start, end, description in descriptions]
+        return "\n**Part Descriptions:**\n" + "\n".join(lines) + "\n"
+
+    def conversation_context_section(self, response_context: List[str] = None, attachment_context: List[str] = None) -> str:
+        sections = []
         if response_context:
-            response_context_section = "\n**Relevant past conversation history:**\n" + "\n".join(response_context)
-        
+            sections.append("\n**Relevant past conversation history:**\n" + "\n".join(response_context))
         if attachment_context:
-            attachment_context_section = "\n**Relevant context from past attachments:**\n" + "\n".join(attachment_context)
-        
-        if response_context_section and attachment_context_section:
-            prompt = prompt.replace("[CONVERSATION CONTEXT]", f"{response_context_section}\n{attachment_context_section}\n", 1)
-        elif response_context_section:
-            prompt = prompt.replace("[CONVERSATION CONTEXT]", f"{response_context_section}\n", 1)
-        elif attachment_context_section:
-            prompt = prompt.replace("[CONVERSATION CONTEXT]", f"{attachment_context_section}\n", 1)
-        else:
-            prompt = prompt.replace("[CONVERSATION CONTEXT]", "", 1)
-        return prompt
+            sections.append("\n**Relevant context from past attachments:**\n" + "\n".join(attachment_context))
+        if sections:
+            return "\n".join(sections) + "\n"
+        return ""
+
+    def _template(self, name: str) -> Template:
+        """
+        Returns the template with the context sections bound, rebinding it if the context version
+        changed since the last call.
+        """
+        version = self.context.version
+        cached = self._bound.get(name)
+        if cached is None or cached[0] != version:
+            template = load_template(name).bind({
+                "[TRIAGE]": self.triage_section(),
+                "[FIRST AID AVAILABILITY]": self.first_aid_section(),
+                "[CURRENT CONTEXT]": self.current_situation_section()
+            })
+            cached = (version, template)
+            self._bound[name] = cached
+        return cached[1]
+
+    def _build(self, name: str, values: Dict[str, str]) -> str:
+        with get_tracer().span("prompt.build", template=name):
+            return self._template(name).render(values)
 
     def attachment_prompt(self, query: str = None) -> str:
-        with open(r"aidbud\utils\prompt\templates\attachment.txt", "r", encoding="utf-8") as file:
-            prompt = file.read()
-        return prompt
-    
+        return self._build("attachment.txt", {})
+
+    def attachment_segment_prompt(self, query: str = None, index: int = 0, count: int = 1, start: float = 0, end: float = 0) -> str:
+        return self._build("attachment.txt", {"[SEGMENT]": self.segment_section(index, count, start, end)})
+
+    def attachment_merge_prompt(self, query: str = None, descriptions: List[Tuple[float, float, str]] = None) -> str:
+        return self._build(
+            "attachment_merge.txt",
+            {
+                "[QUERY]": self.query_section(query),
+                "[SEGMENT DESCRIPTIONS]": self.segment_descriptions_section(descriptions or [])
+            }
+        )
+
     def query_function_prompt(self, query: str = None, response_context: List[str] = None, attachment_context: List[str] = None) -> str:
-        if self.triage.enabled:
-            with open(r"aidbud\utils\prompt\templates\triage_query_function.txt", "r", encoding="utf-8") as file:
-                prompt = file.read()
-                prompt = self.insert_triage(prompt)
-        else:
-            with open(r"aidbud\utils\prompt\templates\query_function.txt", "r", encoding="utf-8") as file:
-                prompt = file.read()
-        prompt = self.insert_query(prompt, query)
-        prompt = self.insert_conversation_context(prompt, response_context, attachment_context)
-        prompt = self.insert_first_aid(prompt)
-        prompt = self.insert_current_situation(prompt)
-        return prompt
-    
+        return self._build(
+            "triage_query_function.txt" if self.triage.enabled else "query_function.txt",
+            {
+                "[QUERY]": self.query_section(query),
+                "[CONVERSATION CONTEXT]": self.conversation_context_section(response_context, attachment_context)
+            }
+        )
+
     def function_prompt(self, query: str = None, attachment_description: str = None, response_context: List[str] = None, attachment_context: List[str] = None) -> str:
-        if self.triage.enabled:
-            with open(r"aidbud\utils\prompt\templates\triage_function.txt", "r", encoding="utf-8") as file:
-                prompt = file.read()
-                prompt = self.insert_triage(prompt)
-        else:
-            with open(r"aidbud\utils\prompt\templates\function.txt", "r", encoding="utf-8") as file:
-                prompt = file.read()
-        prompt = self.insert_query(prompt, query)
-        prompt = self.insert_attachment_description(prompt, attachment_description)
-        prompt = self.insert_conversation_context(prompt, response_context, attachment_context)
-        prompt = self.insert_first_aid(prompt)
-        prompt = self.insert_current_situation(prompt)
-        return prompt
-    
+        return self._build(
+            "triage_function.txt" if self.triage.enabled else "function.txt",
+            {
+                "[QUERY]": self.query_section(query),
+                "[ATTACHMENT DESCRIPTION]": self.attachment_description_section(attachment_description),
+                "[CONVERSATION CONTEXT]": self.conversation_context_section(response_context, attachment_context)
+            }
+        )
+
     def query_prompt(self, query: str = None, attachment_description: str = None, response_context: List[str] = None, attachment_context: List[str] = None) -> str:
-        if self.triage.enabled:
-            with open(r"aidbud\utils\prompt\templates\triage_query.txt", "r", encoding="utf-8") as file:
-                prompt = file.read()
-                prompt = self.insert_triage(prompt)
-        else:
-            with open(r"aidbud\utils\prompt\templates\query.txt", "r", encoding="utf-8") as file:
-                prompt = file.read()
-        prompt = self.insert_query(prompt, query)
-        prompt = self.insert_attachment_description(prompt, attachment_description)
-        prompt = self.insert_conversation_context(prompt, response_context, attachment_context)
-        prompt = self.insert_first_aid(prompt)
-        prompt = self.insert_current_situation(prompt)
-        return prompt
+        return self._build(
+            "triage_query.txt" if self.triage.enabled else "query.txt",
+            {
+                "[QUERY]": self.query_section(query),
+                "[ATTACHMENT DESCRIPTION]": self.attachment_description_section(attachment_description),
+                "[CONVERSATION CONTEXT]": self.conversation_context_section(response_context, attachment_context)
+            }
+        )
@@ -0,0 +1,95 @@
+import re
+from importlib import resources
+from typing import List, Dict, Union
+
+PLACEHOLDERS = (
+    "[TRIAGE]",
+    "[FIRST AID AVAILABILITY]",
+    "[CURRENT CONTEXT]",
+    "[CONVERSATION CONTEXT]",
+    "[QUERY]",
+    "[ATTACHMENT DESCRIPTION]",
+    "[SEGMENT]",
+    "[SEGMENT DESCRIPTIONS]"
+)
+_PLACEHOLDER = re.compile("|".join(re.escape(placeholder) for placeholder in PLACEHOLDERS))
+
+class Slot:
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Slot({self.name!r})"
+
+class Template:
+    """
+    A prompt template compiled into a list of literal text and slots.
+
+    Only the first occurrence of each placeholder is a slot. Later occurrences are part of the
+    instructions and few-shot examples (e.g. "see [FIRST AID AVAILABILITY]") and stay as text.
+    """
+    def __init__(self, name: str, segments: List[Union[str, Slot]]):
+        self.name = name
+        self.segments = segments
+
+    @classmethod
+    def compile(cls, name: str, text: str) -> "Template":
+        segments = []
+        seen = set()
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            if match.group() in seen:
+                continue
+            seen.add(match.group())
+            segments.append(text[position:match.start()])
+            segments.append(Slot(match.group()))
+            position = match.end()
+        segments.append(text[position:])
+        return cls(name, _merge(segments))
+
+    @classmethod
+    def load(cls, name: str) -> "Template":
+        """
+        Reads and compiles a template shipped in the `templates` package directory.
+        """
+        text = resources.files(__package__).joinpath("templates", name).read_text(encoding="utf-8")
+        return cls.compile(name, text)
+
+    @property
+    def slots(self) -> List[str]:
+        return [segment.name for segment in self.segments if isinstance(segment, Slot)]
+
+    def bind(self, values: Dict[str, str]) -> "Template":
+        """
+        Returns a copy of the template with the given slots filled in and the surrounding text
+        merged, so the copy renders with fewer segments.
+        """
+        segments = [
+            values[segment.name] if isinstance(segment, Slot) and segment.name in values else segment
+            for segment in self.segments
+        ]
+        return Template(self.name, _merge(segments))
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        Fills every slot in one join. Slots missing from `values` render as empty text.
+        """
+        return "".join(
+            values.get(segment.name, "") if isinstance(segment, Slot) else segment
+            for segment in self.segments
+        )
+
+def _merge(segments: List[Union[str, Slot]]) -> List[Union[str, Slot]]:
+    merged = []
+    for segment in segments:
+        if isinstance(segment, Slot):
+            merged.append(segment)
+        elif not segment:
+            continue
+        elif merged and isinstance(merged[-1], str):
+            merged[-1] += segment
+        else:
+            merged.append(segment)
+    return merged
@@ -1,3 +1,5 @@
 from .rag import RAG
+from .cache import RetrievalCache
+from .compaction import Compactor
 
-__all__ = ["RAG"]
\ No newline at end of file
+__all__ = ["RAG", "RetrievalCache", "Compactor"]
\ No newline at end of file
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class RetrievalCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    @staticmethod
+    def make_key(collection: str, query: Optional[str], conversation_id: int, k: int, version: int) -> Tuple[Hashable, ...]:
+        """
+        Builds a cache key for a retrieval call.
+
+        Args:
+            collection (str): Name of the collection being queried.
+            query (str, optional): The query text, hashed so long queries are not kept as keys.
+            conversation_id (int): The conversation the retrieval is filtered on.
+            k (int): Number of results requested.
+            version (int): Write version of the conversation at the time of the call.
+
+        Returns:
+            Tuple[Hashable, ...]: The cache key.
+        """
+        query_hash = hashlib.sha1((query or "").encode("utf-8")).hexdigest()
+        return (collection, query_hash, conversation_id, k, version)
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Any]:
+        if self.max_entries <= 0:
+            return None
+        collection = key[0]
+        with self.lock:
+            stats = self.stats.setdefault(collection, {"hits": 0, "misses": 0})
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                stats["hits"] += 1
+                return self.entries[key]
+            stats["misses"] += 1
+            return None
+
+    def put(self, key: Tuple[Hashable, ...], value: Any):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, conversation_id: int):
+        with self.lock:
+            for key in [key for key in self.entries if key[2] == conversation_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns hit/miss counts and hit rates per collection, plus an "all" total.
+        """
+        with self.lock:
+            report = {}
+            total_hits = total_misses = 0
+            for collection, stats in self.stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                report[collection] = {
+                    "hits": stats["hits"],
+                    "misses": stats["misses"],
+                    "hit_rate": stats["hits"] / lookups if lookups else 0.0
+                }
+                total_hits += stats["hits"]
+                total_misses += stats["misses"]
+            lookups = total_hits + total_misses
+            report["all"] = {
+                "hits": total_hits,
+                "misses": total_misses,
+                "hit_rate": total_hits / lookups if lookups else 0.0,
+                "entries": len(self.entries)
+            }
+            return report
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
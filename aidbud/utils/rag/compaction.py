@@ -0,0 +1,175 @@
+import ast
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+from ...config import Config
+
+if TYPE_CHECKING:
+    from .rag import RAG
+
+class Compactor:
+    def __init__(self, rag: "RAG", config: Config = Config()):
+        self.rag = rag
+        self.max_records = config.rag["max_conversation_records"]
+        self.max_age = config.rag["max_record_age"]
+        self.keep_recent = config.rag["compaction_keep_recent"]
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aidbud-compaction")
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def schedule(self, conversation_id: int) -> Optional[Future]:
+        """
+        Queues a background compaction of a conversation if it is over its retention limits.
+
+        Args:
+            conversation_id (int): The conversation to check.
+
+        Returns:
+            Optional[Future]: The future of the queued compaction, or None if no compaction is needed.
+            A conversation that is already queued is not queued twice.
+        """
+        if self.max_records is None and self.max_age is None:
+            return None
+        with self.lock:
+            future = self.pending.get(conversation_id)
+            if future is not None:
+                return future
+            try:
+                future = self.executor.submit(self._run, conversation_id)
+            except RuntimeError:
+                # The executor is shut down, e.g. when a write lands during interpreter exit.
+                return None
+            self.pending[conversation_id] = future
+            return future
+
+    def _run(self, conversation_id: int) -> Dict[str, Any]:
+        try:
+            return self.compact(conversation_id)
+        except Exception as e:
+            print(f"Warning: Could not compact conversation {conversation_id}. Error: {e}")
+            return {"compacted": 0}
+        finally:
+            with self.lock:
+                self.pending.pop(conversation_id, None)
+
+    def compact(self, conversation_id: int, force: bool = False) -> Dict[str, Any]:
+        """
+        Merges the older response records of a conversation into a single summary record.
+
+        Args:
+            conversation_id (int): The conversation to compact.
+            force (bool, optional): Compact even if the conversation is within its limits. Defaults to False.
+
+        Returns:
+            Dict[str, Any]: The number of records compacted and the IDs of the new summary record.
+
+        Records past `max_record_age` are always folded in; if the conversation holds more than
+        `max_conversation_records` records, everything but the newest `compaction_keep_recent` is
+        folded in as well. An existing summary record is merged into the new one, so each
+        conversation keeps at most one. The summary reuses the IDs of the oldest folded records so
+        it keeps sorting before the turns it precedes.
+        """
+        with self.rag.write_lock:
+            if not force and not self._over_limits(conversation_id):
+                return {"compacted": 0, "summary_ids": []}
+            result = self.rag.response_collection.get(
+                where={"conversation_id": conversation_id},
+                include=["documents", "metadatas"]
+            )
+            records = sorted(
+                zip(result.get("ids") or [], result.get("documents") or [], result.get("metadatas") or []),
+                key=lambda record: int(record[0]) if str(record[0]).isdigit() else 0
+            )
+            stale = self._select_stale(records, force)
+            if not stale:
+                return {"compacted": 0, "summary_ids": []}
+
+            summary = self._summarise(stale)
+            embeddings, chunks = self.rag.embedder.embed(summary)
+            if not embeddings:
+                raise ValueError("No embeddings generated for the conversation summary.")
+
+            created_at = max((metadata.get("created_at", 0) for _, _, metadata in stale), default=0) or time.time()
+            stale_ids = [id_ for id_, _, _ in stale]
+            self.rag.response_collection.delete(ids=stale_ids)
+            summary_ids = stale_ids[:len(embeddings)]
+            if len(summary_ids) < len(embeddings):
+                start_id = int(self.rag._autonumber(self.rag.response_collection))
+                summary_ids += [str(start_id + i) for i in range(len(embeddings) - len(summary_ids))]
+            self.rag.response_collection.add(
+                embeddings=embeddings,
+                documents=chunks,
+                metadatas=[{"conversation_id": conversation_id, "created_at": created_at, "summary": True} for _ in embeddings],
+                ids=summary_ids
+            )
+            self.rag._bump_version(conversation_id)
+
+        return {"compacted": len(stale), "summary_ids": summary_ids}
+
+    def _over_limits(self, conversation_id: int) -> bool:
+        """
+        Checks the limits without reading the conversation: its record IDs are counted, and only
+        the metadata of records past `max_record_age` is read. An expired summary alone does not
+        count, as compacting it would change nothing.
+        """
+        where = {"conversation_id": conversation_id}
+        if self.max_records is not None:
+            if len(self.rag.response_collection.get(where=where, include=[])["ids"]) > self.max_records:
+                return True
+        if self.max_age is not None:
+            expired = self.rag.response_collection.get(
+                where={"$and": [where, {"created_at": {"$lt": time.time() - self.max_age}}]},
+                include=["metadatas"]
+            )
+            return any(not (metadata or {}).get("summary") for metadata in expired.get("metadatas") or [])
+        return False
+
+    def _select_stale(self, records: List[tuple], force: bool) -> List[tuple]:
+        over_limit = force or (self.max_records is not None and len(records) > self.max_records)
+        keep_from = max(len(records) - self.keep_recent, 0) if over_limit else 0
+        cutoff = time.time() - self.max_age if self.max_age is not None else None
+
+        stale = []
+        for index, record in enumerate(records):
+            metadata = record[2] or {}
+            expired = cutoff is not None and metadata.get("created_at", cutoff) < cutoff
+            if index < keep_from or expired:
+                stale.append(record)
+
+        if len(stale) == 1 and (stale[0][2] or {}).get("summary"):
+            return []
+        return stale
+
+    def _summarise(self, records: List[tuple]) -> str:
+        queries = []
+        pcard = {}
+        response = None
+        for _, document, metadata in records:
+            try:
+                turn = ast.literal_eval(document)
+            except (ValueError, SyntaxError):
+                turn = {"response": document}
+            if not isinstance(turn, dict):
+                continue
+
+            if (metadata or {}).get("summary"):
+                queries.extend(turn.get("earlier queries", []))
+            elif turn.get("query") and turn["query"] not in queries[-1:]:
+                queries.append(turn["query"])
+
+            if isinstance(turn.get("pcard"), dict):
+                pcard.update(turn["pcard"])
+            if turn.get("response"):
+                response = turn["response"]
+
+        summary = {"query": "Summary of earlier turns", "earlier queries": queries}
+        if pcard:
+            summary["pcard"] = pcard
+        if response:
+            summary["last response"] = response
+
+        tokenizer = self.rag.embedder.tokenizer
+        while len(queries) > 1 and len(tokenizer.encode(str(summary))) > self.rag.embedder.max_token_length:
+            queries.pop(0)
+        return str(summary)
@@ -1,23 +1,77 @@
 from ...models import Embedder
 from ...config import Config
+from .cache import RetrievalCache
+from .compaction import Compactor
+from ...tracing import get_tracer
 import os
+import json
+import time
+import threading
 import tiktoken
-from typing import List, Dict, Union, Any, Tuple
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Union, Any, Tuple, Optional
 from sentence_transformers import SentenceTransformer
 import chromadb
 
+SNAPSHOT_VERSION = 1
+
+# Recent query embeddings kept, so retrieval and routing embed the query of a turn once.
+QUERY_EMBEDDING_CACHE_SIZE = 64
+
+# Config key prefix of the index settings of each collection.
+INDEX_SETTINGS = {"text_queries": "response_index", "attachment_queries": "attachment_index"}
+
+def index_configuration(config: Config, collection_name: str) -> Dict[str, Any]:
+    """
+    Returns the HNSW configuration of a collection, as Chroma takes it, from `config.rag`.
+    """
+    prefix = INDEX_SETTINGS[collection_name]
+    return {
+        "space": config.rag[f"{prefix}_space"],
+        "max_neighbors": config.rag[f"{prefix}_m"],
+        "ef_construction": config.rag[f"{prefix}_ef_construction"],
+        "ef_search": config.rag[f"{prefix}_ef_search"]
+    }
+
 class RAG:
-    def __init__(self, config: Config = Config()):
+    def __init__(self, config: Config = Config(), embedder: Optional[Embedder] = None):
         self.chroma_client = chromadb.PersistentClient(path=config.rag["db_path"])
-        self.response_collection = self.chroma_client.get_or_create_collection(
-            name="text_queries"
-        )
-        self.attachment_collection = self.chroma_client.get_or_create_collection(
-            name="attachment_queries"
-        )
-        self.embedder = Embedder(config)
+        self.index_configurations = {name: index_configuration(config, name) for name in INDEX_SETTINGS}
+        self.response_collection = self._open_collection("text_queries")
+        self.attachment_collection = self._open_collection("attachment_queries")
+        self.embedder = embedder if embedder is not None else Embedder(config)
+        self.conversation_versions = {}
+        self.retrieval_cache = RetrievalCache(config.rag["retrieval_cache_size"])
+        self.query_embeddings = OrderedDict()
+        self.query_embeddings_lock = threading.Lock()
+        self.pending_query_embeddings = {}
+        self.write_lock = threading.RLock()
+        self.compactor = Compactor(self, config)
         print("RAG pipeline initialized")
     
+    def _open_collection(self, name: str):
+        """
+        Opens a collection, creating it with the configured index settings. An existing collection
+        keeps the space, M and ef_construction it was built with, and a warning is printed if they
+        differ from the config. Its ef_search is updated to the configured one, which Chroma applies
+        when the index is next loaded, i.e. from the next start.
+        """
+        configuration = self.index_configurations[name]
+        collection = self.chroma_client.get_or_create_collection(name=name, configuration={"hnsw": configuration})
+        current = (collection.configuration or {}).get("hnsw") or {}
+        fixed = {
+            key: (current[key], value) for key, value in configuration.items()
+            if key != "ef_search" and current.get(key) is not None and current[key] != value
+        }
+        if fixed:
+            differences = ", ".join(f"{key} {built!r} instead of {value!r}" for key, (built, value) in fixed.items())
+            print(f"Warning: Collection {name} was built with {differences}. Export, reset and re-import it to apply the configured index settings.")
+        if current.get("ef_search") != configuration["ef_search"]:
+            collection.modify(configuration={"hnsw": {"ef_search": configuration["ef_search"]}})
+        return collection
+
     def _autonumber(self, collection) -> str:
         existing_ids = collection.get(include=[])["ids"]
         numeric_ids = [int(id_) for id_ in existing_ids if str(id_).isdigit()]
@@ -28,52 +82,127 @@ class RAG:
         response_embeddings, response_chunks = self.embedder.embed_response(response)
         if not response_embeddings:
             raise ValueError("No embeddings generated for the provided response.")
-        start_id = int(self._autonumber(self.response_collection))
-        ids = [str(start_id + i) for i in range(len(response_embeddings))]
-        if response_embeddings:
-            self.response_collection.add(
+        created_at = time.time()
+        with self.write_lock:
+            start_id = int(self._autonumber(self.response_collection))
+            ids = [str(start_id + i) for i in range(len(response_embeddings))]
+            with get_tracer().span("rag.add", collection="text_queries", records=len(ids)):
+                self.response_collection.add(
                     embeddings=response_embeddings,
                     documents=response_chunks,
-                    metadatas=[{"conversation_id": conversation_id} for i in response_embeddings],
+                    metadatas=[{"conversation_id": conversation_id, "created_at": created_at} for i in response_embeddings],
                     ids=ids
                 )
+            self._bump_version(conversation_id)
     
     def insert_attachment(self, attachment: Dict[str, Any], conversation_id: int):
         attachment_embeddings, attachment_chunks = self.embedder.embed_attachment(attachment)
         if not attachment_embeddings:
             raise ValueError("No embeddings generated for the provided attachment.")
-        start_id = int(self._autonumber(self.attachment_collection))
-        ids = [str(start_id + i) for i in range(len(attachment_embeddings))]
-        if attachment_embeddings:
-            self.attachment_collection.add(
+        with self.write_lock:
+            start_id = int(self._autonumber(self.attachment_collection))
+            ids = [str(start_id + i) for i in range(len(attachment_embeddings))]
+            with get_tracer().span("rag.add", collection="attachment_queries", records=len(ids)):
+                self.attachment_collection.add(
                     embeddings=attachment_embeddings,
                     documents=attachment_chunks,
-                    metadatas=[{"conversation_id": conversation_id, "paths": str(attachment["paths"])} for i in attachment_embeddings],
+                    metadatas=self._attachment_metadatas(attachment, attachment_chunks, conversation_id),
+                    ids=ids
+                )
+            self._bump_version(conversation_id)
+
+    def find_attachment(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Looks up an attachment already stored, in any conversation, for the given content hash.
+
+        Returns:
+            Optional[Dict[str, Any]]: The "ids", "documents", "embeddings" and "metadatas" of its
+            records, in order, from the conversation that stored it last, or None if there are none.
+        """
+        with get_tracer().span("rag.find_attachment") as span:
+            result = self.attachment_collection.get(
+                where={"content_hash": content_hash},
+                include=["documents", "embeddings", "metadatas"]
+            )
+            ids = [str(id_) for id_ in result.get("ids") or []]
+            span.set(records=len(ids))
+            if not ids:
+                return None
+            order = sorted(range(len(ids)), key=lambda i: int(ids[i]) if ids[i].isdigit() else -1)
+            conversation_id = result["metadatas"][order[-1]].get("conversation_id")
+            order = [i for i in order if result["metadatas"][i].get("conversation_id") == conversation_id]
+            return {
+                "ids": [ids[i] for i in order],
+                "documents": [result["documents"][i] for i in order],
+                "embeddings": [np.asarray(result["embeddings"][i], dtype=np.float32) for i in order],
+                "metadatas": [result["metadatas"][i] for i in order]
+            }
+
+    def copy_attachment(self, existing: Dict[str, Any], attachment: Dict[str, Any], conversation_id: int):
+        """
+        Stores the records of an attachment found by `find_attachment` in another conversation, with
+        their embeddings as they are, so nothing is generated or embedded again. Does nothing if the
+        conversation already holds the same content under the same paths.
+        """
+        path_str = str(attachment["paths"])
+        with self.write_lock:
+            stored = self.attachment_collection.get(
+                where={"$and": [
+                    {"conversation_id": conversation_id},
+                    {"content_hash": attachment["content_hash"]},
+                    {"paths": path_str}
+                ]},
+                include=[]
+            )["ids"]
+            if stored:
+                return
+            metadatas = []
+            for metadata in existing["metadatas"]:
+                metadata = dict(metadata)
+                metadata.update({"conversation_id": conversation_id, "paths": path_str, "content_hash": attachment["content_hash"]})
+                metadatas.append(metadata)
+            start_id = int(self._autonumber(self.attachment_collection))
+            ids = [str(start_id + i) for i in range(len(existing["ids"]))]
+            with get_tracer().span("rag.add", collection="attachment_queries", records=len(ids), copied=True):
+                self.attachment_collection.add(
+                    embeddings=existing["embeddings"],
+                    documents=existing["documents"],
+                    metadatas=metadatas,
                     ids=ids
                 )
+            self._bump_version(conversation_id)
+
+    def _attachment_metadatas(self, attachment: Dict[str, Any], chunks: List[str], conversation_id: int) -> List[Dict[str, Any]]:
+        metadatas = [{"conversation_id": conversation_id, "paths": str(attachment["paths"])} for _ in chunks]
+        if attachment.get("content_hash"):
+            for metadata in metadatas:
+                metadata["content_hash"] = attachment["content_hash"]
+            if len(chunks) > 1:
+                # Chunks overlap, so the full description is kept for reuse with the first one.
+                metadatas[0]["description"] = str(attachment["description"])
+        return metadatas
 
     def update_attachment(self, attachment: Dict[str, Any], conversation_id: int):
         attachment_embeddings, attachment_chunks = self.embedder.embed_attachment(attachment)
         if not attachment_embeddings:
             raise ValueError("No embeddings generated for the provided attachment.")
         path_str = str(attachment.get("paths", ""))
-        self.attachment_collection.delete(
-            where={
-                "conversation_id": conversation_id,
-                "paths": path_str
-            }
-        )
-        start_id = int(self._autonumber(self.attachment_collection))
-        ids = [str(start_id + i) for i in range(len(attachment_embeddings))]
-        self.attachment_collection.add(
-            embeddings=attachment_embeddings,
-            documents=attachment_chunks,
-            metadatas=[{
-                "conversation_id": conversation_id,
-                "paths": path_str
-            } for _ in attachment_embeddings],
-            ids=ids
-        )
+        with self.write_lock:
+            self.attachment_collection.delete(
+                where={
+                    "conversation_id": conversation_id,
+                    "paths": path_str
+                }
+            )
+            start_id = int(self._autonumber(self.attachment_collection))
+            ids = [str(start_id + i) for i in range(len(attachment_embeddings))]
+            self.attachment_collection.add(
+                embeddings=attachment_embeddings,
+                documents=attachment_chunks,
+                metadatas=self._attachment_metadatas(attachment, attachment_chunks, conversation_id),
+                ids=ids
+            )
+            self._bump_version(conversation_id)
     
     def get_conversation_responses(self, conversation_id: int) -> Tuple[List[str], List[str]]:
         result = self.response_collection.get(
@@ -116,66 +245,243 @@ class RAG:
         return {}
 
     def retrieve_responses(self, query: str, conversation_id: int, k: int = 5) -> Tuple[List[str], List[str]]:
+        return self._retrieve(self.response_collection, "text_queries", query, conversation_id, k)
+
+    def retrieve_attachments(self, query: str, conversation_id: int, k: int = 5) -> Tuple[List[str], List[str]]:
+        return self._retrieve(self.attachment_collection, "attachment_queries", query, conversation_id, k)
+
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """
+        Returns the embedding of a query, or of its first chunk if it is longer than the embedder
+        takes, or None if nothing could be embedded. Recent queries are kept, so the retrieval calls
+        and the router of one turn share a single embedding.
+        """
+        with self.query_embeddings_lock:
+            embedding = self.query_embeddings.get(query)
+            if embedding is not None:
+                self.query_embeddings.move_to_end(query)
+                return embedding
+            # The two retrievals of a turn run at once; the second waits for the first's embedding.
+            embedding = self.pending_query_embeddings.get(query)
+            if embedding is None:
+                embedding = self.pending_query_embeddings[query] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return embedding.result()
+
+        try:
+            embeddings, _ = self.embedder.embed(query)
+        except Exception as e:
+            with self.query_embeddings_lock:
+                self.pending_query_embeddings.pop(query, None)
+            embedding.set_exception(e)
+            raise
+        result = embeddings[0] if embeddings else None
+        with self.query_embeddings_lock:
+            self.pending_query_embeddings.pop(query, None)
+            if result is not None:
+                self.query_embeddings[query] = result
+                while len(self.query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                    self.query_embeddings.popitem(last=False)
+        embedding.set_result(result)
+        return result
+
+    def conversation_version(self, conversation_id: int) -> int:
+        return self.conversation_versions.get(conversation_id, 0)
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the retrieval cache hit/miss counts and hit rates, per collection and in total.
+        """
+        return self.retrieval_cache.get_stats()
+
+    def _bump_version(self, conversation_id: int):
+        self.conversation_versions[conversation_id] = self.conversation_version(conversation_id) + 1
+        self.retrieval_cache.invalidate(conversation_id)
+
+    def _retrieve(self, collection, collection_name: str, query: str, conversation_id: int, k: int) -> Tuple[List[str], List[str]]:
+        key = RetrievalCache.make_key(collection_name, query, conversation_id, k, self.conversation_version(conversation_id))
+        cached = self.retrieval_cache.get(key)
+        tracer = get_tracer()
+        tracer.metric("rag.cache.hits" if cached is not None else "rag.cache.misses", 1, collection=collection_name)
+        if cached is not None:
+            return list(cached[0]), list(cached[1])
+
         if not query:
-            result = self.response_collection.get(
-                where={"conversation_id": conversation_id},
-                limit=k
-            )
+            with tracer.span("rag.get", collection=collection_name):
+                result = collection.get(
+                    where={"conversation_id": conversation_id},
+                    limit=k
+                )
+            ids = [str(i) for i in result.get("ids") or []]
+            documents = [doc if isinstance(doc, str) else str(doc) for doc in result.get("documents") or []]
+        else:
+            query_embedding = self.embed_query(query)
+            with tracer.span("rag.query", collection=collection_name, k=k):
+                result = collection.query(
+                    query_embeddings=query_embedding,
+                    n_results=k,
+                    where={
+                        "conversation_id": conversation_id
+                    }
+                )
             ids_raw = result.get("ids")[0] or []
             ids = [str(i) for i in ids_raw]
             nested_documents = result.get("documents") or []
             flat_documents = [doc for sublist in nested_documents for doc in (sublist if isinstance(sublist, list) else [sublist])]
             documents = [doc if isinstance(doc, str) else str(doc) for doc in flat_documents]
-            return ids, documents
 
-        query_embeddings, query_chunks = self.embedder.embed(query)
-        result = self.response_collection.query(
-            query_embeddings=query_embeddings[0],
-            n_results=k,
-            where={
-                "conversation_id": conversation_id
+        self.retrieval_cache.put(key, (tuple(ids), tuple(documents)))
+        return ids, documents
+
+    def export_conversation(self, conversation_id: int, path: str) -> str:
+        """
+        Writes every response and attachment record of a conversation to a compressed snapshot.
+
+        Args:
+            conversation_id (int): The conversation to export.
+            path (str): Destination file. A `.npz` suffix is added if missing.
+
+        Returns:
+            str: The path the snapshot was written to.
+        """
+        return self._export_snapshot(path, where={"conversation_id": conversation_id})
+
+    def export_conversations(self, path: str) -> str:
+        """
+        Writes the responses and attachments of all conversations to a compressed snapshot.
+
+        Args:
+            path (str): Destination file. A `.npz` suffix is added if missing.
+
+        Returns:
+            str: The path the snapshot was written to.
+        """
+        return self._export_snapshot(path, where=None)
+
+    def import_conversation(self, path: str, conversation_id: Optional[int] = None) -> Dict[str, Dict[str, str]]:
+        """
+        Bulk-loads a conversation snapshot using its stored embeddings, without re-embedding.
+
+        Args:
+            path (str): Snapshot written by `export_conversation`.
+            conversation_id (int, optional): Conversation to load the records into. Defaults to the
+                conversation ID stored in the snapshot.
+
+        Returns:
+            Dict[str, Dict[str, str]]: Mapping of old to new record IDs for "responses" and "attachments".
+            IDs are only renumbered when they collide with records already in the store.
+        """
+        snapshot = self._load_snapshot(path)
+        if conversation_id is not None:
+            stored_ids = {
+                metadata.get("conversation_id")
+                for name in ("responses", "attachments")
+                for metadata in snapshot[name]["metadatas"]
             }
-        )
-        ids_raw = result.get("ids")[0] or []
-        ids = [str(i) for i in ids_raw]
-        nested_documents = result.get("documents") or []
-        flat_documents = [doc for sublist in nested_documents for doc in (sublist if isinstance(sublist, list) else [sublist])]
-        documents = [doc if isinstance(doc, str) else str(doc) for doc in flat_documents]
+            if len(stored_ids) > 1:
+                raise ValueError(f"Snapshot {path} holds {len(stored_ids)} conversations, cannot import into a single conversation.")
+            for name in ("responses", "attachments"):
+                for metadata in snapshot[name]["metadatas"]:
+                    metadata["conversation_id"] = conversation_id
+        return self._import_snapshot(snapshot)
 
-        return ids, documents
+    def import_conversations(self, path: str) -> Dict[str, Dict[str, str]]:
+        """
+        Bulk-loads a snapshot of any number of conversations using its stored embeddings.
 
-    def retrieve_attachments(self, query: str, conversation_id: int, k: int = 5) -> Tuple[List[str], List[str]]:
-        if not query:
-            result = self.attachment_collection.get(
-                where={"conversation_id": conversation_id},
-                limit=k
+        Args:
+            path (str): Snapshot written by `export_conversations` or `export_conversation`.
+
+        Returns:
+            Dict[str, Dict[str, str]]: Mapping of old to new record IDs for "responses" and "attachments".
+        """
+        return self._import_snapshot(self._load_snapshot(path))
+
+    def _export_snapshot(self, path: str, where: Optional[Dict[str, Any]]) -> str:
+        if not path.endswith(".npz"):
+            path += ".npz"
+
+        arrays = {"version": np.array(SNAPSHOT_VERSION)}
+        for name, collection in (("responses", self.response_collection), ("attachments", self.attachment_collection)):
+            result = collection.get(where=where, include=["documents", "metadatas", "embeddings"])
+            ids = [str(id_) for id_ in result.get("ids") or []]
+            documents = result.get("documents") or []
+            metadatas = result.get("metadatas") or []
+            embeddings = result.get("embeddings")
+            embeddings = np.asarray(embeddings if embeddings is not None else [], dtype=np.float32)
+
+            order = sorted(range(len(ids)), key=lambda i: (0, int(ids[i])) if ids[i].isdigit() else (1, ids[i]))
+            arrays[f"{name}_ids"] = np.array([ids[i] for i in order], dtype=str)
+            arrays[f"{name}_documents"] = np.array([documents[i] for i in order], dtype=str)
+            arrays[f"{name}_metadatas"] = np.array([json.dumps(metadatas[i]) for i in order], dtype=str)
+            arrays[f"{name}_embeddings"] = embeddings[order] if order else embeddings.reshape(0, 0)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(path, **arrays)
+        return path
+
+    def _load_snapshot(self, path: str) -> Dict[str, Dict[str, Any]]:
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["version"])
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {version} in {path}.")
+            snapshot = {}
+            for name in ("responses", "attachments"):
+                snapshot[name] = {
+                    "ids": [str(id_) for id_ in data[f"{name}_ids"]],
+                    "documents": [str(doc) for doc in data[f"{name}_documents"]],
+                    "metadatas": [json.loads(str(metadata)) for metadata in data[f"{name}_metadatas"]],
+                    "embeddings": data[f"{name}_embeddings"].astype(np.float32)
+                }
+        return snapshot
+
+    def _import_snapshot(self, snapshot: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        with self.write_lock:
+            return self._import_records(snapshot)
+
+    def _import_records(self, snapshot: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        id_maps = {}
+        for name, collection in (("responses", self.response_collection), ("attachments", self.attachment_collection)):
+            records = snapshot[name]
+            old_ids = records["ids"]
+            if not old_ids:
+                id_maps[name] = {}
+                continue
+
+            existing = collection.get(ids=old_ids, include=[])["ids"]
+            if existing:
+                start_id = int(self._autonumber(collection))
+                new_ids = [str(start_id + i) for i in range(len(old_ids))]
+                print(f"Warning: {len(existing)} {name} IDs already in use, renumbering imported records from {start_id}.")
+            else:
+                new_ids = list(old_ids)
+
+            collection.add(
+                embeddings=list(records["embeddings"]),
+                documents=records["documents"],
+                metadatas=records["metadatas"],
+                ids=new_ids
             )
-            ids_raw = result.get("ids")[0] or []
-            ids = [str(i) for i in ids_raw]
-            nested_documents = result.get("documents") or []
-            flat_documents = [doc for sublist in nested_documents for doc in (sublist if isinstance(sublist, list) else [sublist])]
-            documents = [doc if isinstance(doc, str) else str(doc) for doc in flat_documents]
-            return ids, documents
+            id_maps[name] = dict(zip(old_ids, new_ids))
 
-        query_embeddings, query_chunks = self.embedder.embed(query)
-        result = self.attachment_collection.query(
-            query_embeddings=query_embeddings[0],
-            n_results=k,
-            where={
-                "conversation_id": conversation_id
-            }
-        )
-        ids_raw = result.get("ids")[0] or []
-        ids = [str(i) for i in ids_raw]
-        nested_documents = result.get("documents") or []
-        flat_documents = [doc for sublist in nested_documents for doc in (sublist if isinstance(sublist, list) else [sublist])]
-        documents = [doc if isinstance(doc, str) else str(doc) for doc in flat_documents]
+        for conversation_id in {
+            metadata.get("conversation_id")
+            for name in ("responses", "attachments")
+            for metadata in snapshot[name]["metadatas"]
+        }:
+            self._bump_version(conversation_id)
+        return id_maps
 
-        return ids, documents
-    
     def delete_conversation(self, conversation_id: int):
-        self.response_collection.delete(where={"conversation_id": conversation_id})
-        self.attachment_collection.delete(where={"conversation_id": conversation_id})
+        with self.write_lock:
+            self.response_collection.delete(where={"conversation_id": conversation_id})
+            self.attachment_collection.delete(where={"conversation_id": conversation_id})
+            self._bump_version(conversation_id)
 
     def reset_collections(self):
         try:
@@ -188,9 +494,8 @@ class RAG:
         except Exception:
             pass  
 
-        self.response_collection = self.chroma_client.get_or_create_collection(
-            name="text_queries"
-        )
-        self.attachment_collection = self.chroma_client.get_or_create_collection(
-            name="attachment_queries"
-        )
\ No newline at end of file
+        self.response_collection = self._open_collection("text_queries")
+        self.attachment_collection = self._open_collection("attachment_queries")
+        for conversation_id in list(self.conversation_versions):
+            self._bump_version(conversation_id)
+        self.retrieval_cache.clear()
\ No newline at end of file
@@ -1,3 +1,4 @@
 from .workflow import Workflow
+from .router import AttachmentRouter
 
-__all__ = ["Workflow"]
\ No newline at end of file
+__all__ = ["Workflow", "AttachmentRouter"]
\ No newline at end of file
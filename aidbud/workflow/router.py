@@ -0,0 +1,85 @@
+import threading
+import numpy as np
+from typing import Dict, Any
+from ..utils import RAG
+from ..config import Config
+
+class AttachmentRouter:
+    def __init__(self, rag: RAG, config: Config = Config()):
+        self.rag = rag
+        self.enabled = config.router["enabled"]
+        self.function_threshold = config.router["function_threshold"]
+        self.query_threshold = config.router["query_threshold"]
+        self.margin = config.router["margin"]
+        self.counts = {"query": 0, "function": 0, "llm": 0}
+        self.lock = threading.Lock()
+
+    def route(self, query: str, conversation_id: int) -> Dict[str, Any]:
+        """
+        Decides up front whether a text-only turn needs a stored attachment reloaded.
+
+        Args:
+            query (str): The user's query.
+            conversation_id (int): The conversation the query belongs to.
+
+        Returns:
+            Dict[str, Any]: "route" is "query" to answer without attachments, "function" to reload the
+            attachment whose ID is in "id", or "llm" to let the model decide through an fcall. "score"
+            is the best cosine similarity between the query and a stored attachment description.
+
+        A conversation without attachments always routes to "query". Otherwise the query embedding is
+        compared against every stored attachment chunk; a clear, confident match goes straight to
+        "function", a clearly unrelated query to "query", and anything in between falls back to "llm".
+        """
+        decision = self._decide(query, conversation_id)
+        with self.lock:
+            self.counts[decision["route"]] += 1
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = sum(self.counts.values())
+            return {
+                route: {"count": count, "rate": count / total if total else 0.0}
+                for route, count in self.counts.items()
+            }
+
+    def _decide(self, query: str, conversation_id: int) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"route": "llm", "id": None, "score": None}
+
+        result = self.rag.attachment_collection.get(
+            where={"conversation_id": conversation_id},
+            include=["embeddings", "metadatas"]
+        )
+        ids = result.get("ids") or []
+        if not ids:
+            return {"route": "query", "id": None, "score": None}
+        if not query:
+            return {"route": "llm", "id": None, "score": None}
+
+        query_embedding = self.rag.embed_query(query)
+        if query_embedding is None:
+            return {"route": "llm", "id": None, "score": None}
+
+        attachments = np.asarray(result["embeddings"], dtype=np.float32)
+        attachments /= np.linalg.norm(attachments, axis=1, keepdims=True) + 1e-12
+        query_vector = np.array(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) + 1e-12
+        scores = attachments @ query_vector
+
+        best = {}
+        paths = [(metadata or {}).get("paths") for metadata in result.get("metadatas") or [None] * len(ids)]
+        for id_, path, score in zip(ids, paths, scores.tolist()):
+            group = path or id_
+            if group not in best or score > best[group][1]:
+                best[group] = (id_, score)
+        ranked = sorted(best.values(), key=lambda item: item[1], reverse=True)
+
+        best_id, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if best_score >= self.function_threshold and best_score - runner_up >= self.margin and str(best_id).isdigit():
+            return {"route": "function", "id": int(best_id), "score": best_score}
+        if best_score < self.query_threshold:
+            return {"route": "query", "id": None, "score": best_score}
+        return {"route": "llm", "id": None, "score": best_score}
@@ -1,105 +1,198 @@
 
 from ..models import LLM
-from ..utils import RAG, Context, PromptBuilder, Parser
+from ..models.llm import segment_path, plan_segments
+from ..utils import RAG, Context, PromptBuilder, Parser, ContextAssembler, AttachmentRegistry
+from ..utils.parser import SCHEMAS
 from ..config import Config
+from ..tracing import get_tracer, configure_tracing
+from .router import AttachmentRouter
 from typing import List, Dict, Any, Tuple
 from urllib.parse import urlparse
 import mimetypes
 import ast
+import time
+import hashlib
+import asyncio
+import contextvars
+import functools
+import threading
 import os
 import requests
 import os
 import tempfile
 import urllib.request
 from typing import List
-from moviepy import VideoFileClip, AudioFileClip
+from concurrent.futures import ThreadPoolExecutor, Future
 
 class Workflow:
-    def __init__(self, context: Context, config: Config = Config()):
+    def __init__(self, context: Context, config: Config = Config(), llm: LLM = None, rag: RAG = None):
         self.config = config
         self.context = context
-        self.llm = LLM(config)
-        self.rag = RAG(config)
+        self.tracer = configure_tracing(config)
+        self.registry = AttachmentRegistry(config)
+        if config.server["enabled"] and (llm is None or rag is None):
+            # The models run in a `python -m aidbud.server` process, shared with other clients.
+            from ..server import RemoteLLM, RemoteEmbedder
+            llm = llm if llm is not None else RemoteLLM(config, registry=self.registry)
+            rag = rag if rag is not None else RAG(config, embedder=RemoteEmbedder(config))
+        self.llm = llm if llm is not None else LLM(config, registry=self.registry)
+        if getattr(self.llm, "registry", None) is None:
+            self.llm.registry = self.registry
+        self.rag = rag if rag is not None else RAG(config)
         self.prompt_builder = PromptBuilder(context)
         self.parser = Parser()
+        self.schemas = SCHEMAS if config.llm["constrained_decoding"] else {}
+        self.context_assembler = ContextAssembler(self.rag.embedder.tokenizer, config)
+        self.router = AttachmentRouter(self.rag, config)
+        self.long_video_seconds = config.attachments["long_video_seconds"]
+        self.segment_seconds = config.attachments["segment_seconds"]
+        self.merge_fan_in = config.attachments["merge_fan_in"]
+        self.reuse_descriptions = config.attachments["reuse_descriptions"]
+        self.executor = ThreadPoolExecutor(max_workers=config.llm["num_workers"], thread_name_prefix="aidbud-workflow")
+        self.pending_writes = {}
+        self.pending_lock = threading.Lock()
     
     def classify_attachments(self, attachment_paths: List[str]) -> Tuple[List[str], List[str], List[str]]:
-        image_paths = []
-        video_paths = []
-        audio_paths = []
+        with self.tracer.span("workflow.classify", attachments=len(attachment_paths or [])):
+            return self.registry.classify(attachment_paths)
+    
+    def run(self, conversation_id: int, query: str, attachment_paths: List[str] = None):
+        """
+        Synchronous wrapper around `arun`, usable both from plain scripts and from inside a running
+        event loop such as a Jupyter kernel.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.arun(conversation_id, query, attachment_paths))
 
-        if attachment_paths is None:
-            return image_paths, video_paths, audio_paths
+        with ThreadPoolExecutor(max_workers=1) as runner:
+            return runner.submit(asyncio.run, self.arun(conversation_id, query, attachment_paths)).result()
 
-        for path in attachment_paths:
-            parsed = urlparse(path)
-            is_url = parsed.scheme in ["http", "https"]
-
-            if is_url:
-                try:
-                    response = requests.head(path, allow_redirects=True, timeout=5)
-                    if response.status_code >= 400:
-                        print(f"[SKIPPED] URL does not exist or is inaccessible: {path}")
-                        continue
-                except requests.RequestException:
-                    print(f"[SKIPPED] Failed to check URL: {path}")
-                    continue
-            else:
-                if not os.path.exists(path):
-                    print(f"[SKIPPED] File does not exist: {path}")
-                    continue
+    async def arun(self, conversation_id: int, query: str, attachment_paths: List[str] = None):
+        """
+        Runs one conversation turn, overlapping retrieval with attachment analysis.
 
-            mime_type, _ = mimetypes.guess_type(parsed.path if is_url else path)
-            if mime_type is None:
-                print(f"[SKIPPED] Unknown MIME type: {path}")
-                continue
-
-            if mime_type.startswith("image/"):
-                image_paths.append(path)
-            elif mime_type.startswith("video/"):
-                video_paths.append(path)
-            elif mime_type.startswith("audio/"):
-                audio_paths.append(path)
-            else:
-                print(f"[SKIPPED] Unsupported MIME type: {mime_type} - {path}")
+        Args:
+            conversation_id (int): The conversation the turn belongs to.
+            query (str): The user's query.
+            attachment_paths (List[str], optional): Paths or URLs of attachments sent with the query.
 
-        return image_paths, video_paths, audio_paths
-    
-    def run(self, conversation_id: int, query: str, attachment_paths: List[str] = None):
-        response_ids, response_contexts = self.rag.retrieve_responses(query, conversation_id, self.config.rag["topK"])
-        attachment_ids, attachment_contexts = self.rag.retrieve_attachments(query, conversation_id, self.config.rag["topK"])
-        response_context = []
-        attachment_context = []
-        if response_contexts:
-            response_context = response_contexts
-        if attachment_contexts:
-            attachment_context = [str({"attachment id": attachment_ids[i], "description": attachment_contexts[i]}) for i in range(len(attachment_ids))]
+        Returns:
+            Dict[str, Any]: The parsed output of the turn, or a dict with an "error" key. Both carry
+            "timings", the seconds spent waiting on retrieval, the attachment description and
+            generation, and the whole turn.
+
+        Blocking model and database calls run on the workflow's thread pool. The attachment
+        description is generated while the response and attachment contexts are retrieved, and the
+        turn's writes to RAG are queued in the background; the next turn of the same conversation
+        waits for them before retrieving, so it never misses the previous turn.
+        """
+        with self.tracer.span("workflow.run", conversation_id=conversation_id, attachments=len(attachment_paths or [])) as span:
+            output = await self._arun(conversation_id, query, attachment_paths)
+            span.set(error=bool(output.get("error")))
+            return output
+
+    async def _arun(self, conversation_id: int, query: str, attachment_paths: List[str] = None):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        timings = {}
+        await self.wait_for_writes(conversation_id)
 
+        k = self.config.rag["topK"]
+        retrieval = asyncio.gather(
+            self._in_executor(loop, self.rag.retrieve_responses, query, conversation_id, k),
+            self._in_executor(loop, self.rag.retrieve_attachments, query, conversation_id, k)
+        )
+        description = None
         if attachment_paths:
-            output = self._query(conversation_id, query, response_context, attachment_context, attachment_paths)
+            description = self._in_executor(loop, self._reuse_or_describe, query, attachment_paths)
+
+        with self.tracer.span("workflow.retrieve"):
+            (response_ids, response_contexts), (attachment_ids, attachment_contexts) = await retrieval
+        timings["retrieve"] = time.perf_counter() - start
+        attachment_contexts = [str({"attachment id": attachment_ids[i], "description": attachment_contexts[i]}) for i in range(len(attachment_ids))]
+        with self.tracer.span("workflow.assemble_context") as span:
+            response_context, attachment_context, context_usage = self.context_assembler.assemble(
+                response_ids, response_contexts, attachment_ids, attachment_contexts
+            )
+            span.set(**{key: value for key, value in context_usage.items() if isinstance(value, (int, float))})
+
+        if attachment_paths:
+            waited = time.perf_counter()
+            attachment_description, content_hash, existing = await description
+            timings["describe"] = time.perf_counter() - waited
+            if attachment_description:
+                self._write_behind(conversation_id, self._store_attachment, conversation_id, attachment_description, attachment_paths, content_hash, existing)
+            generating = time.perf_counter()
+            output = await self._in_executor(
+                loop, self._query, conversation_id, query, response_context, attachment_context, None, attachment_description
+            )
         else:
-            output = self._query_function(conversation_id, query, response_context, attachment_context)
-        
+            generating = time.perf_counter()
+            output = await self._in_executor(
+                loop, self._query_function, conversation_id, query, response_context, attachment_context
+            )
+        timings["generate"] = time.perf_counter() - generating
+        timings["total"] = time.perf_counter() - start
+
         if output.get("error"):
-            return {"error": output["error"]}
-        
+            return {"error": output["error"], "timings": timings}
+
         response_object = {"query": query}
         if output.get("pcard"):
             response_object["pcard"] = output["pcard"]
         if output.get("response"):
             response_object["response"] = output["response"]
-        self.rag.insert_response(response_object, conversation_id)
+        self._write_behind(conversation_id, self._insert_response, response_object, conversation_id)
 
+        output["context_usage"] = context_usage
+        output["timings"] = timings
         return output
+
+    async def wait_for_writes(self, conversation_id: int = None):
+        """
+        Waits until the queued RAG writes of a conversation, or of all conversations, have landed.
+        """
+        with self.pending_lock:
+            if conversation_id is None:
+                futures = [future for futures in self.pending_writes.values() for future in futures]
+            else:
+                futures = list(self.pending_writes.get(conversation_id, []))
+        if futures:
+            await asyncio.gather(*[asyncio.wrap_future(future) for future in futures], return_exceptions=True)
+
+    def _in_executor(self, loop: asyncio.AbstractEventLoop, fn, *args) -> asyncio.Future:
+        # Runs in a copy of the caller's context so spans opened on the pool nest under the turn's span.
+        return loop.run_in_executor(self.executor, functools.partial(contextvars.copy_context().run, fn, *args))
+
+    def _write_behind(self, conversation_id: int, fn, *args) -> Future:
+        future = self.executor.submit(contextvars.copy_context().run, fn, *args)
+        with self.pending_lock:
+            self.pending_writes.setdefault(conversation_id, []).append(future)
+        future.add_done_callback(lambda done: self._finish_write(conversation_id, done))
+        return future
+
+    def _finish_write(self, conversation_id: int, future: Future):
+        with self.pending_lock:
+            futures = self.pending_writes.get(conversation_id, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self.pending_writes.pop(conversation_id, None)
+        if future.exception() is not None:
+            print(f"Warning: Could not store conversation {conversation_id} turn. Error: {future.exception()}")
+
+    def _insert_response(self, response_object: Dict[str, Any], conversation_id: int):
+        self.rag.insert_response(response_object, conversation_id)
+        self.rag.compactor.schedule(conversation_id)
     
-    def _query(self, conversation_id: int, query: str, conversation_context: List[str], attachment_context: List[str], attachment_paths: List[str] = None):
-        if attachment_paths:
+    def _query(self, conversation_id: int, query: str, conversation_context: List[str], attachment_context: List[str], attachment_paths: List[str] = None, attachment_description: str = None):
+        if attachment_paths and attachment_description is None:
             attachment_description = self._attachment_processing(conversation_id, query, attachment_paths)
-        else:
-            attachment_description = None
 
         prompt = self.prompt_builder.query_prompt(query, attachment_description, conversation_context, attachment_context)
-        response = self.llm.generate(prompt)
+        response = self.llm.generate(prompt, schema=self.schemas.get("pcard"))
         parsed_response = self.parser.parse_response(response, find_function=False)
 
         if parsed_response:
@@ -116,8 +209,15 @@ class Workflow:
             return {"error": "There was an error generating a response. Please try again."}
 
     def _query_function(self, conversation_id: int, query: str, conversation_context: List[str], attachment_context: List[str]):
+        route = self.router.route(query, conversation_id)
+        if route["route"] == "query":
+            return self._query(conversation_id, query, conversation_context, attachment_context)
+        if route["route"] == "function":
+            fcall = {"id": route["id"], "remarks": ""}
+            return self._function(conversation_id, query, fcall, conversation_context, attachment_context)
+
         prompt = self.prompt_builder.query_function_prompt(query, conversation_context, attachment_context)
-        response = self.llm.generate(prompt)
+        response = self.llm.generate(prompt, schema=self.schemas.get("query_function"))
         parsed_response = self.parser.parse_response(response, find_function=True)
 
         if parsed_response:
@@ -147,9 +247,12 @@ class Workflow:
         if attachment_data:
             attachment_paths = ast.literal_eval(attachment_data["metadata"]["paths"])
             attachment_description = attachment_data["document"]
+            content_hash = attachment_data["metadata"].get("content_hash")
             image_paths, video_paths, audio_paths = self.classify_attachments(attachment_paths)
+            # Long videos would not fit in one call; their stored description stands in for them.
+            video_paths = [path for path in video_paths if self._video_duration(path) is None]
             prompt = self.prompt_builder.function_prompt(query, attachment_description, conversation_context, attachment_context)
-            response = self.llm.generate(prompt, image_paths, video_paths, audio_paths)
+            response = self.llm.generate(prompt, image_paths, video_paths, audio_paths, schema=self.schemas.get("function_pcard"))
             parsed_response = self.parser.parse_response(response, find_function=False)
 
             if parsed_response:
@@ -162,7 +265,7 @@ class Workflow:
                 if isinstance(validated_pcard, dict):
                     output["pcard"] = validated_pcard
                     if validated_pcard.get("ATTACHMENT"):
-                        attachment_data = {"description": validated_pcard.get("ATTACHMENT"), "paths": attachment_paths}
+                        attachment_data = {"description": validated_pcard.get("ATTACHMENT"), "paths": attachment_paths, "content_hash": content_hash}
                         self.rag.update_attachment(attachment_data, conversation_id)
                         del validated_pcard["ATTACHMENT"]
                 return output
@@ -191,7 +294,7 @@ class Workflow:
         return None
     
     def _valid_fcall(self, fcall: Dict[str, Any]) -> Dict[str, Any]:
-        if fcall["type"] == "fcall":
+        if isinstance(fcall, dict):
             fields = {
                 "id": fcall.get("id"),
                 "remarks": fcall.get("remarks")
@@ -209,14 +312,128 @@ class Workflow:
 
     def _attachment_processing(self, conversation_id: int, query: str, attachment_paths: List[str] = None):
         if attachment_paths:
-            image_paths, video_paths, audio_paths = self.classify_attachments(attachment_paths)
-            prompt = self.prompt_builder.attachment_prompt(query)
-            response = self.llm.generate(prompt, image_paths, video_paths, audio_paths)
-            description = self.parser.parse_attachment_response(response)
+            description, content_hash, existing = self._reuse_or_describe(query, attachment_paths)
             
             if description:
-                attachment_data = {"description": description, "paths": attachment_paths}
-                self.rag.insert_attachment(attachment_data, conversation_id)
+                self._store_attachment(conversation_id, description, attachment_paths, content_hash, existing)
             
             return description
-        return None
\ No newline at end of file
+        return None
+
+    def _reuse_or_describe(self, query: str, attachment_paths: List[str]) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Returns the description of the attachments, reused from any conversation that already holds
+        the same media, or generated if none does.
+
+        Returns:
+            Tuple[str, str, Dict[str, Any]]: The description, the attachments' content hash (None when
+            reuse is off or a file could not be hashed), and the stored records it was reused from, if any.
+        """
+        content_hash = self._attachment_key(attachment_paths)
+        if content_hash is not None:
+            existing = self.rag.find_attachment(content_hash)
+            if existing is not None:
+                self.tracer.metric("workflow.attachments.reused", 1)
+                return existing["metadatas"][0].get("description") or existing["documents"][0], content_hash, existing
+        self.tracer.metric("workflow.attachments.described", 1)
+        return self._describe_attachments(query, attachment_paths), content_hash, None
+
+    def _store_attachment(self, conversation_id: int, description: str, attachment_paths: List[str], content_hash: str = None, existing: Dict[str, Any] = None):
+        attachment_data = {"description": description, "paths": attachment_paths, "content_hash": content_hash}
+        if existing is not None:
+            self.rag.copy_attachment(existing, attachment_data, conversation_id)
+        else:
+            self.rag.insert_attachment(attachment_data, conversation_id)
+
+    def _attachment_key(self, attachment_paths: List[str]) -> str:
+        """
+        Returns one hash over the content of all the attachments, in order, and the model describing
+        them, or None if descriptions are not reused or any attachment has no content hash, e.g. a URL.
+        """
+        if not self.reuse_descriptions:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(self.llm.model_id).encode("utf-8"))
+        for path in attachment_paths:
+            descriptor = self.registry.probe(path)
+            if descriptor is None or descriptor.content_hash is None:
+                return None
+            digest.update(descriptor.content_hash.encode("ascii"))
+        return digest.hexdigest()
+
+    def _describe_attachments(self, query: str, attachment_paths: List[str]) -> str:
+        image_paths, video_paths, audio_paths = self.classify_attachments(attachment_paths)
+        durations = {path: self._video_duration(path) for path in video_paths}
+        long_videos = [path for path in video_paths if durations[path] is not None]
+        video_paths = [path for path in video_paths if durations[path] is None]
+
+        descriptions = []
+        if image_paths or video_paths or audio_paths:
+            prompt = self.prompt_builder.attachment_prompt(query)
+            response = self.llm.generate(prompt, image_paths, video_paths, audio_paths, schema=self.schemas.get("attachment"))
+            descriptions.append(self.parser.parse_attachment_response(response))
+        for path in long_videos:
+            descriptions.append(self._describe_long_video(query, path, durations[path]))
+
+        descriptions = [description for description in descriptions if description]
+        if not descriptions:
+            return None
+        return "\n\n".join(descriptions)
+
+    def _video_duration(self, path: str) -> float:
+        """
+        Returns the duration of a video too long to describe in one call, or None for any other video.
+        Only local videos have a known duration, so remote ones are always described whole.
+        """
+        if self.long_video_seconds is None:
+            return None
+        descriptor = self.registry.probe(path)
+        if descriptor is None or not descriptor.duration or descriptor.duration <= self.long_video_seconds:
+            return None
+        return descriptor.duration
+
+    def _describe_long_video(self, query: str, path: str, duration: float) -> str:
+        """
+        Describes a long video by mapping it into segments and reducing their descriptions.
+
+        Each segment is a separate call with at most `segment_seconds` of frames and audio, read on its
+        own, so memory stays bounded however long the recording is. The segment descriptions are then
+        merged `merge_fan_in` at a time, in as many rounds as it takes, so no merge prompt outgrows
+        the context window either.
+        """
+        segments = plan_segments(duration, self.segment_seconds)
+        schema = self.schemas.get("attachment")
+        with self.tracer.span("workflow.describe_long_video", path=path, duration=duration, segments=len(segments)):
+            descriptions = []
+            for index, (start, end) in enumerate(segments):
+                with self.tracer.span("workflow.describe_segment", index=index, start=start, end=end):
+                    prompt = self.prompt_builder.attachment_segment_prompt(query, index, len(segments), start, end)
+                    response = self.llm.generate(prompt, video_paths=[segment_path(path, start, end)], schema=schema)
+                description = self.parser.parse_attachment_response(response)
+                if description:
+                    descriptions.append((start, end, description))
+            return self._merge_descriptions(query, descriptions)
+
+    def _merge_descriptions(self, query: str, descriptions: List[Tuple[float, float, str]]) -> str:
+        schema = self.schemas.get("attachment")
+        rounds = 0
+        while len(descriptions) > 1:
+            groups = [descriptions[i:i + self.merge_fan_in] for i in range(0, len(descriptions), self.merge_fan_in)]
+            merging = [group for group in groups if len(group) > 1]
+            with self.tracer.span("workflow.merge_descriptions", round=rounds, merges=len(merging)):
+                prompts = [self.prompt_builder.attachment_merge_prompt(query, group) for group in merging]
+                # The merges of a round are independent text-only calls, so they run as one batch.
+                responses = iter(self.llm.generate_batch(prompts, schema=schema))
+
+            merged = []
+            for group in groups:
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                description = self.parser.parse_attachment_response(next(responses))
+                if not description:
+                    description = " ".join(text for _, _, text in group)
+                merged.append((group[0][0], group[-1][1], description))
+            descriptions = merged
+            rounds += 1
+        return descriptions[0][2] if descriptions else None
@@ -0,0 +1,4 @@
+from .standins import WordTokenizer, StandInLLM, StandInEmbedder, Responder
+from .suite import run_suite, check_regressions
+
+__all__ = ["WordTokenizer", "StandInLLM", "StandInEmbedder", "Responder", "run_suite", "check_regressions"]
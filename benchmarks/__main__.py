@@ -0,0 +1,43 @@
+import os
+import sys
+import json
+import argparse
+from .fixtures import ATTACHMENT_MIXES
+from .suite import run_suite, check_regressions, load_json
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline end-to-end AidBud benchmarks on stand-in models.")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[0, 100, 1000], help="Stored records before the timed turns.")
+    parser.add_argument("--mixes", nargs="+", default=list(ATTACHMENT_MIXES), choices=list(ATTACHMENT_MIXES), help="Attachment mixes to run.")
+    parser.add_argument("--turns", type=int, default=5, help="Timed turns per scenario.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed turns per scenario.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="Keep databases and attachments here instead of a temporary directory.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results.")
+    parser.add_argument("--baseline", default=None, help="Earlier results to check for regressions against.")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="Regression thresholds (JSON).")
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        corpus_sizes=args.corpus_sizes,
+        mixes=args.mixes,
+        turns=args.turns,
+        warmup=args.warmup,
+        seed=args.seed,
+        work_dir=args.work_dir
+    )
+    baseline = load_json(args.baseline) if args.baseline else None
+    results["regressions"] = check_regressions(results, load_json(args.thresholds), baseline)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[BENCH] Results written to {args.output}")
+
+    for regression in results["regressions"]:
+        print(f"[REGRESSION] {regression['scenario']} {regression['stage']}: {regression['value']:.2f} > {regression['limit']:.2f}")
+    return 1 if results["regressions"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+import chromadb
+from chromadb.api.client import SharedSystemClient
+from aidbud.config import Config
+from aidbud.utils.rag.rag import INDEX_SETTINGS
+
+COLLECTIONS = {"responses": "text_queries", "attachments": "attachment_queries"}
+
+def synthetic_corpus(size: int, dim: int, queries: int, clusters: int = 32, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns unit-length records and queries drawn from the same Gaussian clusters, which is closer to
+    sentence embeddings than uniform noise: neighbours are dense within a topic and sparse across.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size + queries)
+    vectors = centres[labels] + 0.6 * rng.standard_normal((size + queries, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors[:size], vectors[size:]
+
+def snapshot_corpus(path: str, collection: str, queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the stored embeddings of one collection of a snapshot written by `RAG.export_conversations`,
+    with `queries` of them held out of the corpus to query with.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        embeddings = data[f"{collection}_embeddings"].astype(np.float32)
+    if len(embeddings) < 2:
+        raise ValueError(f"Snapshot {path} holds {len(embeddings)} {collection} records, too few to sweep.")
+    queries = min(queries, len(embeddings) // 2)
+    order = np.random.default_rng(seed).permutation(len(embeddings))
+    return embeddings[order[queries:]], embeddings[order[:queries]]
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, space: str, k: int) -> np.ndarray:
+    """
+    Returns the indices of the exact `k` nearest records of each query, by brute force, under the
+    same distance Chroma uses for `space`.
+    """
+    if space == "l2":
+        distances = (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ corpus.T + (corpus ** 2).sum(axis=1)[None, :]
+    elif space == "cosine":
+        normed = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        distances = 1 - (queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)) @ normed.T
+    else:
+        distances = 1 - queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(nearest, np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1), axis=1)
+
+def index_memory(size: int, dim: int, m: int) -> int:
+    """
+    Estimated bytes of an HNSW index in memory, following hnswlib's layout: every record holds its
+    vector, label and 2M links on the base layer, and on average 1/(M-1) upper layers of M links.
+    """
+    base = size * (dim * 4 + (2 * m + 1) * 4 + 8)
+    upper = size / max(m - 1, 1) * (m + 1) * 4
+    return int(base + upper)
+
+def sweep(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    spaces: List[str],
+    ms: List[int],
+    ef_constructions: List[int],
+    ef_searches: List[int],
+    k: int,
+    work_dir: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Builds an index for every (space, M, ef_construction) and queries it at every ef_search.
+
+    Returns:
+        List[Dict[str, Any]]: Per setting, recall@k against exact search, build seconds, p50 and p95
+        query latency in milliseconds, and estimated index memory in bytes.
+    """
+    owns_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="aidbud-ann-")
+    client = chromadb.PersistentClient(path=work_dir)
+    batch_size = client.get_max_batch_size()
+    ids = [str(i) for i in range(len(corpus))]
+    results = []
+    try:
+        for space in spaces:
+            exact = exact_neighbours(corpus, queries, space, k)
+            for m, ef_construction in itertools.product(ms, ef_constructions):
+                name = f"sweep-{space}-{m}-{ef_construction}"
+                collection = client.create_collection(name, configuration={"hnsw": {
+                    "space": space, "max_neighbors": m, "ef_construction": ef_construction, "ef_search": ef_searches[0]
+                }})
+                start = time.perf_counter()
+                for offset in range(0, len(corpus), batch_size):
+                    collection.add(ids=ids[offset:offset + batch_size], embeddings=corpus[offset:offset + batch_size])
+                build_seconds = time.perf_counter() - start
+
+                for ef_search in ef_searches:
+                    collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                    # A loaded index keeps the ef_search it was loaded with, so reopen the store.
+                    SharedSystemClient.clear_system_cache()
+                    client = chromadb.PersistentClient(path=work_dir)
+                    collection = client.get_collection(name)
+                    collection.query(query_embeddings=queries[:1], n_results=k, include=[])
+                    latencies = []
+                    hits = 0
+                    # One query per call, as retrieval issues them.
+                    for query, expected in zip(queries, exact):
+                        start = time.perf_counter()
+                        found = collection.query(query_embeddings=query[None, :], n_results=k, include=[])["ids"][0]
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        hits += len({int(id_) for id_ in found} & set(expected.tolist()))
+                    results.append({
+                        "space": space,
+                        "m": m,
+                        "ef_construction": ef_construction,
+                        "ef_search": ef_search,
+                        "recall": hits / exact.size,
+                        "build_seconds": build_seconds,
+                        "p50_ms": float(np.percentile(latencies, 50)),
+                        "p95_ms": float(np.percentile(latencies, 95)),
+                        "memory_bytes": index_memory(len(corpus), corpus.shape[1], m)
+                    })
+                    print(
+                        f"{space} M={m} ef_construction={ef_construction} ef_search={ef_search}: "
+                        f"recall@{k} {results[-1]['recall']:.3f}, p50 {results[-1]['p50_ms']:.2f} ms, "
+                        f"p95 {results[-1]['p95_ms']:.2f} ms, {results[-1]['memory_bytes'] / 2 ** 20:.1f} MiB"
+                    )
+                client.delete_collection(name)
+    finally:
+        if owns_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def recommend(results: List[Dict[str, Any]], target_recall: float) -> Optional[Dict[str, Any]]:
+    """
+    Returns the setting with the lowest p95 latency, then memory, that reaches `target_recall`, or
+    the one with the highest recall if none does.
+    """
+    if not results:
+        return None
+    passing = [result for result in results if result["recall"] >= target_recall]
+    if passing:
+        return min(passing, key=lambda result: (result["p95_ms"], result["memory_bytes"], result["build_seconds"]))
+    return max(results, key=lambda result: (result["recall"], -result["p95_ms"]))
+
+def config_overrides(result: Dict[str, Any], collection: str) -> Dict[str, Dict[str, Any]]:
+    prefix = INDEX_SETTINGS[COLLECTIONS[collection]]
+    return {"rag": {
+        f"{prefix}_space": result["space"],
+        f"{prefix}_m": result["m"],
+        f"{prefix}_ef_construction": result["ef_construction"],
+        f"{prefix}_ef_search": result["ef_search"]
+    }}
+
+def main(argv=None) -> int:
+    defaults = Config().rag
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ann_sweep", description="Sweep HNSW index settings for recall@k against exact search, query latency and index memory.")
+    parser.add_argument("--snapshot", default=None, help="Snapshot from `RAG.export_conversations` to sweep instead of a synthetic corpus.")
+    parser.add_argument("--collection", default="responses", choices=list(COLLECTIONS), help="Collection of the snapshot, and config keys to recommend.")
+    parser.add_argument("--size", type=int, default=10000, help="Records in the synthetic corpus.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size of the synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries held out of the corpus.")
+    parser.add_argument("-k", type=int, default=defaults["topK"], help="Neighbours retrieved per query.")
+    parser.add_argument("--spaces", nargs="+", default=["l2", "cosine"], choices=["l2", "cosine", "ip"])
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32], help="Graph links per record.")
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 50, 100, 200])
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Recall the recommended setting must reach.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="Build the indexes here instead of a temporary directory.")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results.")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        corpus, queries = snapshot_corpus(args.snapshot, args.collection, args.queries, args.seed)
+    else:
+        corpus, queries = synthetic_corpus(args.size, args.dim, args.queries, seed=args.seed)
+    print(f"[ANN] {len(corpus)} records of {corpus.shape[1]} dimensions, {len(queries)} queries, k={args.k}")
+
+    results = sweep(corpus, queries, args.spaces, args.m, args.ef_construction, args.ef_search, args.k, args.work_dir)
+    best = recommend(results, args.target_recall)
+    output = {"records": len(corpus), "dim": int(corpus.shape[1]), "queries": len(queries), "k": args.k, "target_recall": args.target_recall, "results": results}
+    if best is not None:
+        output["recommended"] = config_overrides(best, args.collection)
+        reached = "reaches" if best["recall"] >= args.target_recall else "is the closest to"
+        print(f"[ANN] Recommended, {reached} recall@{args.k} {args.target_recall}: {json.dumps(output['recommended'])}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"[ANN] Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import random
+import numpy as np
+from typing import List, Dict
+from PIL import Image
+import soundfile as sf
+from .standins import WORDS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_VIDEO = os.path.join(ROOT, "injury_sample.mp4")
+
+ATTACHMENT_MIXES = {
+    "text": [],
+    "image": ["image"],
+    "audio": ["audio"],
+    "video": ["video"],
+    "image+audio": ["image", "audio"],
+    "all": ["image", "image", "audio", "video"]
+}
+
+QUERIES = [
+    "My friend just burnt his hand on the stove, what should I do?",
+    "The skin is red and there is a small blister forming.",
+    "Should I put ice on it or just cold water?",
+    "He says the pain is getting worse, is that normal?",
+    "There is some swelling around the wrist now.",
+    "How long should I keep it under the tap?",
+    "Can I pop the blister?",
+    "What signs of infection should I watch for?"
+]
+
+def make_image(path: str, width: int = 1280, height: int = 960, seed: int = 0) -> str:
+    """
+    Writes a synthetic photo-sized image: a smooth gradient with a reddish blob and sensor-like
+    noise, so it compresses and decodes like a real photo rather than a flat fill.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    cx, cy = rng.uniform(0.3, 0.7) * width, rng.uniform(0.3, 0.7) * height
+    blob = np.exp(-(((x - cx) / (0.15 * width)) ** 2 + ((y - cy) / (0.15 * height)) ** 2))
+    image = np.stack([
+        170 + 60 * blob + 20 * x / width,
+        140 - 40 * blob + 20 * y / height,
+        120 - 40 * blob + 10 * (x + y) / (width + height)
+    ], axis=-1)
+    image += rng.normal(0, 6, image.shape)
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(path, quality=90)
+    return path
+
+def make_audio(path: str, seconds: float = 8.0, sample_rate: int = 16000, seed: int = 0) -> str:
+    """
+    Writes a mono WAV of speech-like bursts (harmonic tones under a syllable envelope) separated by
+    low-level noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(phase * harmonic) / harmonic for harmonic in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None) * (np.sin(2 * np.pi * 0.25 * t) > -0.3)
+    audio = 0.3 * voice * envelope + rng.normal(0, 0.01, t.shape)
+    sf.write(path, audio.astype(np.float32), sample_rate)
+    return path
+
+def make_attachments(directory: str) -> Dict[str, List[str]]:
+    """
+    Creates the attachment files the mixes draw from and returns their paths by kind.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return {
+        "image": [make_image(os.path.join(directory, f"injury_{i}.jpg"), seed=i) for i in range(2)],
+        "audio": [make_audio(os.path.join(directory, "description.wav"))],
+        "video": [SAMPLE_VIDEO]
+    }
+
+def attachment_paths(mix: str, attachments: Dict[str, List[str]]) -> List[str]:
+    paths = []
+    used = {kind: 0 for kind in attachments}
+    for kind in ATTACHMENT_MIXES[mix]:
+        paths.append(attachments[kind][used[kind] % len(attachments[kind])])
+        used[kind] += 1
+    return paths
+
+def corpus_turn(index: int, rng: random.Random) -> Dict[str, str]:
+    """
+    A synthetic past turn, shaped like the records the workflow stores.
+    """
+    def sentence(words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    turn = {"query": f"{rng.choice(QUERIES)} ({index})", "response": sentence(rng.randint(20, 80))}
+    if rng.random() < 0.5:
+        turn["pcard"] = {"INJURY IDENTIFICATION": sentence(3), "PATIENT DESCRIPTION": sentence(15)}
+    return turn
@@ -0,0 +1,99 @@
+import sys
+import json
+import time
+import random
+import argparse
+from typing import List, Dict, Any, Optional
+from jsonfinder import jsonfinder
+from aidbud.utils import Parser
+from .standins import Responder, WORDS
+
+class LegacyParser:
+    """
+    The jsonfinder-based parser that `Parser` replaced, kept to check the incremental parser against.
+    """
+    def parse_response(self, response: str, find_function: bool = True) -> Optional[Dict[str, Any]]:
+        if find_function:
+            fcall = self._find(response, lambda match: match.get("ID"))
+            if isinstance(fcall, dict):
+                ID = fcall.get("ID")
+                REMARKS = fcall.get("REMARKS")
+                if isinstance(ID, int):
+                    return {"type": "fcall", "context": {"id": ID, "remarks": REMARKS if isinstance(REMARKS, str) else ""}}
+                return {"type": "fcall", "context": None}
+        pcard = self._find(response, lambda match: True)
+        if pcard:
+            return {"type": "response", "context": pcard}
+        return None
+
+    def parse_attachment_response(self, response: str) -> Optional[str]:
+        match = self._find(response, lambda match: match.get("description"))
+        return str(match.get("description")) if match else None
+
+    def _find(self, response: str, predicate) -> Optional[Dict]:
+        for start, end, match in jsonfinder(response):
+            if isinstance(match, dict) and predicate(match):
+                return match
+        return None
+
+def sample_outputs(count: int, seed: int = 0) -> List[str]:
+    """
+    Model outputs in the shapes seen in practice: bare JSON, fenced JSON, JSON wrapped in prose,
+    prose with stray brackets, function calls, attachment descriptions and truncated output.
+    """
+    rng = random.Random(seed)
+    responder = Responder()
+    outputs = []
+    for i in range(count):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+        body = responder(f"{words} {i}")
+        shape = i % 8
+        if shape == 0:
+            outputs.append(body)
+        elif shape == 1:
+            outputs.append(f"```json\n{body}\n```")
+        elif shape == 2:
+            outputs.append(f"Here is the card:\n{body}\nLet me know if {words}.")
+        elif shape == 3:
+            outputs.append(f"Note {{ {words} }} and [{words}] first.\n{body}")
+        elif shape == 4:
+            outputs.append(json.dumps({"ID": rng.randint(1, 50), "REMARKS": words}))
+        elif shape == 5:
+            outputs.append(responder(f"expert medical triage {words} {i}"))
+        elif shape == 6:
+            outputs.append(body[:rng.randint(1, len(body) - 1)])
+        else:
+            outputs.append(f"{words} with no structured output")
+    return outputs
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.parser_parity", description="Check the incremental parser against the jsonfinder parser and time both.")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    outputs = sample_outputs(args.count, args.seed)
+    legacy, current = LegacyParser(), Parser()
+    checks = [
+        ("parse_response(find_function=True)", lambda p, o: p.parse_response(o, find_function=True)),
+        ("parse_response(find_function=False)", lambda p, o: p.parse_response(o, find_function=False)),
+        ("parse_attachment_response", lambda p, o: p.parse_attachment_response(o))
+    ]
+
+    mismatches = 0
+    for name, call in checks:
+        timings = {}
+        results = {}
+        for label, implementation in (("jsonfinder", legacy), ("incremental", current)):
+            start = time.perf_counter()
+            results[label] = [call(implementation, output) for output in outputs]
+            timings[label] = (time.perf_counter() - start) * 1000.0 / len(outputs)
+        differing = [i for i, (a, b) in enumerate(zip(results["jsonfinder"], results["incremental"])) if a != b]
+        mismatches += len(differing)
+        print(f"{name}: jsonfinder {timings['jsonfinder']:.3f} ms, incremental {timings['incremental']:.3f} ms, {len(differing)} mismatches")
+        for i in differing[:3]:
+            print(f"  output {i!r}: {outputs[i][:120]!r}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+from types import SimpleNamespace
+from typing import List, Dict, Any
+from aidbud.utils import PromptBuilder
+from aidbud.utils.context.triage import TriageContext
+from aidbud.utils.context.firstaidavail import FirstAidAvailableContext
+from aidbud.utils.context.currentsituation import CurrentSituationContext
+from aidbud.utils.prompt.prompt import FIRST_AID_LEGEND
+from .fixtures import QUERIES, corpus_turn
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aidbud", "utils", "prompt", "templates")
+
+class LegacyPromptBuilder:
+    """
+    The read-and-replace builder that the compiled templates replaced: every call reads the template
+    from disk and fills it with one `str.replace` per placeholder. The current situation and first
+    aid sections are fixed the same way as in `PromptBuilder`, so the two produce the same prompts.
+    """
+    def __init__(self, context):
+        self.context = context
+
+    def _read_template(self, name: str) -> str:
+        with open(os.path.join(TEMPLATE_DIR, name), "r", encoding="utf-8") as file:
+            return file.read()
+
+    def _build(self, name: str, query: str, attachment_description: str, response_context: List[str], attachment_context: List[str]) -> str:
+        triage = self.context.triage_context
+        first_aid = self.context.firstaidavail_context
+        situation = self.context.currentsituation_context
+        prompt = self._read_template(name)
+        prompt = prompt.replace("[TRIAGE]", f"\n**Triage:**\n{triage.protocol}\n" if triage.enabled else "", 1)
+        prompt = prompt.replace("[QUERY]", f"\n** Query:**\n{query}\n" if query else "", 1)
+        prompt = prompt.replace("[ATTACHMENT DESCRIPTION]", f"\n**Attachment Description:**\n{attachment_description}\n" if attachment_description else "", 1)
+        sections = []
+        if response_context:
+            sections.append("\n**Relevant past conversation history:**\n" + "\n".join(response_context))
+        if attachment_context:
+            sections.append("\n**Relevant context from past attachments:**\n" + "\n".join(attachment_context))
+        prompt = prompt.replace("[CONVERSATION CONTEXT]", "\n".join(sections) + "\n" if sections else "", 1)
+        prompt = prompt.replace("[FIRST AID AVAILABILITY]", f"\n**First Aid:**\n{FIRST_AID_LEGEND}\n{first_aid.current_availability}\n" if first_aid.enabled else "", 1)
+        prompt = prompt.replace("[CURRENT CONTEXT]", f"\n**Current Situation:**\n{situation.situation}\n" if situation.enabled else "", 1)
+        return prompt
+
+    def query_prompt(self, query=None, attachment_description=None, response_context=None, attachment_context=None) -> str:
+        name = "triage_query.txt" if self.context.triage_context.enabled else "query.txt"
+        return self._build(name, query, attachment_description, response_context, attachment_context)
+
+    def function_prompt(self, query=None, attachment_description=None, response_context=None, attachment_context=None) -> str:
+        name = "triage_function.txt" if self.context.triage_context.enabled else "function.txt"
+        return self._build(name, query, attachment_description, response_context, attachment_context)
+
+    def query_function_prompt(self, query=None, response_context=None, attachment_context=None) -> str:
+        name = "triage_query_function.txt" if self.context.triage_context.enabled else "query_function.txt"
+        return self._build(name, query, None, response_context, attachment_context)
+
+def make_context(triage: bool, first_aid: bool, situation: bool):
+    context = SimpleNamespace(
+        version=1,
+        triage_context=TriageContext(),
+        firstaidavail_context=FirstAidAvailableContext(),
+        currentsituation_context=CurrentSituationContext()
+    )
+    context.triage_context.update_protocol({"RED": "Immediate life threat", "YELLOW": "Urgent but stable", "GREEN": "Minor injury"})
+    context.firstaidavail_context.set_availability("Non-Immediate")
+    context.currentsituation_context.set_situation("Hiking trail, two hours from the nearest road.")
+    for sub, enabled in ((context.triage_context, triage), (context.firstaidavail_context, first_aid), (context.currentsituation_context, situation)):
+        if enabled:
+            sub.enable()
+    return context
+
+def make_calls(count: int, context_items: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    calls = []
+    for i in range(count):
+        turns = [json.dumps(corpus_turn(j, rng)) for j in range(context_items)]
+        calls.append({
+            "query": rng.choice(QUERIES),
+            "attachment_description": corpus_turn(i, rng)["response"] if i % 2 else None,
+            "response_context": turns[:context_items // 2 + context_items % 2],
+            "attachment_context": turns[context_items // 2 + context_items % 2:]
+        })
+    return calls
+
+def build(builder, kind: str, call: Dict[str, Any]) -> str:
+    if kind == "query_function":
+        return builder.query_function_prompt(call["query"], call["response_context"], call["attachment_context"])
+    return getattr(builder, f"{kind}_prompt")(call["query"], call["attachment_description"], call["response_context"], call["attachment_context"])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.prompt_build", description="Time prompt building against the read-and-replace builder and check both produce the same prompts.")
+    parser.add_argument("--count", type=int, default=500, help="Prompts built per configuration.")
+    parser.add_argument("--context-items", type=int, nargs="+", default=[0, 8, 32], help="Retrieved context records per prompt.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    for items in args.context_items:
+        calls = make_calls(args.count, items, args.seed)
+        for kind in ("query", "function", "query_function"):
+            timings = {"legacy": 0.0, "compiled": 0.0}
+            differing = 0
+            for flags in itertools.product((False, True), repeat=3):
+                context = make_context(*flags)
+                builders = {"legacy": LegacyPromptBuilder(context), "compiled": PromptBuilder(context)}
+                prompts = {}
+                for label, builder in builders.items():
+                    start = time.perf_counter()
+                    prompts[label] = [build(builder, kind, call) for call in calls]
+                    timings[label] += time.perf_counter() - start
+                differing += sum(a != b for a, b in zip(prompts["legacy"], prompts["compiled"]))
+            mismatches += differing
+            builds = args.count * 8
+            print(
+                f"{kind}_prompt, {items} context items: "
+                f"legacy {timings['legacy'] * 1e6 / builds:.1f} us, compiled {timings['compiled'] * 1e6 / builds:.1f} us, "
+                f"{differing} mismatches"
+            )
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
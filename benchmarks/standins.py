@@ -0,0 +1,278 @@
+import re
+import json
+import random
+import hashlib
+import threading
+import cv2
+import numpy as np
+import torch
+from torch import nn
+from typing import List, Dict, Any, Tuple
+from transformers import GPT2Config, GPT2LMHeadModel
+from aidbud.config import Config
+from aidbud.models import LLM, Embedder
+
+PAD_TOKEN = 0
+IMAGE_TOKEN = 1
+AUDIO_TOKEN = 2
+RESERVED_TOKENS = 3
+
+WORDS = [
+    "patient", "hand", "forearm", "knee", "burn", "laceration", "abrasion", "swelling", "bleeding",
+    "redness", "blister", "wound", "pressure", "bandage", "dressing", "cool", "water", "minutes",
+    "clean", "sterile", "gauze", "elevate", "pain", "mild", "moderate", "severe", "superficial",
+    "deep", "left", "right", "small", "large", "visible", "edges", "skin", "tissue", "apply",
+    "monitor", "signs", "infection", "shock", "breathing", "conscious", "responsive", "splint"
+]
+
+class WordTokenizer:
+    """
+    Lossless word-level tokenizer standing in for tiktoken. Words, whitespace runs and punctuation
+    each become one token, which keeps token counts in the same range as a BPE vocabulary without
+    needing to download one.
+    """
+    pattern = re.compile(r"\w+|\s+|[^\w\s]")
+
+    def __init__(self):
+        self.pieces = ["", "", ""]
+        self.ids = {}
+        self.lock = threading.Lock()
+
+    def encode(self, text: str) -> List[int]:
+        tokens = []
+        with self.lock:
+            for piece in self.pattern.findall(text):
+                token = self.ids.get(piece)
+                if token is None:
+                    token = len(self.pieces)
+                    self.ids[piece] = token
+                    self.pieces.append(piece)
+                tokens.append(token)
+        return tokens
+
+    def decode(self, tokens: List[int]) -> str:
+        pieces = self.pieces
+        return "".join(pieces[int(token)] for token in tokens if RESERVED_TOKENS <= int(token) < len(pieces))
+
+class TinySentenceEncoder(nn.Module):
+    """
+    Randomly initialised two-layer transformer encoder with mean pooling, standing in for the
+    bge-small SentenceTransformer. Produces normalised vectors of the same width.
+    """
+    def __init__(self, tokenizer: WordTokenizer, vocab_size: int = 8192, width: int = 128, dimensions: int = 384, max_tokens: int = 512):
+        super().__init__()
+        self.tokenizer = tokenizer
+        self.vocab_size = vocab_size
+        self.max_tokens = max_tokens
+        self.embedding = nn.Embedding(vocab_size, width, padding_idx=PAD_TOKEN)
+        layer = nn.TransformerEncoderLayer(width, nhead=4, dim_feedforward=width * 4, batch_first=True)
+        self.encoder = nn.TransformerEncoder(layer, num_layers=2, enable_nested_tensor=False)
+        self.projection = nn.Linear(width, dimensions)
+        self.eval()
+
+    @torch.no_grad()
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        rows = [self._ids(text) for text in texts]
+        length = max(len(row) for row in rows)
+        ids = torch.full((len(rows), length), PAD_TOKEN, dtype=torch.long)
+        for i, row in enumerate(rows):
+            ids[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+        padding = ids == PAD_TOKEN
+        hidden = self.encoder(self.embedding(ids), src_key_padding_mask=padding)
+        mask = (~padding).unsqueeze(-1).float()
+        pooled = self.projection((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0))
+        return nn.functional.normalize(pooled, dim=-1).numpy()
+
+    def _ids(self, text: str) -> List[int]:
+        ids = [RESERVED_TOKENS + token % (self.vocab_size - RESERVED_TOKENS) for token in self.tokenizer.encode(text)[:self.max_tokens]]
+        return ids or [RESERVED_TOKENS]
+
+class StandInEmbedder(Embedder):
+    def __init__(self, config: Config = Config(), tokenizer: WordTokenizer = None, seed: int = 0):
+        self.shared_tokenizer = tokenizer
+        self.seed = seed
+        super().__init__(config)
+
+    def _load_model(self, config: Config) -> Tuple[Any, Any]:
+        torch.manual_seed(self.seed)
+        tokenizer = self.shared_tokenizer if self.shared_tokenizer is not None else WordTokenizer()
+        return TinySentenceEncoder(tokenizer, max_tokens=config.rag["embedder_max_tokens"]), tokenizer
+
+class Responder:
+    """
+    Scripts the text the stand-in LLM "generates", so every downstream stage (parsing, validation,
+    inserts) sees well-formed output. Responses are derived from a hash of the prompt, so runs are
+    reproducible.
+    """
+    def __init__(self, response_words: int = 60, description_words: int = 80):
+        self.response_words = response_words
+        self.description_words = description_words
+
+    def __call__(self, prompt: str) -> str:
+        rng = random.Random(hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+        if "expert medical triage" in prompt:
+            return "```json\n" + json.dumps({"description": self._sentence(rng, self.description_words)}) + "\n```"
+        pcard = {
+            "INJURY IDENTIFICATION": self._sentence(rng, 3),
+            "INJURY DESCRIPTION": self._sentence(rng, self.response_words // 3),
+            "PATIENT DESCRIPTION": self._sentence(rng, self.response_words // 3),
+            "INTERVENTION PLAN": "\n".join(f"{i}. {self._sentence(rng, 6)}" for i in range(1, 4)),
+            "RESPONSE": self._sentence(rng, self.response_words)
+        }
+        if "[TRIAGE]" not in prompt and "**Triage:**" in prompt:
+            pcard["TRIAGE"] = rng.choice(["Red", "Yellow", "Green"])
+        return json.dumps(pcard, indent=1)
+
+    def _sentence(self, rng: random.Random, words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(max(words, 1))).capitalize() + "."
+
+class StandInProcessor:
+    """
+    Mirrors the parts of the Gemma processor that `LLM` uses: chat templating, tokenisation with
+    left padding, image and audio feature extraction, and decoding.
+    """
+    def __init__(self, tokenizer: WordTokenizer, image_size: int = 224, image_tokens: int = 64, sample_rate: int = 16000, audio_tokens_per_second: float = 6.25, mel_bins: int = 64):
+        self.tokenizer = tokenizer
+        self.tokenizer.padding_side = "right"
+        self.image_size = image_size
+        self.image_tokens = image_tokens
+        self.sample_rate = sample_rate
+        self.audio_tokens_per_second = audio_tokens_per_second
+        self.mel_bins = mel_bins
+
+    def apply_chat_template(self, messages: List[Dict[str, Any]], add_generation_prompt: bool = True, return_tensors: bool = False) -> str:
+        text = "".join(part["text"] for message in messages for part in message["content"] if part["type"] == "text")
+        return f"user\n{text}\nmodel\n" if add_generation_prompt else f"user\n{text}\n"
+
+    def __call__(self, text, images=None, audio=None, padding: bool = False, return_tensors: str = "pt") -> Dict[str, torch.Tensor]:
+        texts = [text] if isinstance(text, str) else list(text)
+        inputs = {}
+        media_tokens = []
+        if images:
+            inputs["pixel_values"] = self._image_features(images)
+            media_tokens += [IMAGE_TOKEN] * (self.image_tokens * len(images))
+        if audio:
+            inputs["input_features"] = self._audio_features(audio)
+            media_tokens += [AUDIO_TOKEN] * inputs["input_features"].shape[1]
+
+        rows = [media_tokens + self.tokenizer.encode(t) for t in texts]
+        length = max(len(row) for row in rows)
+        input_ids = torch.full((len(rows), length), PAD_TOKEN, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), length), dtype=torch.long)
+        for i, row in enumerate(rows):
+            if self.tokenizer.padding_side == "left":
+                input_ids[i, length - len(row):] = torch.tensor(row)
+                attention_mask[i, length - len(row):] = 1
+            else:
+                input_ids[i, :len(row)] = torch.tensor(row)
+                attention_mask[i, :len(row)] = 1
+        inputs["input_ids"] = input_ids
+        inputs["attention_mask"] = attention_mask
+        return inputs
+
+    def batch_decode(self, sequences: torch.Tensor, skip_special_tokens: bool = True) -> List[str]:
+        return [self.tokenizer.decode(row.tolist()) for row in sequences]
+
+    def _image_features(self, images) -> torch.Tensor:
+        arrays = [
+            self._resize(image).astype(np.float32) / 127.5 - 1.0
+            for image in images
+        ]
+        return torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).contiguous()
+
+    def _resize(self, image) -> np.ndarray:
+        # Video frames arrive as RGB uint8 arrays, still images as PIL images.
+        if isinstance(image, np.ndarray):
+            return cv2.resize(image, (self.image_size, self.image_size), interpolation=cv2.INTER_AREA)
+        return np.asarray(image.convert("RGB").resize((self.image_size, self.image_size)))
+
+    def _audio_features(self, audios) -> torch.Tensor:
+        frame, hop = 400, 160
+        features = []
+        for audio in audios:
+            audio = np.asarray(audio, dtype=np.float32)
+            if len(audio) < frame:
+                audio = np.pad(audio, (0, frame - len(audio)))
+            frames = np.lib.stride_tricks.sliding_window_view(audio, frame)[::hop] * np.hanning(frame).astype(np.float32)
+            spectrum = np.abs(np.fft.rfft(frames, axis=-1))
+            bins = np.array_split(spectrum, self.mel_bins, axis=-1)
+            features.append(np.log1p(np.stack([b.mean(axis=-1) for b in bins], axis=-1)))
+        tokens = max(1, int(max(len(a) for a in audios) / self.sample_rate * self.audio_tokens_per_second))
+        pooled = [
+            np.stack([chunk.mean(axis=0) for chunk in np.array_split(f, tokens, axis=0) if len(chunk)] or [np.zeros(self.mel_bins)])
+            for f in features
+        ]
+        length = max(len(p) for p in pooled)
+        batch = np.zeros((len(pooled), length, self.mel_bins), dtype=np.float32)
+        for i, p in enumerate(pooled):
+            batch[i, :len(p)] = p
+        return torch.from_numpy(batch)
+
+class StandInModel(nn.Module):
+    """
+    Tiny randomly initialised decoder with vision and audio towers. `generate` runs a real prefill
+    and one decode step per scripted output token, then returns the scripted tokens, so timings scale
+    with prompt, media and response sizes the way the real model's do.
+    """
+    def __init__(self, processor: StandInProcessor, responder: Responder, vocab_size: int = 8192, width: int = 128, layers: int = 2, context_length: int = 4096):
+        super().__init__()
+        self.processor = processor
+        self.responder = responder
+        self.vocab_size = vocab_size
+        self.context_length = context_length
+        self.lm = GPT2LMHeadModel(GPT2Config(
+            vocab_size=vocab_size, n_positions=context_length, n_embd=width, n_layer=layers, n_head=4,
+            bos_token_id=None, eos_token_id=None, pad_token_id=PAD_TOKEN
+        ))
+        self.vision_tower = nn.Sequential(nn.Conv2d(3, width, kernel_size=16, stride=16), nn.GELU(), nn.Conv2d(width, width, kernel_size=3, padding=1))
+        self.audio_tower = nn.Sequential(nn.Linear(processor.mel_bins, width), nn.GELU(), nn.Linear(width, width))
+        self.eval()
+
+    @property
+    def device(self) -> torch.device:
+        return next(self.parameters()).device
+
+    @torch.no_grad()
+    def generate(self, input_ids: torch.Tensor, attention_mask: torch.Tensor = None, pixel_values: torch.Tensor = None, input_features: torch.Tensor = None, max_new_tokens: int = 1024, logits_processor=None, **kwargs) -> torch.Tensor:
+        if pixel_values is not None:
+            self.vision_tower(pixel_values)
+        if input_features is not None:
+            self.audio_tower(input_features)
+
+        tokenizer = self.processor.tokenizer
+        scripted = []
+        for row in input_ids:
+            prompt = tokenizer.decode(row.tolist())
+            prompt = prompt[prompt.find("user\n") + len("user\n"):prompt.rfind("\nmodel\n")]
+            scripted.append(tokenizer.encode(self.responder(prompt))[:max_new_tokens])
+        new_tokens = max(len(tokens) for tokens in scripted)
+
+        keep = self.context_length - new_tokens
+        model_ids = RESERVED_TOKENS + input_ids[:, -keep:] % (self.vocab_size - RESERVED_TOKENS)
+        model_mask = attention_mask[:, -keep:] if attention_mask is not None else torch.ones_like(model_ids)
+        self.lm.generate(
+            input_ids=model_ids,
+            attention_mask=model_mask,
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            logits_processor=logits_processor
+        )
+
+        output = torch.full((input_ids.shape[0], new_tokens), PAD_TOKEN, dtype=torch.long)
+        for i, tokens in enumerate(scripted):
+            output[i, :len(tokens)] = torch.tensor(tokens, dtype=torch.long)
+        return torch.cat([input_ids, output], dim=1)
+
+class StandInLLM(LLM):
+    def __init__(self, config: Config = Config(), registry=None, tokenizer: WordTokenizer = None, responder: Responder = None, seed: int = 0):
+        self.shared_tokenizer = tokenizer if tokenizer is not None else WordTokenizer()
+        self.responder = responder if responder is not None else Responder()
+        self.seed = seed
+        super().__init__(config, registry=registry)
+        self.model_id = "stand-in"
+
+    def _load_model(self) -> Tuple[Any, Any]:
+        torch.manual_seed(self.seed)
+        processor = StandInProcessor(self.shared_tokenizer)
+        return processor, StandInModel(processor, self.responder)
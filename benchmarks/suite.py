@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import asyncio
+import platform
+import tempfile
+import numpy as np
+import torch
+from typing import List, Dict, Any, Optional
+from aidbud.config import Config
+from aidbud.utils import RAG, Context
+from aidbud.workflow import Workflow
+from aidbud.tracing import get_tracer, MemorySink
+from .standins import WordTokenizer, StandInLLM, StandInEmbedder, Responder
+from .fixtures import ATTACHMENT_MIXES, QUERIES, make_attachments, attachment_paths, corpus_turn
+
+# Stage name -> the spans whose wall time it sums, per turn.
+STAGES = {
+    "classify": ["workflow.classify"],
+    "decode": ["llm.decode_media"],
+    "embed": ["embedder.encode"],
+    "retrieve": ["rag.query", "rag.get"],
+    "assemble": ["workflow.assemble_context"],
+    "prompt": ["prompt.build"],
+    "preprocess": ["llm.preprocess"],
+    "generate": ["llm.model_generate"],
+    "parse": ["parser.parse_response", "parser.parse_attachment_response"],
+    "insert": ["rag.add"]
+}
+
+def benchmark_config(db_path: str) -> Config:
+    config = Config()
+    config.rag["db_path"] = db_path
+    config.context["context_path"] = os.path.join(db_path, "context.json")
+    config.context["legacy_path"] = None
+    config.rag["max_conversation_records"] = None
+    config.rag["max_record_age"] = None
+    config.tracing["enabled"] = True
+    return config
+
+def run_suite(
+    corpus_sizes: List[int] = (0, 100, 1000),
+    mixes: List[str] = tuple(ATTACHMENT_MIXES),
+    turns: int = 5,
+    warmup: int = 1,
+    conversations: int = 4,
+    seed: int = 0,
+    work_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Runs every (corpus size, attachment mix) scenario end to end on stand-in models.
+
+    Args:
+        corpus_sizes (List[int]): Number of stored response records before the timed turns, spread
+            across `conversations` conversations.
+        mixes (List[str]): Attachment mixes to send with every timed turn; see `ATTACHMENT_MIXES`.
+        turns (int): Timed turns per scenario.
+        warmup (int): Untimed turns run first in each scenario.
+        conversations (int): Conversations the corpus is spread across; the turns run in the first.
+        seed (int): Seed for the stand-in weights and the synthetic corpus.
+        work_dir (str, optional): Where databases and attachments are written. Defaults to a
+            temporary directory that is removed afterwards.
+
+    Returns:
+        Dict[str, Any]: Environment metadata and, per scenario, the per-stage and end-to-end
+        latency statistics in milliseconds.
+    """
+    owns_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="aidbud-bench-")
+    tracer = get_tracer()
+    sink = MemorySink()
+    tracer.add_sink(sink)
+    tracer.enable()
+
+    try:
+        attachments = make_attachments(os.path.join(work_dir, "attachments"))
+        tokenizer = WordTokenizer()
+        base_config = benchmark_config(os.path.join(work_dir, "db"))
+        llm = StandInLLM(base_config, tokenizer=tokenizer, responder=Responder(), seed=seed)
+        embedder = StandInEmbedder(base_config, tokenizer=tokenizer, seed=seed)
+
+        scenarios = []
+        for corpus_size in corpus_sizes:
+            for mix in mixes:
+                db_path = os.path.join(work_dir, f"db-{corpus_size}-{mix}")
+                scenario = _run_scenario(
+                    benchmark_config(db_path), llm, embedder, sink, corpus_size, mix,
+                    attachments, turns, warmup, conversations, seed
+                )
+                scenarios.append(scenario)
+                print(f"[BENCH] {scenario['name']}: {scenario['total']['mean_ms']:.1f} ms/turn")
+                shutil.rmtree(db_path, ignore_errors=True)
+    finally:
+        tracer.remove_sink(sink)
+        if owns_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": environment(),
+        "parameters": {
+            "corpus_sizes": list(corpus_sizes), "mixes": list(mixes), "turns": turns,
+            "warmup": warmup, "conversations": conversations, "seed": seed
+        },
+        "scenarios": scenarios
+    }
+
+def _run_scenario(config, llm, embedder, sink, corpus_size, mix, attachments, turns, warmup, conversations, seed) -> Dict[str, Any]:
+    rag = RAG(config, embedder=embedder)
+    workflow = Workflow(Context(config), config, llm=llm, rag=rag)
+    rng = random.Random(seed)
+    for i in range(corpus_size):
+        rag.insert_response(corpus_turn(i, rng), i % conversations)
+
+    paths = attachment_paths(mix, attachments)
+    stage_samples = {stage: [] for stage in STAGES}
+    totals = []
+    errors = 0
+    for turn in range(warmup + turns):
+        query = QUERIES[turn % len(QUERIES)]
+        sink.clear()
+        start = time.perf_counter()
+        output = workflow.run(0, query, paths or None)
+        asyncio.run(workflow.wait_for_writes(0))
+        elapsed = time.perf_counter() - start
+        if turn < warmup:
+            continue
+
+        errors += bool(output.get("error"))
+        totals.append(elapsed)
+        spans = sink.spans()
+        for stage, names in STAGES.items():
+            stage_samples[stage].append(sum(span["wall_time"] for span in spans if span["name"] in names))
+
+    workflow.executor.shutdown(wait=True)
+    rag.compactor.executor.shutdown(wait=True)
+    return {
+        "name": f"{mix}@{corpus_size}",
+        "corpus_size": corpus_size,
+        "mix": mix,
+        "attachments": len(paths),
+        "turns": turns,
+        "errors": errors,
+        "total": latency_stats(totals),
+        "stages": {stage: latency_stats(samples) for stage, samples in stage_samples.items()}
+    }
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    values = np.asarray(samples) * 1000.0
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max())
+    }
+
+def environment() -> Dict[str, Any]:
+    return {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads()
+    }
+
+def check_regressions(results: Dict[str, Any], thresholds: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Compares results against absolute limits and, if given, a baseline run.
+
+    Args:
+        results (Dict[str, Any]): Output of `run_suite`.
+        thresholds (Dict[str, Any]): "absolute_p95_ms" maps a stage (or "total") to a p95 ceiling
+            that holds for every scenario. "relative_tolerance" is the allowed fractional slowdown of
+            a stage's mean against the baseline, and "min_ms" the baseline mean below which a stage
+            is too noisy to compare.
+        baseline (Dict[str, Any], optional): An earlier `run_suite` output to compare against.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per violated threshold; empty if the run passes.
+    """
+    regressions = []
+    absolute = thresholds.get("absolute_p95_ms", {})
+    tolerance = thresholds.get("relative_tolerance", 0.25)
+    min_ms = thresholds.get("min_ms", 1.0)
+    baseline_scenarios = {s["name"]: s for s in (baseline or {}).get("scenarios", [])}
+
+    for scenario in results["scenarios"]:
+        stages = dict(scenario["stages"], total=scenario["total"])
+        if scenario["errors"]:
+            regressions.append({"scenario": scenario["name"], "stage": "errors", "value": scenario["errors"], "limit": 0})
+        for stage, limit in absolute.items():
+            if stage in stages and stages[stage]["p95_ms"] > limit:
+                regressions.append({"scenario": scenario["name"], "stage": stage, "metric": "p95_ms", "value": stages[stage]["p95_ms"], "limit": limit})
+
+        previous = baseline_scenarios.get(scenario["name"])
+        if previous is None:
+            continue
+        previous_stages = dict(previous["stages"], total=previous["total"])
+        for stage, stats in stages.items():
+            before = previous_stages.get(stage, {}).get("mean_ms", 0.0)
+            if before >= min_ms and stats["mean_ms"] > before * (1.0 + tolerance):
+                regressions.append({
+                    "scenario": scenario["name"], "stage": stage, "metric": "mean_ms",
+                    "value": stats["mean_ms"], "baseline": before, "limit": before * (1.0 + tolerance)
+                })
+    return regressions
+
+def load_json(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
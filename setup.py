@@ -7,5 +7,6 @@ setup(
     name="aidbud",
     version="0.1",
     packages=find_packages(include=["aidbud", "aidbud.*"]),
+    package_data={"aidbud.utils.prompt": ["templates/*.txt"]},
     install_requires=requirements,
 )
\ No newline at end of file
@@ -0,0 +1,39 @@
+import json
+import time
+import threading
+from aidbud.config import Config
+from aidbud.scheduler import BatchingLLM
+
+SCHEMA = {"type": "object", "properties": {"RESPONSE": {"type": "string"}}}
+
+class RecordingLLM:
+    model_id = "recording"
+
+    def __init__(self):
+        self.batches = []
+
+    def generate_batch(self, prompts, use_memo=True, schema=None):
+        self.batches.append((list(prompts), schema))
+        time.sleep(0.05)
+        return [prompt.upper() for prompt in prompts]
+
+def test_equal_schemas_share_a_batch():
+    config = Config()
+    config.scheduler["batch_wait_ms"] = 200
+    llm = RecordingLLM()
+    batcher = BatchingLLM(llm, config)
+    responses = {}
+
+    def call(i):
+        # A fresh copy per request, as the model server decodes one from every message.
+        schema = json.loads(json.dumps(SCHEMA)) if i < 4 else None
+        responses[i] = batcher.generate(f"p{i}", schema=schema)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert responses == {i: f"P{i}" for i in range(6)}
+    assert sorted((len(prompts), schema == SCHEMA) for prompts, schema in llm.batches) == [(2, False), (4, True)]
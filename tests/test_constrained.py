@@ -0,0 +1,52 @@
+import torch
+from aidbud.models.llm.constrained import JsonSchemaLogitsProcessor, TokenTexts
+
+SCHEMA = {"type": "object", "properties": {"RESPONSE": {"type": "string"}}, "required": ["RESPONSE"]}
+VOCAB = ["<eos>", '{"', "RESPONSE", '":', ' "', "a", "b", "ab", '"}', "}", "x", "\\"]
+
+class VocabTokenizer:
+    def __len__(self):
+        return len(VOCAB)
+
+    def convert_ids_to_tokens(self, token):
+        return VOCAB[token] if token < len(VOCAB) else None
+
+    def decode(self, tokens):
+        return "".join(VOCAB[token] for token in tokens if token < len(VOCAB))
+
+def allowed(processor, generated, scores):
+    scores = torch.tensor([scores], dtype=torch.float)
+    # The first call sees the prompt alone, as in `generate`.
+    masked = processor(torch.tensor([[99]]), scores)
+    if generated:
+        masked = processor(torch.tensor([[99] + generated]), scores)
+    return sorted(torch.nonzero(masked[0] > float("-inf")).flatten().tolist())
+
+def test_sampling_keeps_every_valid_token():
+    scores = [0.0] * len(VOCAB)
+    scores[VOCAB.index("x")] = 10.0
+    texts = TokenTexts(VocabTokenizer())
+    greedy = JsonSchemaLogitsProcessor(SCHEMA, texts.tokenizer, [0], top_k=1, token_texts=texts)
+    sampled = JsonSchemaLogitsProcessor(SCHEMA, texts.tokenizer, [0], top_k=1, sample=True, token_texts=texts)
+    prefix = [VOCAB.index('{"'), VOCAB.index("RESPONSE"), VOCAB.index('":'), VOCAB.index(' "')]
+
+    # Inside the string only end-of-sequence, and closing it before a colon, are invalid.
+    assert allowed(greedy, prefix, scores) == [VOCAB.index("x")]
+    assert allowed(sampled, prefix, scores) == [i for i, token in enumerate(VOCAB) if token not in ("<eos>", '":')]
+
+    closed = JsonSchemaLogitsProcessor(SCHEMA, texts.tokenizer, [0], sample=True, token_texts=texts)
+    assert allowed(closed, prefix + [VOCAB.index('"}')], scores) == [0]
+
+def test_token_texts_are_decoded_once():
+    class CountingTokenizer(VocabTokenizer):
+        decoded = 0
+
+        def decode(self, tokens):
+            CountingTokenizer.decoded += 1
+            return super().decode(tokens)
+
+    texts = TokenTexts(CountingTokenizer())
+    for _ in range(2):
+        processor = JsonSchemaLogitsProcessor(SCHEMA, texts.tokenizer, [0], sample=True, token_texts=texts)
+        allowed(processor, [], [0.0] * len(VOCAB))
+    assert CountingTokenizer.decoded == len(VOCAB)
@@ -0,0 +1,29 @@
+import os
+from aidbud.conversation import Conversation, ConversationStore
+
+def test_conversation_is_created_on_first_turn(tmp_path):
+    conversation = Conversation(store=ConversationStore(str(tmp_path)))
+    assert conversation.messages == [] and conversation.pcard == {}
+    assert os.listdir(tmp_path) == []
+
+    conversation.add_message("hello")
+    assert len(os.listdir(tmp_path)) == 1
+    assert conversation.messages[0]["content"] == "hello"
+
+def test_resume_writes_no_new_conversation(tmp_path):
+    first = Conversation(store=ConversationStore(str(tmp_path)))
+    first.add_message("hello")
+    conversation_id = first.current_conversation
+
+    resumed = Conversation(store=ConversationStore(str(tmp_path)), conversation_id=conversation_id)
+    assert resumed.current_conversation == conversation_id
+    assert len(os.listdir(tmp_path)) == 1
+
+def test_store_expands_the_home_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    store = ConversationStore("~/.cache/aidbud/conversations")
+
+    assert store.path == str(tmp_path / "home" / ".cache" / "aidbud" / "conversations")
+    assert os.path.isdir(store.path)
+    assert not os.path.exists(tmp_path / "~")
@@ -0,0 +1,48 @@
+import pytest
+from aidbud.utils import Parser
+from benchmarks.parser_parity import LegacyParser, sample_outputs
+
+EDGE_CASES = [
+    "{}",
+    '{} {"RESPONSE": "a"}',
+    '{} {"ID": 2}',
+    '[] {"RESPONSE": "a"}',
+    '{"RESPONSE": "a"} {"ID": 3}',
+    '{"RESPONSE": "a"} {}',
+    '{"ID": 0} {"RESPONSE": "a"}',
+    '{"ID": "x"}',
+    '{"ID": 4, "REMARKS": 5}',
+    '{"description": ""} {"description": "d"}',
+    '```json\n{"RESPONSE": "a"}\n```',
+    'a { b ] {"RESPONSE": "a"}',
+    '{"RESPONSE": "a"',
+    "no structured output",
+    ""
+]
+
+CHECKS = {
+    "function": lambda parser, output: parser.parse_response(output, find_function=True),
+    "response": lambda parser, output: parser.parse_response(output, find_function=False),
+    "attachment": lambda parser, output: parser.parse_attachment_response(output)
+}
+
+@pytest.mark.parametrize("check", list(CHECKS))
+@pytest.mark.parametrize("output", EDGE_CASES)
+def test_edge_case_parity(check, output):
+    assert CHECKS[check](Parser(), output) == CHECKS[check](LegacyParser(), output)
+
+@pytest.mark.parametrize("check", list(CHECKS))
+def test_sampled_output_parity(check):
+    parser, legacy = Parser(), LegacyParser()
+    for output in sample_outputs(500):
+        assert CHECKS[check](parser, output) == CHECKS[check](legacy, output), output
+
+def test_empty_object_is_no_response():
+    assert Parser().parse_response("{}") is None
+    assert Parser().parse_response('{} {"RESPONSE": "a"}', find_function=False) is None
+
+def test_stream_settles_response_on_close():
+    stream = Parser().stream()
+    assert stream.feed('{"RESPONSE": "a"}') is None
+    assert stream.partial() == {"RESPONSE": "a"}
+    assert stream.close(' {"ID": 3}') == {"type": "fcall", "context": {"id": 3, "remarks": ""}}
@@ -0,0 +1,15 @@
+from aidbud.tracing import PrometheusSink
+
+def metric(name, value, **labels):
+    return {"type": "metric", "kind": "counter", "name": name, "value": value, "labels": labels}
+
+def test_prometheus_type_line_once_per_family():
+    sink = PrometheusSink()
+    sink.emit(metric("rag.cache.hits", 1, collection="responses"))
+    sink.emit(metric("rag.cache.hits", 2, collection="attachments"))
+    sink.emit(metric("rag.cache.hits", 1, collection="responses"))
+    lines = sink.render().splitlines()
+
+    assert lines.count("# TYPE aidbud_rag_cache_hits_total counter") == 1
+    assert 'aidbud_rag_cache_hits_total{collection="attachments"} 2.0' in lines
+    assert 'aidbud_rag_cache_hits_total{collection="responses"} 2.0' in lines
@@ -0,0 +1,22 @@
+import numpy as np
+from aidbud.models.llm.vad import VoiceActivityDetector
+
+def tone(seconds, sample_rate=16000, amplitude=0.5):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+def test_mask_has_one_entry_per_frame_for_short_clips():
+    detector = VoiceActivityDetector()
+    for seconds in (0.03, 0.05, 0.2, 1.0):
+        audio = tone(seconds)
+        assert len(detector.speech_mask(audio)) == -(-len(audio) // detector.frame)
+
+def test_padding_extends_speech_into_silence():
+    detector = VoiceActivityDetector()
+    audio = np.concatenate([np.zeros(16000, dtype=np.float32), tone(0.5), np.zeros(16000, dtype=np.float32)])
+    mask = detector.speech_mask(audio)
+    speech = np.flatnonzero(mask)
+    # 0.5 s of tone is about 17 frames, padded by 5 frames on each side.
+    assert len(mask) == -(-len(audio) // detector.frame)
+    assert speech[0] <= 33 - 5 and speech[-1] >= 50 + 4
+    assert len(detector.trim(audio)) < len(audio)